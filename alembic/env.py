@@ -18,9 +18,12 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 from shared.database import Base  # onde está declarada a Base = declarative_base()
 from clientes.models.clientes import Cliente
-from produtos.models.produtos import Produto
+from produtos.models.produtos import Produto, MovimentoEstoque
 from pedidos.models.pedidos import Pedido, PedidoProduto
 from autenticacao.models.autenticacao import Tabela_Usuarios
+from relatorios.models.relatorios import VendaSecaoDia
+from shared.idempotencia import ChaveIdempotencia
+from shared.tarefas import Tarefa
 
 target_metadata = Base.metadata
 
@@ -0,0 +1,40 @@
+"""fila de tarefas
+
+Revision ID: 10c56a375399
+Revises: 2692189f0b86
+Create Date: 2026-10-18 04:00:23.975403
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '10c56a375399'
+down_revision: Union[str, None] = '2692189f0b86'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tarefas',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('tipo', sa.String(), nullable=False),
+    sa.Column('dados', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('estado', sa.String(), server_default='pendente', nullable=False),
+    sa.Column('tentativas', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('executar_em', sa.DateTime(), server_default=sa.text("timezone('utc', now())"), nullable=False),
+    sa.Column('criada_em', sa.DateTime(), server_default=sa.text("timezone('utc', now())"), nullable=False),
+    sa.Column('erro', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tarefas_pendentes_executar_em', 'tarefas', ['executar_em'], unique=False, postgresql_where=sa.text("estado = 'pendente'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tarefas_pendentes_executar_em', table_name='tarefas', postgresql_where=sa.text("estado = 'pendente'"))
+    op.drop_table('tarefas')
@@ -0,0 +1,41 @@
+"""chaves de idempotencia
+
+Revision ID: 2692189f0b86
+Revises: 9438d3d6eddd
+Create Date: 2026-10-18 03:49:33.452207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '2692189f0b86'
+down_revision: Union[str, None] = '9438d3d6eddd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('chaves_idempotencia',
+    sa.Column('chave', sa.String(length=255), nullable=False),
+    sa.Column('escopo', sa.String(), nullable=False),
+    sa.Column('dono', sa.String(length=64), nullable=False),
+    sa.Column('impressao', sa.String(length=64), nullable=True),
+    sa.Column('status', sa.Integer(), nullable=True),
+    sa.Column('cabecalhos', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('corpo', sa.LargeBinary(), nullable=True),
+    sa.Column('expira_em', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('chave', 'escopo')
+    )
+    op.create_index(op.f('ix_chaves_idempotencia_expira_em'), 'chaves_idempotencia', ['expira_em'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_chaves_idempotencia_expira_em'), table_name='chaves_idempotencia')
+    op.drop_table('chaves_idempotencia')
+
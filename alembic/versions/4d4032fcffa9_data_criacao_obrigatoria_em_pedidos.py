@@ -0,0 +1,51 @@
+"""data_criacao obrigatoria em pedidos
+
+Revision ID: 4d4032fcffa9
+Revises: ba0e2fab7a93
+Create Date: 2026-10-18 04:25:47.823198
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '4d4032fcffa9'
+down_revision: Union[str, None] = 'ba0e2fab7a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Sem a data real, o pedido fica com a do pedido anterior com data (ids são sequenciais) ou, sem nenhum, com agora
+    op.execute("""
+        UPDATE pedidos p
+        SET data_criacao = COALESCE(
+            (
+                SELECT anterior.data_criacao FROM pedidos anterior
+                WHERE anterior.id < p.id AND anterior.data_criacao IS NOT NULL
+                ORDER BY anterior.id DESC LIMIT 1
+            ),
+            timezone('utc', now())
+        )
+        WHERE p.data_criacao IS NULL
+    """)
+    op.alter_column(
+        'pedidos', 'data_criacao',
+        existing_type=postgresql.TIMESTAMP(),
+        nullable=False,
+        server_default=sa.text("timezone('utc', now())"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column(
+        'pedidos', 'data_criacao',
+        existing_type=postgresql.TIMESTAMP(),
+        nullable=True,
+        server_default=None,
+    )
@@ -0,0 +1,54 @@
+"""indices para filtros de pedidos e produtos
+
+Revision ID: 525acab75e07
+Revises: fd72d918f750
+Create Date: 2026-10-18 03:16:54.639475
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '525acab75e07'
+down_revision: Union[str, None] = 'fd72d918f750'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (nome, tabela, colunas) dos índices B-tree; a coluna id no fim atende a paginação por cursor
+INDICES = [
+    ('ix_pedidos_cliente_id_id', 'pedidos', ['cliente_id', 'id']),
+    ('ix_pedidos_data_criacao_id', 'pedidos', ['data_criacao', 'id']),
+    ('ix_pedido_produto_produto_id', 'pedido_produto', ['produto_id', 'pedido_id']),
+    ('ix_produtos_valor_venda_id', 'produtos', ['valor_venda', 'id']),
+    ('ix_produtos_descricao_id', 'produtos', ['descricao', 'id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY não bloqueia escritas nas tabelas, mas não pode rodar dentro de transação
+    with op.get_context().autocommit_block():
+        for nome, tabela, colunas in INDICES:
+            op.create_index(nome, tabela, colunas, postgresql_concurrently=True, if_not_exists=True)
+        # secao é filtrada com ILIKE '%...%', que só usa índice trigram
+        op.create_index(
+            'ix_produtos_secao_trgm', 'produtos', ['secao'],
+            postgresql_using='gin', postgresql_ops={'secao': 'gin_trgm_ops'},
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        # Redundante com a chave primária
+        op.drop_index('ix_produtos_id', table_name='produtos', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_produtos_id', 'produtos', ['id'], postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_produtos_secao_trgm', table_name='produtos', postgresql_concurrently=True, if_exists=True)
+        for nome, tabela, _ in reversed(INDICES):
+            op.drop_index(nome, table_name=tabela, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,36 @@
+"""movimentos de vendas
+
+Revision ID: 6cbdfe1fe4c6
+Revises: 4d4032fcffa9
+Create Date: 2026-10-18 04:35:45.477420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6cbdfe1fe4c6'
+down_revision: Union[str, None] = '4d4032fcffa9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('movimentos_vendas',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('secao', sa.String(), nullable=False),
+    sa.Column('pedidos', sa.Integer(), nullable=False),
+    sa.Column('quantidade', sa.Integer(), nullable=False),
+    sa.Column('receita', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('movimentos_vendas')
@@ -0,0 +1,42 @@
+"""indices trigram em clientes
+
+Revision ID: 747469f6e22d
+Revises: 70bea4b5a971
+Create Date: 2026-10-18 03:02:46.151194
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '747469f6e22d'
+down_revision: Union[str, None] = '70bea4b5a971'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY não bloqueia escritas em clientes, mas não pode rodar dentro de transação
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_clientes_nome_trgm', 'clientes', ['nome'],
+            postgresql_using='gin', postgresql_ops={'nome': 'gin_trgm_ops'},
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_clientes_email_trgm', 'clientes', ['email'],
+            postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'},
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_clientes_email_trgm', table_name='clientes', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_clientes_nome_trgm', table_name='clientes', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,39 @@
+"""movimentos de estoque
+
+Revision ID: 9438d3d6eddd
+Revises: 525acab75e07
+Create Date: 2026-10-18 03:40:45.630709
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9438d3d6eddd'
+down_revision: Union[str, None] = '525acab75e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('movimentos_estoque',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('produto_id', sa.Integer(), nullable=False),
+    sa.Column('slot', sa.SmallInteger(), nullable=False),
+    sa.Column('quantidade', sa.Integer(), nullable=False),
+    sa.Column('data_criacao', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['produto_id'], ['produtos.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_movimentos_estoque_produto_id_slot', 'movimentos_estoque', ['produto_id', 'slot'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_movimentos_estoque_produto_id_slot', table_name='movimentos_estoque')
+    op.drop_table('movimentos_estoque')
+
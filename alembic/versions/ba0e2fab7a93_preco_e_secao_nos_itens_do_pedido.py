@@ -0,0 +1,38 @@
+"""preco e secao nos itens do pedido
+
+Revision ID: ba0e2fab7a93
+Revises: 10c56a375399
+Create Date: 2026-10-18 04:11:48.821949
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ba0e2fab7a93'
+down_revision: Union[str, None] = '10c56a375399'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pedido_produto', sa.Column('valor_unitario', sa.Float(), nullable=True))
+    op.add_column('pedido_produto', sa.Column('secao', sa.String(), nullable=True))
+    # Itens antigos ficam com o preço e a seção que o produto tem hoje, como o relatório já calculava
+    op.execute("""
+        UPDATE pedido_produto pp
+        SET valor_unitario = COALESCE(p.valor_venda, 0), secao = p.secao
+        FROM produtos p
+        WHERE p.id = pp.produto_id
+    """)
+    op.alter_column('pedido_produto', 'valor_unitario', nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pedido_produto', 'secao')
+    op.drop_column('pedido_produto', 'valor_unitario')
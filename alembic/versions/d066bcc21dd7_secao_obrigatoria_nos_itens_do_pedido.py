@@ -0,0 +1,34 @@
+"""secao obrigatoria nos itens do pedido
+
+Revision ID: d066bcc21dd7
+Revises: 6cbdfe1fe4c6
+Create Date: 2026-10-18 04:37:36.122959
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd066bcc21dd7'
+down_revision: Union[str, None] = '6cbdfe1fe4c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # vendas_secao_dia.secao faz parte da chave primária: um item sem seção derrubaria o pedido
+    op.execute("""
+        UPDATE pedido_produto pp SET secao = COALESCE(p.secao, '')
+        FROM produtos p
+        WHERE p.id = pp.produto_id AND pp.secao IS NULL
+    """)
+    op.alter_column('pedido_produto', 'secao', existing_type=sa.String(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('pedido_produto', 'secao', existing_type=sa.String(), nullable=True)
@@ -0,0 +1,49 @@
+"""vendas por secao e dia
+
+Revision ID: fd72d918f750
+Revises: 747469f6e22d
+Create Date: 2026-10-18 03:14:59.158678
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fd72d918f750'
+down_revision: Union[str, None] = '747469f6e22d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'vendas_secao_dia',
+        sa.Column('dia', sa.Date(), nullable=False),
+        sa.Column('secao', sa.String(), nullable=False),
+        sa.Column('pedidos', sa.Integer(), nullable=False),
+        sa.Column('quantidade', sa.Integer(), nullable=False),
+        sa.Column('receita', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('dia', 'secao'),
+    )
+    # Carga inicial a partir do histórico; depois a tabela é mantida pelos endpoints de pedidos
+    op.execute(
+        """
+        INSERT INTO vendas_secao_dia (dia, secao, pedidos, quantidade, receita)
+        SELECT CAST(p.data_criacao AS DATE), pr.secao, count(DISTINCT pp.pedido_id),
+               sum(pp.quantidade), sum(pp.quantidade * pr.valor_venda)
+        FROM pedido_produto pp
+        JOIN pedidos p ON p.id = pp.pedido_id
+        JOIN produtos pr ON pr.id = pp.produto_id
+        WHERE p.status <> 'cancelado'
+        GROUP BY CAST(p.data_criacao AS DATE), pr.secao
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('vendas_secao_dia')
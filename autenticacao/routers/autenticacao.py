@@ -3,9 +3,11 @@ from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from pydantic import BaseModel
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from shared.dependencias import get_db
+from jose import jwt
+from shared.dependencias import get_db, executar, SessaoBanco
 from autenticacao.models.autenticacao import Tabela_Usuarios
+from autenticacao.tokens import SECRET_KEY, ALGORITHM, validar_token
+from autenticacao.senhas import gerar_hash_async, verificar_senha_async
 
 router = APIRouter(prefix="/auth")
 
@@ -13,8 +15,6 @@ router = APIRouter(prefix="/auth")
 usuarios_cadastrados = {}
 
 # Configurações do JWT
-SECRET_KEY = "minha_chave_super_secreta"
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -39,24 +39,10 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        nome_usuario: str = payload.get("sub")
-        papel: str = payload.get("papel")
-        if nome_usuario is None or papel is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido",
-            )
-        return {"nome_usuario": nome_usuario, "papel": papel}
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token inválido",
-        )
-    
-def admin_required(current_user: dict = Depends(get_current_user)):
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    return validar_token(token)
+
+async def admin_required(current_user: dict = Depends(get_current_user)):
     if current_user["papel"] != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -74,14 +60,21 @@ def admin_required(current_user: dict = Depends(get_current_user)):
         400: {"description": "Usuário já existe"}
     }
 )
-def register(usuario_cadastrado: Usuario, db: Session = Depends(get_db)):
+async def register(usuario_cadastrado: Usuario, db: SessaoBanco = Depends(get_db)):
+    # Nome repetido é recusado antes do bcrypt; _register confere de novo caso outro cadastro chegue antes
+    if await executar(db, _buscar_usuario, usuario_cadastrado.nome_usuario):
+        raise HTTPException(status_code=400, detail="Usuário já existe")
+    senha_hash = await gerar_hash_async(usuario_cadastrado.senha)
+    return await executar(db, _register, usuario_cadastrado, senha_hash)
+
+def _register(db: Session, usuario_cadastrado: Usuario, senha_hash: str):
     usuario_existente = db.query(Tabela_Usuarios).filter(Tabela_Usuarios.nome_usuario == usuario_cadastrado.nome_usuario).first()
     if usuario_existente:
         raise HTTPException(status_code=400, detail="Usuário já existe")
 
     novo_usuario = Tabela_Usuarios(
         nome_usuario=usuario_cadastrado.nome_usuario,
-        senha=usuario_cadastrado.senha,
+        senha=senha_hash,
         papel=usuario_cadastrado.papel
     )
 
@@ -101,12 +94,19 @@ def register(usuario_cadastrado: Usuario, db: Session = Depends(get_db)):
         401: {"description": "Usuário ou senha incorretos"}
     }
 )
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    usuario = db.query(Tabela_Usuarios).filter(Tabela_Usuarios.nome_usuario == form_data.username).first()
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: SessaoBanco = Depends(get_db)):
+    usuario = await executar(db, _buscar_usuario, form_data.username)
 
-    if not usuario or usuario.senha != form_data.password:
+    if not usuario:
         raise HTTPException(status_code=401, detail="Usuário ou senha incorretos")
 
+    senha_ok, novo_hash = await verificar_senha_async(form_data.password, usuario.senha)
+    if not senha_ok:
+        raise HTTPException(status_code=401, detail="Usuário ou senha incorretos")
+    if novo_hash:
+        # Custo do bcrypt mudou (ou senha legada em texto puro): regrava o hash
+        await executar(db, _atualizar_hash, usuario.id, novo_hash)
+
     access_token = create_access_token(
         data={"sub": usuario.nome_usuario, "papel": usuario.papel},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -114,6 +114,15 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
     return {"access_token": access_token, "token_type": "bearer"}
 
+def _buscar_usuario(db: Session, nome_usuario: str):
+    return db.query(Tabela_Usuarios).filter(Tabela_Usuarios.nome_usuario == nome_usuario).first()
+
+def _atualizar_hash(db: Session, usuario_id: int, novo_hash: str):
+    db.query(Tabela_Usuarios).filter(Tabela_Usuarios.id == usuario_id).update(
+        {Tabela_Usuarios.senha: novo_hash}, synchronize_session=False
+    )
+    db.commit()
+
 
 @router.post(
     "/refresh-token",
@@ -121,7 +130,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     description="Gera um novo token JWT válido, prolongando o tempo de sessão do usuário autenticado.",
     response_model=Token,
 )
-def refresh_token(current_user: dict = Depends(get_current_user)):
+async def refresh_token(current_user: dict = Depends(get_current_user)):
     novo_token = create_access_token(
         data={"sub": current_user["nome_usuario"], "papel": current_user["papel"]},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
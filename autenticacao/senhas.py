@@ -0,0 +1,42 @@
+import asyncio
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from shared import config
+
+# Hashes com custo diferente de SENHA_BCRYPT_ROUNDS são marcados para atualização
+contexto = CryptContext(schemes=["bcrypt"], bcrypt__rounds=config.SENHA_BCRYPT_ROUNDS)
+
+# O bcrypt libera o GIL: um pool pequeno e dedicado limita quantos hashes rodam ao mesmo
+# tempo sem ocupar o event loop nem o threadpool usado pelas consultas ao banco
+_executor = ThreadPoolExecutor(max_workers=config.SENHA_HASH_THREADS, thread_name_prefix="senhas")
+
+
+def gerar_hash(senha: str) -> str:
+    return contexto.hash(senha)
+
+
+def verificar_senha(senha: str, senha_salva: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """Retorna (senha confere, novo hash a gravar ou None).
+
+    Um novo hash é devolvido quando o salvo usa outro custo ou ainda está em texto puro
+    (usuários cadastrados antes do hash de senhas).
+    """
+    if not senha_salva:
+        return False, None
+    if contexto.identify(senha_salva, required=False) is None:
+        if hmac.compare_digest(senha.encode(), senha_salva.encode()):
+            return True, gerar_hash(senha)
+        return False, None
+    return contexto.verify_and_update(senha, senha_salva)
+
+
+async def gerar_hash_async(senha: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, gerar_hash, senha)
+
+
+async def verificar_senha_async(senha: str, senha_salva: Optional[str]) -> Tuple[bool, Optional[str]]:
+    return await asyncio.get_running_loop().run_in_executor(_executor, verificar_senha, senha, senha_salva)
@@ -0,0 +1,48 @@
+import time
+
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+
+from shared import config
+from shared.cache import CacheLRU
+
+# Configurações do JWT
+SECRET_KEY = "minha_chave_super_secreta"
+ALGORITHM = "HS256"
+
+# Tokens já validados, até o `exp` de cada um: clientes que repetem o mesmo bearer token
+# não pagam a verificação de assinatura a cada requisição
+tokens_validados = CacheLRU("tokens", tamanho_maximo=config.TOKEN_CACHE_TAMANHO)
+
+
+def validar_token(token: str) -> dict:
+    """Decodifica e valida o JWT, retornando {"nome_usuario", "papel"}.
+
+    Levanta HTTPException 401 se o token for inválido, estiver expirado ou não trouxer
+    as claims `sub` e `papel`.
+    """
+    usuario = tokens_validados.obter(token)
+    if usuario is not None:
+        return dict(usuario)
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido ou expirado",
+        )
+
+    nome_usuario = payload.get("sub")
+    papel = payload.get("papel")
+    if nome_usuario is None or papel is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido",
+        )
+
+    usuario = {"nome_usuario": nome_usuario, "papel": papel}
+    exp = payload.get("exp")
+    if exp is not None:
+        tokens_validados.definir(token, dict(usuario), ttl=exp - time.time())
+    return usuario
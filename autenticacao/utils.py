@@ -1,8 +1,7 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 from pydantic import BaseModel
-from autenticacao.routers.autenticacao import SECRET_KEY, ALGORITHM
+from autenticacao.tokens import validar_token
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
@@ -10,12 +9,6 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 class TokenData(BaseModel):
     username: str | None = None
 
-def verificar_token(token: str = Depends(oauth2_scheme)) -> TokenData:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Token inválido")
-        return TokenData(username=username)
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Token inválido ou expirado")
+async def verificar_token(token: str = Depends(oauth2_scheme)) -> TokenData:
+    usuario = validar_token(token)
+    return TokenData(username=usuario["nome_usuario"])
@@ -0,0 +1,290 @@
+"""Mede latência e vazão de cada rota da API sob carga concorrente.
+
+Uso:
+    python -m benchmarks.carga --url http://localhost:8000 --saida resultado.json
+    python -m benchmarks.carga --comparar base.json resultado.json
+
+Cada rota recebe `--requisicoes` chamadas (menos nas exportações, importação e lotes) disparadas por
+`--concorrencia` clientes simultâneos. O resultado é um JSON com vazão, erros e p50/p95/p99 por
+rota; `--comparar` aponta as rotas cujo p95 piorou além da `--tolerancia` (código de saída 1).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import string
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+
+@dataclass
+class Cenario:
+    nome: str  # método e rota, como aparece no Swagger
+    metodo: str
+    caminho: Callable[[int], str]
+    opcoes: Callable[[int], Dict[str, Any]] = lambda i: {}
+    fracao: float = 1.0  # fração de --requisicoes usada nesta rota
+
+
+def _sufixo(tamanho: int = 10) -> str:
+    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=tamanho))
+
+
+def _novo_cliente() -> Dict[str, str]:
+    sufixo = _sufixo()
+    return {"nome": f"Cliente carga {sufixo}", "email": f"carga_{sufixo}@exemplo.com", "cpf": f"carga_{sufixo}"}
+
+
+def _novo_produto() -> Dict[str, Any]:
+    return {
+        "descricao": f"Produto carga {_sufixo()}",
+        "valor_venda": round(random.uniform(1, 500), 2),
+        "codigo_barras": f"carga_{_sufixo(16)}",
+        "secao": f"secao_{random.randrange(40)}",
+        "estoque_inicial": 1_000_000_000,
+    }
+
+
+class Contexto:
+    """Token de administrador e ids existentes usados para montar as requisições."""
+
+    def __init__(self, cliente: httpx.AsyncClient):
+        self.cliente = cliente
+        self.usuario = f"carga_{_sufixo()}"
+        self.senha = _sufixo(16)
+        self.headers: Dict[str, str] = {}
+        self.clientes: List[int] = []
+        self.produtos: List[int] = []
+        self.pedidos: List[int] = []
+        # Criados na preparação para as rotas PUT/DELETE, um por requisição
+        self.clientes_descartaveis: List[int] = []
+        self.produtos_descartaveis: List[int] = []
+        self.pedidos_descartaveis: List[int] = []
+
+    async def preparar(self, requisicoes: int) -> None:
+        await self.cliente.post(
+            "/auth/register", json={"nome_usuario": self.usuario, "senha": self.senha, "papel": "admin"}
+        )
+        resposta = await self.cliente.post("/auth/login", data={"username": self.usuario, "password": self.senha})
+        resposta.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+
+        for rota, destino in (("/clients/", self.clientes), ("/products/", self.produtos), ("/orders/", self.pedidos)):
+            resposta = await self.cliente.get(rota, params={"limit": 100, "ordem": "desc"}, headers=self.headers)
+            resposta.raise_for_status()
+            destino += [item["id"] for item in resposta.json()]
+        if not self.clientes or not self.produtos:
+            raise SystemExit("Banco sem clientes ou produtos: rode antes python -m benchmarks.semear")
+
+        for rota, corpo, destino in (
+            ("/clients/", _novo_cliente, self.clientes_descartaveis),
+            ("/products/", _novo_produto, self.produtos_descartaveis),
+            ("/orders/", self.novo_pedido, self.pedidos_descartaveis),
+        ):
+            respostas = await asyncio.gather(*(
+                self.cliente.post(rota, json=corpo(), headers=self.headers) for _ in range(requisicoes)
+            ))
+            destino += [r.raise_for_status().json()["id"] for r in respostas]
+
+    def novo_pedido(self) -> Dict[str, Any]:
+        produtos = random.sample(self.produtos, min(3, len(self.produtos)))
+        return {
+            "cliente_id": random.choice(self.clientes),
+            "produtos": [{"produto_id": p, "quantidade": random.randint(1, 3)} for p in produtos],
+        }
+
+
+def cenarios(ctx: Contexto) -> List[Cenario]:
+    h = lambda **extra: {"headers": ctx.headers, **extra}
+    hoje = date.today()
+    semana = {"data_inicio": (datetime.now() - timedelta(days=7)).isoformat()}
+    return [
+        Cenario("POST /auth/register", "POST", lambda i: "/auth/register",
+                lambda i: {"json": {"nome_usuario": f"carga_{_sufixo()}", "senha": "senha", "papel": "user"}}, 0.2),
+        Cenario("POST /auth/login", "POST", lambda i: "/auth/login",
+                lambda i: {"data": {"username": ctx.usuario, "password": ctx.senha}}, 0.2),
+        Cenario("POST /auth/refresh-token", "POST", lambda i: "/auth/refresh-token", lambda i: h()),
+
+        Cenario("GET /clients/", "GET", lambda i: "/clients/", lambda i: h(params={"limit": 50})),
+        Cenario("GET /clients/?nome", "GET", lambda i: "/clients/",
+                lambda i: h(params={"limit": 50, "nome": f"{random.randrange(100)}"})),
+        Cenario("GET /clients/?busca", "GET", lambda i: "/clients/",
+                lambda i: h(params={"limit": 20, "busca": f"cliente {_sufixo(3)}"})),
+        Cenario("GET /clients/{id}", "GET", lambda i: f"/clients/{random.choice(ctx.clientes)}", lambda i: h()),
+        Cenario("POST /clients/", "POST", lambda i: "/clients/", lambda i: h(json=_novo_cliente())),
+        Cenario("PUT /clients/{id}", "PUT", lambda i: f"/clients/{ctx.clientes_descartaveis[i]}",
+                lambda i: h(json=_novo_cliente())),
+        Cenario("DELETE /clients/{id}", "DELETE", lambda i: f"/clients/{ctx.clientes_descartaveis[i]}", lambda i: h()),
+
+        Cenario("GET /products/", "GET", lambda i: "/products/", lambda i: h(params={"limit": 50})),
+        Cenario("GET /products/?filtros", "GET", lambda i: "/products/", lambda i: h(params={
+            "limit": 50, "secao": f"secao_{random.randrange(40)}", "preco_min": 10, "preco_max": 50,
+            "disponivel": True, "ordenar_por": "valor_venda",
+        })),
+        Cenario("GET /products/{id}", "GET", lambda i: f"/products/{random.choice(ctx.produtos)}", lambda i: h()),
+        Cenario("POST /products/", "POST", lambda i: "/products/", lambda i: h(json=_novo_produto())),
+        Cenario("PUT /products/{id}", "PUT", lambda i: f"/products/{ctx.produtos_descartaveis[i]}",
+                lambda i: h(json={"valor_venda": round(random.uniform(1, 500), 2)})),
+        Cenario("GET /products/export", "GET", lambda i: "/products/export",
+                lambda i: h(params={"secao": f"secao_{random.randrange(40)}"}), 0.02),
+        Cenario("POST /products/import", "POST", lambda i: "/products/import", lambda i: h(
+            params={"formato": "ndjson"},
+            content="\n".join(json.dumps(_novo_produto()) for _ in range(1000)),
+        ), 0.02),
+
+        Cenario("GET /orders/", "GET", lambda i: "/orders/", lambda i: h(params={"limit": 50})),
+        Cenario("GET /orders/?filtros", "GET", lambda i: "/orders/", lambda i: h(params={
+            "limit": 50, "cliente_id": random.choice(ctx.clientes), **semana,
+        })),
+        Cenario("GET /orders/{id}", "GET", lambda i: f"/orders/{random.choice(ctx.pedidos or ctx.pedidos_descartaveis)}",
+                lambda i: h()),
+        Cenario("POST /orders/", "POST", lambda i: "/orders/", lambda i: h(json=ctx.novo_pedido())),
+        Cenario("POST /orders/batch", "POST", lambda i: "/orders/batch",
+                lambda i: h(json=[ctx.novo_pedido() for _ in range(50)]), 0.1),
+        Cenario("PUT /orders/{id}", "PUT", lambda i: f"/orders/{ctx.pedidos_descartaveis[i]}",
+                lambda i: h(json={"status": "cancelado"})),
+        Cenario("GET /orders/export", "GET", lambda i: "/orders/export", lambda i: h(params=semana), 0.02),
+
+        Cenario("GET /reports/sales-by-section", "GET", lambda i: "/reports/sales-by-section", lambda i: h(params={
+            "data_inicio": (hoje - timedelta(days=30)).isoformat(), "data_fim": hoje.isoformat(),
+        })),
+        Cenario("GET /monitoring/pool", "GET", lambda i: "/monitoring/pool", lambda i: h(), 0.2),
+        Cenario("GET /monitoring/caches", "GET", lambda i: "/monitoring/caches", lambda i: h(), 0.2),
+
+        # Remoções por último: os registros descartáveis ainda são usados pelos PUTs acima
+        Cenario("DELETE /orders/{id}", "DELETE", lambda i: f"/orders/{ctx.pedidos_descartaveis[i]}", lambda i: h()),
+        Cenario("DELETE /products/{id}", "DELETE", lambda i: f"/products/{ctx.produtos_descartaveis[i]}", lambda i: h()),
+    ]
+
+
+def _percentil(ordenadas: List[float], p: float) -> float:
+    # Nearest-rank sobre as latências já ordenadas
+    indice = max(0, min(len(ordenadas) - 1, round(p / 100 * len(ordenadas) + 0.5) - 1))
+    return ordenadas[indice]
+
+
+async def executar_cenario(cliente: httpx.AsyncClient, cenario: Cenario, total: int, concorrencia: int) -> Dict[str, Any]:
+    latencias: List[float] = []
+    status: Dict[str, int] = {}
+    proximo = iter(range(total))
+
+    async def trabalhador():
+        for i in proximo:
+            inicio = time.perf_counter()
+            try:
+                resposta = await cliente.request(cenario.metodo, cenario.caminho(i), **cenario.opcoes(i))
+                await resposta.aread()
+                codigo = str(resposta.status_code)
+            except httpx.HTTPError as erro:
+                codigo = type(erro).__name__
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            status[codigo] = status.get(codigo, 0) + 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(min(concorrencia, total))))
+    duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    erros = sum(n for codigo, n in status.items() if not codigo.startswith("2"))
+    return {
+        "requisicoes": total,
+        "erros": erros,
+        "status": status,
+        "duracao_s": round(duracao, 3),
+        "vazao_rps": round(total / duracao, 1),
+        "media_ms": round(statistics.fmean(latencias), 2),
+        "p50_ms": round(_percentil(latencias, 50), 2),
+        "p95_ms": round(_percentil(latencias, 95), 2),
+        "p99_ms": round(_percentil(latencias, 99), 2),
+        "max_ms": round(latencias[-1], 2),
+    }
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def medir(url: str, requisicoes: int, concorrencia: int, filtro: Optional[str]) -> Dict[str, Any]:
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=120) as cliente:
+        ctx = Contexto(cliente)
+        await ctx.preparar(requisicoes)
+        rotas = {}
+        for cenario in cenarios(ctx):
+            if filtro and filtro not in cenario.nome:
+                continue
+            total = max(2, int(requisicoes * cenario.fracao))
+            rotas[cenario.nome] = await executar_cenario(cliente, cenario, total, concorrencia)
+            r = rotas[cenario.nome]
+            print(
+                f"{cenario.nome:34} {r['vazao_rps']:>8} req/s  p50 {r['p50_ms']:>8} ms  "
+                f"p95 {r['p95_ms']:>8} ms  p99 {r['p99_ms']:>8} ms  erros {r['erros']}",
+                flush=True,
+            )
+    return {
+        "gerado_em": datetime.now(timezone.utc).isoformat(),
+        "commit": _commit_atual(),
+        "url": url,
+        "requisicoes": requisicoes,
+        "concorrencia": concorrencia,
+        "rotas": rotas,
+    }
+
+
+def comparar(base: Dict[str, Any], atual: Dict[str, Any], tolerancia: float) -> bool:
+    """Imprime a variação de p95 e vazão por rota; retorna False se alguma rota regrediu."""
+    ok = True
+    print(f"base {base.get('commit')} ({base['gerado_em']})  x  atual {atual.get('commit')} ({atual['gerado_em']})")
+    for nome, r in atual["rotas"].items():
+        anterior = base["rotas"].get(nome)
+        if not anterior:
+            print(f"{nome:34} (nova rota)")
+            continue
+        variacao_p95 = r["p95_ms"] / anterior["p95_ms"] - 1 if anterior["p95_ms"] else 0.0
+        variacao_vazao = r["vazao_rps"] / anterior["vazao_rps"] - 1 if anterior["vazao_rps"] else 0.0
+        regrediu = variacao_p95 > tolerancia
+        ok = ok and not regrediu
+        print(
+            f"{nome:34} p95 {anterior['p95_ms']:>8} -> {r['p95_ms']:>8} ms ({variacao_p95:+.0%})  "
+            f"vazão {variacao_vazao:+.0%}{'  REGRESSÃO' if regrediu else ''}"
+        )
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requisicoes", type=int, default=500, help="requisições por rota")
+    parser.add_argument("--concorrencia", type=int, default=32, help="requisições simultâneas")
+    parser.add_argument("--rotas", help="mede só as rotas cujo nome contém este texto")
+    parser.add_argument("--saida", default="benchmark.json", help="arquivo JSON com o resultado")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "ATUAL"), help="compara dois resultados")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="piora aceita no p95 (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.comparar:
+        with open(args.comparar[0]) as f_base, open(args.comparar[1]) as f_atual:
+            sys.exit(0 if comparar(json.load(f_base), json.load(f_atual), args.tolerancia) else 1)
+
+    resultado = asyncio.run(medir(args.url, args.requisicoes, args.concorrencia, args.rotas))
+    with open(args.saida, "w") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"Resultado gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
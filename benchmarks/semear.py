@@ -0,0 +1,105 @@
+"""Gera volumes realistas de clientes, produtos e pedidos para o benchmark.
+
+Uso: python -m benchmarks.semear --clientes 1000000 --produtos 200000 --linhas 5000000
+
+As linhas geradas são marcadas com o prefixo `bench_` (cpf e código de barras) e a carga é
+incremental: rodar de novo só completa o que falta para chegar aos volumes pedidos.
+"""
+import argparse
+import time
+
+from sqlalchemy import text
+
+from shared.database import SessionLocal, engine
+from clientes.models.clientes import Cliente  # registra o mapeamento usado por Pedido.cliente
+from relatorios.vendas import reconstruir_vendas
+
+SECOES = 40
+ITENS_POR_PEDIDO = 3
+LOTE = 200_000
+
+CLIENTES = """
+    INSERT INTO clientes (nome, email, cpf)
+    SELECT 'Cliente ' || md5(g::text), 'bench_' || g || '@exemplo.com', 'bench_' || g
+    FROM generate_series(:inicio, :fim) g
+"""
+
+PRODUTOS = """
+    INSERT INTO produtos (descricao, valor_venda, codigo_barras, secao, estoque_inicial, disponivel)
+    SELECT 'Produto ' || md5(g::text), round((1 + random() * 500)::numeric, 2), 'bench_' || g,
+           'secao_' || (g % :secoes), 1000000000, random() < 0.9
+    FROM generate_series(:inicio, :fim) g
+"""
+
+# Cliente e produtos sorteados por hash multiplicativo de g, localizados pelas chaves únicas
+# (cpf / codigo_barras) para não depender de ids consecutivos
+PEDIDOS = """
+    WITH novos AS (
+        INSERT INTO pedidos (cliente_id, status, data_criacao)
+        SELECT c.id, (ARRAY['pendente', 'pago', 'enviado', 'entregue', 'cancelado'])[1 + g % 5],
+               now() - random() * INTERVAL '730 days'
+        FROM generate_series(:inicio, :fim) g
+        JOIN clientes c ON c.cpf = 'bench_' || (1 + (g * 2654435761) % :clientes)
+        RETURNING id
+    )
+    INSERT INTO pedido_produto (pedido_id, produto_id, quantidade, valor_unitario, secao)
+    SELECT novos.id, p.id, 1 + (novos.id + n) % 5, p.valor_venda, p.secao
+    FROM novos
+    CROSS JOIN generate_series(0, :itens - 1) n
+    JOIN produtos p ON p.codigo_barras = 'bench_' || (1 + (novos.id * :itens + n) % :produtos)
+"""
+
+
+def _contar(conn, sql: str) -> int:
+    return conn.execute(text(sql)).scalar() or 0
+
+
+def _em_lotes(conn, nome: str, sql: str, existentes: int, alvo: int, **params) -> None:
+    inicio = time.perf_counter()
+    for lote_inicio in range(existentes + 1, alvo + 1, LOTE):
+        lote_fim = min(lote_inicio + LOTE - 1, alvo)
+        conn.execute(text(sql), {"inicio": lote_inicio, "fim": lote_fim, **params})
+        conn.commit()
+        print(f"{nome}: {lote_fim}/{alvo} ({time.perf_counter() - inicio:.1f}s)", flush=True)
+
+
+def semear(clientes: int, produtos: int, linhas: int) -> None:
+    pedidos = linhas // ITENS_POR_PEDIDO
+    with engine.connect() as conn:
+        # Carga descartável: não espera o fsync a cada commit
+        conn.execute(text("SET synchronous_commit TO off"))
+
+        existentes = _contar(conn, "SELECT count(*) FROM clientes WHERE cpf LIKE 'bench\\_%'")
+        _em_lotes(conn, "clientes", CLIENTES, existentes, clientes)
+
+        existentes = _contar(conn, "SELECT count(*) FROM produtos WHERE codigo_barras LIKE 'bench\\_%'")
+        _em_lotes(conn, "produtos", PRODUTOS, existentes, produtos, secoes=SECOES)
+
+        existentes = _contar(
+            conn,
+            "SELECT count(*) FROM pedidos p JOIN clientes c ON c.id = p.cliente_id WHERE c.cpf LIKE 'bench\\_%'",
+        )
+        _em_lotes(
+            conn, "pedidos", PEDIDOS, existentes, pedidos,
+            clientes=clientes, produtos=produtos, itens=ITENS_POR_PEDIDO,
+        )
+
+        conn.execute(text("ANALYZE clientes, produtos, pedidos, pedido_produto"))
+        conn.commit()
+
+    # Os pedidos foram inseridos direto no banco: recalcula o relatório de vendas por seção
+    with SessionLocal() as db:
+        reconstruir_vendas(db)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=1_000_000)
+    parser.add_argument("--produtos", type=int, default=200_000)
+    parser.add_argument("--linhas", type=int, default=5_000_000, help="linhas de pedido_produto")
+    args = parser.parse_args()
+    semear(args.clientes, args.produtos, args.linhas)
+
+
+if __name__ == "__main__":
+    main()
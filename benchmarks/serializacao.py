@@ -0,0 +1,71 @@
+"""Custo por linha da serialização das listagens: caminho do response_model x caminho rápido.
+
+Uso: python -m benchmarks.serializacao --linhas 100 --repeticoes 200
+
+Mede, para uma página de ProdutoOut, (1) objetos ORM validados pelo response_model e codificados
+pelo JSONResponse do FastAPI e (2) tuplas do banco convertidas em dict e codificadas por
+shared.serializacao; confere que os bytes gerados são idênticos.
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+import main  # noqa: F401  registra todos os modelos ORM
+from produtos.models.produtos import Produto
+from produtos.routers.produtos import ProdutoOut
+from shared.serializacao import json_bytes, orjson
+
+
+def _linhas(quantidade: int) -> List[tuple]:
+    return [
+        (
+            i, f"Produto ação {i}", round(random.uniform(1, 500), 2), f"{i:013d}", f"secao_{i % 40}",
+            random.randrange(1000), date(2026, 1, 1) + timedelta(days=i % 365) if i % 3 else None,
+            f"https://cdn.exemplo.com/{i}.png" if i % 2 else None, bool(i % 5),
+        )
+        for i in range(1, quantidade + 1)
+    ]
+
+
+def _medir(funcao, repeticoes: int) -> tuple:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao()
+    return time.perf_counter() - inicio, resultado
+
+
+def main_benchmark(linhas: int, repeticoes: int) -> None:
+    campos = list(ProdutoOut.model_fields)
+    tuplas = _linhas(linhas)
+    objetos = [Produto(**dict(zip(campos, t))) for t in tuplas]
+    adaptador = TypeAdapter(List[ProdutoOut])
+
+    def response_model():
+        # O que o FastAPI faz com o retorno: valida pelo response_model, serializa em modo json e codifica
+        validados = adaptador.validate_python(objetos, from_attributes=True)
+        return JSONResponse(adaptador.dump_python(validados, mode="json")).body
+
+    def rapido():
+        return json_bytes([dict(zip(campos, t)) for t in tuplas])
+
+    tempo_lento, corpo_lento = _medir(response_model, repeticoes)
+    tempo_rapido, corpo_rapido = _medir(rapido, repeticoes)
+    total = linhas * repeticoes
+    print(f"encoder: {'orjson ' + orjson.__version__ if orjson else 'json (stdlib)'}")
+    print(f"response_model + JSONResponse: {tempo_lento / total * 1e6:8.2f} µs/linha")
+    print(f"tuplas + encoder rápido:       {tempo_rapido / total * 1e6:8.2f} µs/linha "
+          f"({tempo_lento / tempo_rapido:.1f}x)")
+    print(f"saídas idênticas: {corpo_lento == corpo_rapido} ({len(corpo_rapido)} bytes por página)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=100, help="linhas por página")
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+    main_benchmark(args.linhas, args.repeticoes)
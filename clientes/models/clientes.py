@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String
 from shared.database import Base
 from sqlalchemy.orm import relationship
 
@@ -9,4 +9,10 @@ class Cliente(Base):
     nome = Column(String, nullable=False)
     email = Column(String, unique=True, nullable=False)
     cpf = Column(String, unique=True, nullable=False)
-    pedidos = relationship('Pedido', back_populates='cliente')
\ No newline at end of file
+    pedidos = relationship('Pedido', back_populates='cliente')
+
+    # Índices trigram (pg_trgm) para busca por substring/similaridade em nome e email
+    __table_args__ = (
+        Index('ix_clientes_nome_trgm', 'nome', postgresql_using='gin', postgresql_ops={'nome': 'gin_trgm_ops'}),
+        Index('ix_clientes_email_trgm', 'email', postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'}),
+    )
\ No newline at end of file
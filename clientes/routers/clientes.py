@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi import APIRouter, Depends, Query, HTTPException, Response, status
+from sqlalchemy import func, literal, or_, text
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, EmailStr, constr
 
-from shared.dependencias import get_db
+from shared.cache import cache_clientes
+from shared.dependencias import em_replica, get_db, get_db_leitura, executar, SessaoBanco
 from shared.database import Base
+from shared.paginacao import contar_total, cursor_query, fechar_pagina, limite_query, paginar, total_query
+from shared.serializacao import campos_query, colunas, resolver_campos, resposta_item, resposta_lista
 from clientes.models.clientes import Cliente
 from autenticacao.utils import verificar_token
 from autenticacao.routers.autenticacao import get_current_user, admin_required
@@ -42,25 +46,97 @@ class ClienteUpdate(BaseModel):
     response_model=List[ClienteOut],
     dependencies=[Depends(verificar_token)],
     summary="Listar clientes",
-    description="Retorna uma lista paginada de clientes, podendo filtrar por nome e email.",
+    description=(
+        "Retorna uma lista paginada de clientes, podendo filtrar por nome e email. "
+        "A paginação é por cursor: quando há mais resultados, o cabeçalho X-Next-Cursor "
+        "traz o valor a ser enviado em `cursor` para obter a próxima página. "
+        "Com `busca`, retorna os clientes mais parecidos com o termo (nome ou email), "
+        "ordenados por similaridade, usando os índices trigram. "
+        "Com `fields`, só os campos pedidos são lidos e retornados; com `total`, o total de itens "
+        "vem no cabeçalho X-Total-Count."
+    ),
     response_description="Lista de clientes",
+    responses={
+        400: {"description": "Cursor ou campos inválidos, ou `busca` combinada com `cursor`"},
+        501: {"description": "Busca por similaridade indisponível (extensão pg_trgm não instalada)"},
+    },
 )
-def listar_clientes(
-    skip: int = 0,
-    limit: int = 10,
+async def listar_clientes(
+    response: Response,
+    skip: int = Query(0, ge=0, deprecated=True, description="Use `cursor`; o offset fica mais lento em páginas profundas"),
+    limit: int = limite_query(),
+    cursor: Optional[str] = cursor_query(),
+    ordenar_por: Literal["id", "nome"] = Query("id", description="Campo de ordenação"),
+    ordem: Literal["asc", "desc"] = Query("asc", description="Direção da ordenação"),
     nome: Optional[str] = Query(None, description="Filtro pelo nome do cliente"),
     email: Optional[str] = Query(None, description="Filtro pelo email do cliente"),
-    db: Session = Depends(get_db)
+    busca: Optional[str] = Query(
+        None, min_length=3, description="Busca aproximada por nome ou email, ordenada por similaridade"
+    ),
+    fields: Optional[str] = campos_query(ClienteOut),
+    total: Optional[Literal["estimado", "exato"]] = total_query(),
+    db: SessaoBanco = Depends(get_db_leitura)
+):
+    if busca and cursor:
+        raise HTTPException(status_code=400, detail="A busca por similaridade não aceita cursor")
+    campos = resolver_campos(fields, ClienteOut)
+    clientes, proximo_cursor, cabecalhos_total = await executar(
+        db, _listar_clientes, skip, limit, cursor, ordenar_por, ordem, nome, email, busca, campos, total
+    )
+    return resposta_lista(clientes, response, proximo_cursor, campos, cabecalhos_total)
+
+def _listar_clientes(
+    db: Session,
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    ordenar_por: str,
+    ordem: str,
+    nome: Optional[str],
+    email: Optional[str],
+    busca: Optional[str] = None,
+    campos: Optional[List[str]] = None,
+    total: Optional[str] = None,
 ):
-    query = db.query(Cliente)
+    # Só as colunas do ClienteOut (ou as pedidas em fields, mais as do cursor), como tuplas
+    query = db.query(*colunas(Cliente, ClienteOut, campos, obrigatorios=("id", ordenar_por)))
 
+    # ilike '%x%' também é atendido pelos índices GIN trigram de nome e email
     if nome:
         query = query.filter(Cliente.nome.ilike(f"%{nome}%"))
     if email:
         query = query.filter(Cliente.email.ilike(f"%{email}%"))
+    if busca:
+        _exigir_pg_trgm(db)
+        # `termo <% coluna` (word similarity do pg_trgm) usa os índices GIN
+        termo = literal(busca)
+        query = query.filter(or_(termo.op("<%")(Cliente.nome), termo.op("<%")(Cliente.email)))
+    cabecalhos_total = contar_total(db, query, Cliente.id, total)
+    if busca:
+        return _buscar_clientes(query, busca, limit), None, cabecalhos_total
+
+    query = paginar(query, getattr(Cliente, ordenar_por), Cliente.id, ordenar_por, ordem, cursor, limit)
+    if skip:
+        query = query.offset(skip)
+    return (*fechar_pagina(query.all(), ordenar_por, ordem, limit), cabecalhos_total)
+
+# Só guardamos a presença: se faltar, a próxima busca verifica de novo (a extensão pode ser criada depois)
+_pg_trgm_instalado = False
+
+def _exigir_pg_trgm(db: Session):
+    global _pg_trgm_instalado
+    if not _pg_trgm_instalado:
+        _pg_trgm_instalado = db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+    if not _pg_trgm_instalado:
+        raise HTTPException(
+            status_code=501, detail="Busca por similaridade indisponível: extensão pg_trgm não instalada"
+        )
 
-    clientes = query.offset(skip).limit(limit).all()
-    return clientes
+def _buscar_clientes(query, busca: str, limit: int):
+    # O ranking considera a melhor similaridade entre nome e email
+    termo = literal(busca)
+    similaridade = func.greatest(func.word_similarity(termo, Cliente.nome), func.word_similarity(termo, Cliente.email))
+    return query.order_by(similaridade.desc(), Cliente.id).limit(limit).all()
 
 @router.post(
     "/",
@@ -74,7 +150,10 @@ def listar_clientes(
         201: {"description": "Cliente criado com sucesso"},
     }
 )
-def criar_cliente(cliente: ClienteIn, db: Session = Depends(get_db)):
+async def criar_cliente(cliente: ClienteIn, db: SessaoBanco = Depends(get_db)):
+    return await executar(db, _criar_cliente, cliente)
+
+def _criar_cliente(db: Session, cliente: ClienteIn):
     # Verifica se email já existe
     if db.query(Cliente).filter(Cliente.email == cliente.email).first():
         raise HTTPException(
@@ -100,14 +179,34 @@ def criar_cliente(cliente: ClienteIn, db: Session = Depends(get_db)):
     response_model=ClienteOut,
     dependencies=[Depends(verificar_token)],
     summary="Buscar cliente por ID",
-    description="Retorna os dados de um cliente pelo seu ID.",
+    description="Retorna os dados de um cliente pelo seu ID. Com `fields`, só os campos pedidos.",
     responses={
         404: {"description": "Cliente não encontrado"},
         200: {"description": "Cliente encontrado e retornado"},
     }
 )
-def get_cliente(id: int, db: Session = Depends(get_db)):
-    cliente = db.query(Cliente).filter(Cliente.id == id).first()
+async def get_cliente(
+    id: int,
+    fields: Optional[str] = campos_query(ClienteOut),
+    db: SessaoBanco = Depends(get_db_leitura),
+):
+    campos = resolver_campos(fields, ClienteOut)
+    cliente = cache_clientes.obter(id)
+    if campos:
+        # No cache só há o cliente completo; fora dele, busca apenas as colunas pedidas
+        if cliente is None:
+            cliente = await executar(db, _get_cliente, id, campos)
+        return resposta_item(cliente, campos)
+    if cliente is None:
+        marca = cache_clientes.marca()
+        cliente = ClienteOut.model_validate(await executar(db, _get_cliente, id))
+        if not em_replica(db):
+            cache_clientes.definir(id, cliente, marca=marca)
+    return cliente
+
+def _get_cliente(db: Session, id: int, campos: Optional[List[str]] = None):
+    query = db.query(*colunas(Cliente, ClienteOut, campos)) if campos else db.query(Cliente)
+    cliente = query.filter(Cliente.id == id).first()
     if not cliente:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
     return cliente
@@ -123,7 +222,12 @@ def get_cliente(id: int, db: Session = Depends(get_db)):
         200: {"description": "Cliente atualizado com sucesso"},
     }
 )
-def atualizar_cliente(id: int, dados: ClienteUpdate, db: Session = Depends(get_db)):
+async def atualizar_cliente(id: int, dados: ClienteUpdate, db: SessaoBanco = Depends(get_db)):
+    cliente = await executar(db, _atualizar_cliente, id, dados)
+    cache_clientes.remover(id)
+    return cliente
+
+def _atualizar_cliente(db: Session, id: int, dados: ClienteUpdate):
     cliente = db.query(Cliente).filter(Cliente.id == id).first()
     if not cliente:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
@@ -150,7 +254,11 @@ def atualizar_cliente(id: int, dados: ClienteUpdate, db: Session = Depends(get_d
         204: {"description": "Cliente deletado com sucesso (sem conteúdo)"},
     }
 )
-def deletar_cliente(id: int, db: Session = Depends(get_db)):
+async def deletar_cliente(id: int, db: SessaoBanco = Depends(get_db)):
+    await executar(db, _deletar_cliente, id)
+    cache_clientes.remover(id)
+
+def _deletar_cliente(db: Session, id: int):
     cliente = db.query(Cliente).filter(Cliente.id == id).first()
     if not cliente:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
@@ -1,21 +1,63 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from shared import config
 from shared.database import engine, Base
+from shared.idempotencia import MiddlewareIdempotencia, limpar_periodicamente
+from shared.metricas import MiddlewareMetricas
+from shared.replicas import REPLICAS, MiddlewareLeituraAposEscrita, verificar_periodicamente
+from shared.tarefas import iniciar_trabalhadores
 
 # Configurações do FastAPI
 from autenticacao.routers import autenticacao
 from clientes.routers import clientes
 from produtos.routers import produtos
 from pedidos.routers import pedidos
+from monitoramento.routers import monitoramento, metricas
+from relatorios.routers import relatorios
 
 # Configurações do banco de dados
 from autenticacao.models.autenticacao import Tabela_Usuarios
 from clientes.models.clientes import Cliente
 from produtos.models.produtos import Produto
 from pedidos.models.pedidos import Pedido
+from relatorios.models.relatorios import VendaSecaoDia
+from produtos.estoque import compactar_periodicamente
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    tarefas = [asyncio.create_task(limpar_periodicamente())]
+    if config.ESTOQUE_LEDGER and config.ESTOQUE_COMPACTACAO_SEGUNDOS > 0:
+        tarefas.append(asyncio.create_task(compactar_periodicamente(config.ESTOQUE_COMPACTACAO_SEGUNDOS)))
+    if REPLICAS:
+        tarefas.append(asyncio.create_task(verificar_periodicamente(config.DB_REPLICA_VERIFICACAO_SEGUNDOS)))
+    if config.TAREFAS_TRABALHADORES > 0:
+        tarefas += iniciar_trabalhadores(config.TAREFAS_TRABALHADORES, config.TAREFAS_INTERVALO_SEGUNDOS)
+    yield
+    for tarefa in tarefas:
+        tarefa.cancel()
+
+
+app = FastAPI(lifespan=ciclo_de_vida)
+
+# Idempotency-Key nas escritas de pedidos, clientes e produtos
+app.add_middleware(MiddlewareIdempotencia)
+
+# Leituras no primário logo após uma escrita do mesmo cliente (só com réplicas)
+if REPLICAS and config.DB_LER_PRIMARIO_APOS_ESCRITA_SEGUNDOS > 0:
+    app.add_middleware(MiddlewareLeituraAposEscrita)
 
-app = FastAPI()
+# Histogramas por rota, contagem/tempo de SQL por requisição e cabeçalho Server-Timing;
+# também identifica a rota de cada consulta lenta
+if config.METRICAS_ATIVAS or config.CONSULTAS_LENTAS_MS > 0:
+    app.add_middleware(MiddlewareMetricas)
 
 app.include_router(autenticacao.router)
 app.include_router(clientes.router, prefix="/clients", tags=["Clientes"])
 app.include_router(produtos.router)
-app.include_router(pedidos.router)
\ No newline at end of file
+app.include_router(pedidos.router)
+app.include_router(monitoramento.router)
+app.include_router(metricas.router)
+app.include_router(relatorios.router)
\ No newline at end of file
@@ -0,0 +1,51 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from shared import config
+from shared.database import engine_ativo
+from shared.metricas import HISTOGRAMAS, exportar_valores
+from shared.replicas import REPLICAS
+from shared.tarefas import resumo_fila
+
+router = APIRouter(tags=["Monitoramento"])
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Métricas Prometheus",
+    description=(
+        "Métricas no formato texto do Prometheus: histogramas de duração por rota, de quantidade e tempo "
+        "de SQL por requisição, de espera por conexão e das tarefas em segundo plano, além do estado "
+        "atual do pool e da fila de tarefas."
+    ),
+)
+async def metricas():
+    pool = engine_ativo().pool.estatisticas()
+    linhas = []
+    for histograma in HISTOGRAMAS:
+        linhas += histograma.exportar()
+    linhas += exportar_valores(
+        "db_pool_conexoes", "gauge", "Conexões do pool por estado.",
+        {(estado,): pool[estado] for estado in ("em_uso", "ociosas", "overflow")}, ("estado",),
+    )
+    linhas += exportar_valores("db_pool_aguardando", "gauge", "Requisições aguardando uma conexão.", {(): pool["aguardando"]})
+    linhas += exportar_valores("db_pool_checkouts_total", "counter", "Conexões entregues pelo pool.", {(): pool["checkouts"]})
+    linhas += exportar_valores("db_pool_timeouts_total", "counter", "Esperas por conexão que estouraram o timeout.", {(): pool["timeouts"]})
+    if REPLICAS:
+        linhas += exportar_valores(
+            "db_replica_saudavel", "gauge", "1 se a réplica está no rodízio de leituras.",
+            {(replica.nome,): int(replica.saudavel) for replica in REPLICAS}, ("replica",),
+        )
+    if config.TAREFAS_TRABALHADORES > 0:
+        fila = await run_in_threadpool(resumo_fila)
+        linhas += exportar_valores(
+            "tarefas_fila", "gauge", "Tarefas em segundo plano na fila por tipo e estado.",
+            {(item["tipo"], item["estado"]): item["quantidade"] for item in fila}, ("tipo", "estado"),
+        )
+        linhas += exportar_valores(
+            "tarefas_mais_antiga_segundos", "gauge", "Idade da tarefa mais antiga na fila por tipo e estado.",
+            {(item["tipo"], item["estado"]): item["mais_antiga_segundos"] for item in fila}, ("tipo", "estado"),
+        )
+    return PlainTextResponse("\n".join(linhas) + "\n", media_type="text/plain; version=0.0.4")
@@ -0,0 +1,119 @@
+from typing import List, Literal, Optional
+
+from anyio import to_thread
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from shared import config
+from shared.cache import CACHES
+from shared.consultas_lentas import registro as registro_consultas_lentas
+from shared.database import engine_ativo
+from shared.dependencias import get_db, executar, SessaoBanco
+from shared.replicas import REPLICAS
+from shared.tarefas import reenfileirar_falhas, resumo_fila, tarefas_com_falha
+from autenticacao.routers.autenticacao import admin_required
+
+router = APIRouter(prefix="/monitoring", tags=["Monitoramento"])
+
+
+@router.get(
+    "/pool",
+    dependencies=[Depends(admin_required)],
+    summary="Estatísticas do pool de conexões",
+    description=(
+        "Retorna o estado atual do pool de conexões (em uso, overflow, requisições aguardando "
+        "e tempo médio de checkout), junto com o limite do threadpool e o max_connections do "
+        "PostgreSQL, para dimensionar o pool. Com réplicas de leitura, inclui a saúde e o pool de cada uma."
+    ),
+)
+async def estatisticas_pool(db: SessaoBanco = Depends(get_db)):
+    max_connections = await executar(db, _max_connections)
+    return {
+        "pool": engine_ativo().pool.estatisticas(),
+        "threadpool_limite": to_thread.current_default_thread_limiter().total_tokens,
+        "postgres_max_connections": max_connections,
+        "replicas": [replica.estatisticas() for replica in REPLICAS],
+    }
+
+def _max_connections(db: Session) -> int:
+    return int(db.execute(text("SHOW max_connections")).scalar())
+
+
+@router.get(
+    "/caches",
+    dependencies=[Depends(admin_required)],
+    summary="Estatísticas dos caches em memória",
+    description="Retorna, para cada cache da aplicação, itens, acertos, falhas, taxa de acerto e descartes.",
+)
+async def estatisticas_caches():
+    return {nome: cache.estatisticas() for nome, cache in CACHES.items()}
+
+
+def _registro_ativo():
+    if registro_consultas_lentas is None:
+        raise HTTPException(
+            status_code=404, detail="Registro de consultas lentas desativado (defina CONSULTAS_LENTAS_MS)"
+        )
+    return registro_consultas_lentas
+
+
+@router.get(
+    "/slow-queries",
+    dependencies=[Depends(admin_required)],
+    summary="Resumo das consultas lentas",
+    description=(
+        "Agrupa por SQL normalizado os comandos que passaram de CONSULTAS_LENTAS_MS desde o início do "
+        "processo (ou da última limpeza): ocorrências, tempo total, médio e máximo, rotas que os "
+        "dispararam e o último EXPLAIN (ANALYZE, BUFFERS) amostrado. O detalhe de cada ocorrência fica "
+        "no arquivo CONSULTAS_LENTAS_ARQUIVO."
+    ),
+    responses={404: {"description": "Registro de consultas lentas desativado"}},
+)
+async def consultas_lentas(
+    limite: int = Query(20, ge=1, le=500, description="Quantidade de SQLs retornados"),
+    ordenar_por: Literal["total_ms", "maximo_ms", "media_ms", "ocorrencias"] = Query(
+        "total_ms", description="Critério de ordenação"
+    ),
+):
+    return _registro_ativo().resumo(limite, ordenar_por)
+
+
+@router.delete(
+    "/slow-queries",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(admin_required)],
+    summary="Limpar resumo das consultas lentas",
+    description="Zera o resumo em memória (o arquivo de log não é alterado).",
+    responses={404: {"description": "Registro de consultas lentas desativado"}},
+)
+async def limpar_consultas_lentas():
+    _registro_ativo().limpar()
+
+
+@router.get(
+    "/tasks",
+    dependencies=[Depends(admin_required)],
+    summary="Fila de tarefas em segundo plano",
+    description=(
+        "Tarefas na fila por tipo e estado (`pendente` ou `falhou`), com a idade da mais antiga, "
+        "e as últimas tarefas que esgotaram as tentativas, com o erro."
+    ),
+)
+async def fila_tarefas(limite: int = Query(20, ge=1, le=500, description="Quantidade de falhas retornadas")):
+    return {
+        "trabalhadores": config.TAREFAS_TRABALHADORES,
+        "fila": await run_in_threadpool(resumo_fila),
+        "falhas": await run_in_threadpool(tarefas_com_falha, limite),
+    }
+
+
+@router.post(
+    "/tasks/retry",
+    dependencies=[Depends(admin_required)],
+    summary="Repetir tarefas que falharam",
+    description="Devolve à fila as tarefas com estado `falhou` (todas, ou só as de `ids`), com as tentativas zeradas.",
+)
+async def repetir_tarefas(ids: Optional[List[int]] = Body(None, embed=True)):
+    return {"reenfileiradas": await run_in_threadpool(reenfileirar_falhas, ids)}
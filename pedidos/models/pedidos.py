@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Float, Index, Integer, String, ForeignKey, DateTime, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from shared.database import Base
@@ -10,10 +10,18 @@ class PedidoProduto(Base):
     pedido_id = Column(Integer, ForeignKey('pedidos.id'), primary_key=True)
     produto_id = Column(Integer, ForeignKey('produtos.id'), primary_key=True)
     quantidade = Column(Integer, nullable=False, default=1)
+    # Preço e seção do produto no momento do pedido: o relatório de vendas não muda quando o produto muda
+    valor_unitario = Column(Float, nullable=False)
+    secao = Column(String, nullable=False)
 
     pedido = relationship("Pedido", back_populates="pedido_produtos")
     produto = relationship("Produto", back_populates="pedido_produtos")
 
+    # A chave primária começa por pedido_id; buscas por produto precisam do índice invertido
+    __table_args__ = (
+        Index('ix_pedido_produto_produto_id', 'produto_id', 'pedido_id'),
+    )
+
 
 class Pedido(Base):
     __tablename__ = 'pedidos'
@@ -21,7 +29,14 @@ class Pedido(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     cliente_id = Column(Integer, ForeignKey('clientes.id'), nullable=False)
     status = Column(String, nullable=False, default='pendente')
-    data_criacao = Column(DateTime, default=datetime.utcnow)
+    # NOT NULL: a paginação por cursor compara (data_criacao, id), e NULL nunca passaria no filtro
+    data_criacao = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=text("timezone('utc', now())"))
 
     cliente = relationship('Cliente', back_populates="pedidos")
     pedido_produtos = relationship('PedidoProduto', back_populates='pedido', cascade="all, delete-orphan")
+
+    # Filtros da listagem por cliente e por período, com id para a paginação por cursor
+    __table_args__ = (
+        Index('ix_pedidos_cliente_id_id', 'cliente_id', 'id'),
+        Index('ix_pedidos_data_criacao_id', 'data_criacao', 'id'),
+    )
@@ -1,23 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from collections import defaultdict
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, insert, literal_column, select, text, update
+from sqlalchemy.orm import Session, selectinload
+from typing import Annotated, Dict, List, Literal, Optional
 from datetime import datetime
 
-from shared.dependencias import get_db
+from shared import config
+from shared.cache import cache_pedidos, cache_produtos
+from shared.dependencias import em_replica, get_db, get_db_leitura, executar, SessaoBanco
+from shared.exportacao import resposta_exportacao
+from shared.replicas import engine_leitura
+from shared.paginacao import contar_total, cursor_query, fechar_pagina, limite_query, paginar, total_query
+from shared.serializacao import resposta_lista
 from pedidos.models.pedidos import Pedido, PedidoProduto
 from clientes.models.clientes import Cliente
 from produtos.models.produtos import Produto
+from produtos.estoque import baixar_estoque, reservar_estoque, travar_estoque, verificar_estoque
+from relatorios.vendas import STATUS_CANCELADO, registrar_vendas
 from autenticacao.utils import verificar_token
 from autenticacao.routers.autenticacao import get_current_user, admin_required
 
-from pydantic import BaseModel
+from pydantic import AliasChoices, BaseModel, Field
 
 router = APIRouter(prefix="/orders", tags=["Pedidos"])
 
+# Itens do pedido carregados junto, numa consulta IN (...), em vez de um SELECT lazy na serialização
+COM_ITENS = selectinload(Pedido.pedido_produtos)
+
+# Transições de status aceitas pela atualização em lote: status atual -> novos status permitidos
+TRANSICOES_STATUS = {
+    "pendente": {"pago", "enviado", STATUS_CANCELADO},
+    "pago": {"enviado", STATUS_CANCELADO},
+    "enviado": {"entregue"},
+    "entregue": set(),
+    STATUS_CANCELADO: {"pendente"},
+}
+
+# Grava os itens com o preço e a seção que o produto tem agora, num único INSERT ... SELECT
+INSERIR_ITENS = text("""
+    INSERT INTO pedido_produto (pedido_id, produto_id, quantidade, valor_unitario, secao)
+    SELECT i.pedido_id, i.produto_id, i.quantidade, p.valor_venda, p.secao
+    FROM unnest(CAST(:pedidos AS integer[]), CAST(:produtos AS integer[]), CAST(:quantidades AS integer[]))
+         AS i(pedido_id, produto_id, quantidade)
+    JOIN produtos p ON p.id = i.produto_id
+""")
+
 # Schemas Pydantic para entrada e saída
 class ProdutoPedido(BaseModel):
     produto_id: int
-    quantidade: int
+    # Quantidade zero ou negativa devolveria estoque em vez de baixá-lo
+    quantidade: int = Field(gt=0)
+
+    class Config:
+        from_attributes = True
 
 class PedidoCreate(BaseModel):
     cliente_id: int
@@ -31,11 +67,46 @@ class PedidoOut(BaseModel):
     cliente_id: int
     status: str
     data_criacao: datetime
-    produtos: List[ProdutoPedido]
+    # Preenchido a partir de Pedido.pedido_produtos (carregado em lote com selectinload)
+    produtos: List[ProdutoPedido] = Field(validation_alias=AliasChoices("pedido_produtos", "produtos"))
 
     class Config:
         from_attributes = True
 
+class FiltroPedidos(BaseModel):
+    cliente_id: Optional[int] = None
+    status: Optional[str] = None
+    secao: Optional[str] = None
+    data_inicio: Optional[datetime] = None
+    data_fim: Optional[datetime] = None
+
+class StatusLoteIn(BaseModel):
+    status: str  # novo status
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=config.LOTE_PEDIDOS_MAXIMO)
+    filtro: Optional[FiltroPedidos] = None  # mesmos filtros da listagem
+
+class PedidoRejeitado(BaseModel):
+    id: int
+    status: Optional[str] = None  # status atual; nulo se o pedido não existe
+    erro: str
+
+class ResultadoStatusLote(BaseModel):
+    status: str
+    atualizados: List[int]
+    rejeitados: List[PedidoRejeitado]
+    rejeitados_truncados: bool = False  # com `filtro`, só os primeiros LOTE_PEDIDOS_MAXIMO rejeitados voltam
+
+class ResultadoPedidoLote(BaseModel):
+    indice: int  # posição do pedido no lote enviado
+    sucesso: bool
+    pedido: Optional[PedidoOut] = None
+    erro: Optional[str] = None
+
+
+def _carregar_pedido(db: Session, id: int) -> Optional[Pedido]:
+    # populate_existing: depois de um commit, recarrega o pedido que já está na sessão
+    return db.query(Pedido).options(COM_ITENS).populate_existing().filter(Pedido.id == id).first()
+
 
 @router.get(
     "/",
@@ -43,22 +114,80 @@ class PedidoOut(BaseModel):
     dependencies=[Depends(verificar_token)],
     summary="Listar pedidos",
     description=(
-        "Retorna a lista de pedidos, com filtros opcionais por ID do pedido, "
-        "ID do cliente, status, seção dos produtos, e intervalo de datas."
+        "Retorna a lista paginada de pedidos, com filtros opcionais por ID do pedido, "
+        "ID do cliente, status, seção dos produtos, e intervalo de datas. "
+        "A paginação é por cursor: quando há mais resultados, o cabeçalho X-Next-Cursor "
+        "traz o valor a ser enviado em `cursor` para obter a próxima página. "
+        "Com `total`, o total de itens vem no cabeçalho X-Total-Count."
     ),
     response_description="Lista de pedidos filtrados",
 )
-def listar_pedidos(
+async def listar_pedidos(
+    response: Response,
+    limit: int = limite_query(),
+    cursor: Optional[str] = cursor_query(),
+    ordenar_por: Literal["id", "data_criacao"] = Query("id", description="Campo de ordenação"),
+    ordem: Literal["asc", "desc"] = Query("asc", description="Direção da ordenação"),
     id_pedido: Optional[int] = Query(None, description="ID específico do pedido"),
     cliente_id: Optional[int] = Query(None, description="ID do cliente"),
     status: Optional[str] = Query(None, description="Status do pedido"),
     secao: Optional[str] = Query(None, description="Seção dos produtos no pedido"),
     data_inicio: Optional[datetime] = Query(None, description="Data inicial do pedido (inclusive)"),
     data_fim: Optional[datetime] = Query(None, description="Data final do pedido (inclusive)"),
-    db: Session = Depends(get_db)
+    total: Optional[Literal["estimado", "exato"]] = total_query(),
+    db: SessaoBanco = Depends(get_db_leitura)
+):
+    pedidos, proximo_cursor, cabecalhos_total = await executar(
+        db, _listar_pedidos, limit, cursor, ordenar_por, ordem,
+        id_pedido, cliente_id, status, secao, data_inicio, data_fim, total,
+    )
+    return resposta_lista(pedidos, response, proximo_cursor, total=cabecalhos_total)
+
+def _listar_pedidos(
+    db: Session,
+    limit: int,
+    cursor: Optional[str],
+    ordenar_por: str,
+    ordem: str,
+    id_pedido: Optional[int],
+    cliente_id: Optional[int],
+    status: Optional[str],
+    secao: Optional[str],
+    data_inicio: Optional[datetime],
+    data_fim: Optional[datetime],
+    total: Optional[str] = None,
 ):
-    query = db.query(Pedido)
+    query = _filtrar_pedidos(
+        db.query(Pedido.id, Pedido.cliente_id, Pedido.status, Pedido.data_criacao),
+        id_pedido, cliente_id, status, secao, data_inicio, data_fim,
+    )
+    cabecalhos_total = contar_total(db, query, Pedido.id, total)
+    query = paginar(query, getattr(Pedido, ordenar_por), Pedido.id, ordenar_por, ordem, cursor, limit)
+    linhas, proximo_cursor = fechar_pagina(query.all(), ordenar_por, ordem, limit)
 
+    # Itens de todos os pedidos da página numa única consulta IN (...), como o selectinload fazia,
+    # mas como tuplas e já no formato de PedidoOut.produtos
+    pedidos = [dict(linha._asdict(), produtos=[]) for linha in linhas]
+    por_id = {pedido["id"]: pedido["produtos"] for pedido in pedidos}
+    if por_id:
+        itens = db.execute(
+            select(PedidoProduto.pedido_id, PedidoProduto.produto_id, PedidoProduto.quantidade)
+            .where(PedidoProduto.pedido_id.in_(por_id))
+        )
+        for pedido_id, produto_id, quantidade in itens:
+            por_id[pedido_id].append({"produto_id": produto_id, "quantidade": quantidade})
+    return pedidos, proximo_cursor, cabecalhos_total
+
+def _filtrar_pedidos(
+    query,
+    id_pedido: Optional[int],
+    cliente_id: Optional[int],
+    status: Optional[str],
+    secao: Optional[str],
+    data_inicio: Optional[datetime],
+    data_fim: Optional[datetime],
+):
+    # Aceita tanto Query do ORM quanto select(); usado pela listagem e pela exportação
     if id_pedido:
         query = query.filter(Pedido.id == id_pedido)
     if cliente_id:
@@ -70,11 +199,52 @@ def listar_pedidos(
     if data_fim:
         query = query.filter(Pedido.data_criacao <= data_fim)
     if secao:
-        # Filtro pela seção dos produtos do pedido
-        query = query.join(Pedido.produtos).filter(Produto.secao.ilike(f"%{secao}%"))
+        # Filtro pela seção dos produtos do pedido (EXISTS, para não repetir o pedido por item)
+        query = query.filter(
+            Pedido.pedido_produtos.any(PedidoProduto.produto.has(Produto.secao.ilike(f"%{secao}%")))
+        )
+    return query
 
-    pedidos = query.all()
-    return pedidos
+@router.get(
+    "/export",
+    dependencies=[Depends(verificar_token)],
+    summary="Exportar pedidos",
+    description=(
+        "Exporta todos os pedidos que atendem aos filtros (os mesmos da listagem), com seus itens, "
+        "em NDJSON ou CSV (itens como JSON na coluna `produtos`), transmitidos em streaming a partir "
+        "de um cursor do servidor, com uso de memória constante."
+    ),
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}},
+)
+async def exportar_pedidos(
+    request: Request,
+    formato: Literal["ndjson", "csv"] = Query("ndjson", description="Formato da exportação"),
+    id_pedido: Optional[int] = Query(None, description="ID específico do pedido"),
+    cliente_id: Optional[int] = Query(None, description="ID do cliente"),
+    status: Optional[str] = Query(None, description="Status do pedido"),
+    secao: Optional[str] = Query(None, description="Seção dos produtos no pedido"),
+    data_inicio: Optional[datetime] = Query(None, description="Data inicial do pedido (inclusive)"),
+    data_fim: Optional[datetime] = Query(None, description="Data final do pedido (inclusive)"),
+):
+    # Itens agregados em JSON por pedido, numa subconsulta correlacionada (usa a PK de pedido_produto)
+    itens = (
+        select(
+            func.coalesce(
+                func.json_agg(
+                    func.json_build_object(
+                        "produto_id", PedidoProduto.produto_id, "quantidade", PedidoProduto.quantidade
+                    )
+                ),
+                literal_column("'[]'::json"),
+            )
+        )
+        .where(PedidoProduto.pedido_id == Pedido.id)
+        .scalar_subquery()
+    )
+    consulta = select(Pedido.id, Pedido.cliente_id, Pedido.status, Pedido.data_criacao, itens).order_by(Pedido.id)
+    consulta = _filtrar_pedidos(consulta, id_pedido, cliente_id, status, secao, data_inicio, data_fim)
+    return resposta_exportacao(consulta, list(PedidoOut.model_fields), formato, "pedidos", engine_leitura(request))
 
 
 @router.post(
@@ -90,34 +260,227 @@ def listar_pedidos(
         404: {"description": "Cliente ou produto não encontrado"},
     },
 )
-def criar_pedido(pedido_in: PedidoCreate, db: Session = Depends(get_db)):
-    cliente = db.query(Cliente).filter(Cliente.id == pedido_in.cliente_id).first()
-    if not cliente:
+async def criar_pedido(pedido_in: PedidoCreate, db: SessaoBanco = Depends(get_db)):
+    pedido = await executar(db, _criar_pedido, pedido_in)
+    # O estoque dos produtos mudou
+    cache_produtos.remover(*(item.produto_id for item in pedido.produtos))
+    return pedido
+
+def _criar_pedido(db: Session, pedido_in: PedidoCreate):
+    cliente_existe = db.query(Cliente.id).filter(Cliente.id == pedido_in.cliente_id).first()
+    if not cliente_existe:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
 
-    produtos_pedido = []
-    for item in pedido_in.produtos:
-        produto = db.query(Produto).filter(Produto.id == item.produto_id).first()
-        if not produto:
-            raise HTTPException(status_code=404, detail=f"Produto {item.produto_id} não encontrado")
-        if produto.estoque_inicial is None or produto.estoque_inicial < item.quantidade:
-            raise HTTPException(status_code=400, detail=f"Estoque insuficiente para produto {produto.id}")
-        produtos_pedido.append((produto, item.quantidade))
+    quantidades = _quantidades_por_produto(pedido_in)
+    reservar_estoque(db, quantidades)
 
     novo_pedido = Pedido(cliente_id=pedido_in.cliente_id, status='pendente')
     db.add(novo_pedido)
     db.flush()  # Para gerar id do pedido
 
-    for produto, quantidade in produtos_pedido:
-        # Atualizar estoque
-        produto.estoque_inicial -= quantidade
-        # Inserir na tabela associativa
-        stmt = PedidoProduto.insert().values(pedido_id=novo_pedido.id, produto_id=produto.id, quantidade=quantidade)
-        db.execute(stmt)
+    itens = [
+        {"pedido_id": novo_pedido.id, "produto_id": produto_id, "quantidade": quantidade}
+        for produto_id, quantidade in quantidades.items()
+    ]
+    _inserir_itens(db, itens)
+    registrar_vendas(db, [novo_pedido.id])
 
+    resposta = PedidoOut(
+        id=novo_pedido.id,
+        cliente_id=novo_pedido.cliente_id,
+        status=novo_pedido.status,
+        data_criacao=novo_pedido.data_criacao,
+        produtos=[ProdutoPedido(produto_id=i["produto_id"], quantidade=i["quantidade"]) for i in itens],
+    )
     db.commit()
-    db.refresh(novo_pedido)
-    return novo_pedido
+    return resposta
+
+def _inserir_itens(db: Session, itens: List[dict]) -> None:
+    if not itens:
+        return
+    db.execute(INSERIR_ITENS, {
+        "pedidos": [i["pedido_id"] for i in itens],
+        "produtos": [i["produto_id"] for i in itens],
+        "quantidades": [i["quantidade"] for i in itens],
+    })
+
+def _quantidades_por_produto(pedido_in: PedidoCreate) -> Dict[int, int]:
+    # Soma itens repetidos do mesmo produto (a chave de pedido_produto é pedido + produto)
+    quantidades = defaultdict(int)
+    for item in pedido_in.produtos:
+        quantidades[item.produto_id] += item.quantidade
+    return dict(quantidades)
+
+
+@router.post(
+    "/batch",
+    response_model=List[ResultadoPedidoLote],
+    dependencies=[Depends(admin_required)],
+    summary="Criar pedidos em lote",
+    description=(
+        "Cria vários pedidos numa única requisição e transação. Clientes e produtos são validados "
+        "com consultas em conjunto e o estoque é baixado num único UPDATE. Cada pedido é avaliado "
+        "na ordem do lote: os que falham (cliente ou produto inexistente, estoque insuficiente) "
+        "são reportados com o motivo, sem impedir a criação dos demais."
+    ),
+    responses={
+        200: {"description": "Resultado de cada pedido do lote, na ordem enviada"},
+    },
+)
+async def criar_pedidos_lote(
+    pedidos_in: Annotated[List[PedidoCreate], Body(min_length=1, max_length=config.LOTE_PEDIDOS_MAXIMO)],
+    db: SessaoBanco = Depends(get_db),
+):
+    resultados = await executar(db, _criar_pedidos_lote, pedidos_in)
+    cache_produtos.remover(*{item.produto_id for r in resultados if r.pedido for item in r.pedido.produtos})
+    return resultados
+
+def _criar_pedidos_lote(db: Session, pedidos_in: List[PedidoCreate]) -> List[ResultadoPedidoLote]:
+    quantidades_por_pedido = [_quantidades_por_produto(p) for p in pedidos_in]
+
+    ids_clientes = {p.cliente_id for p in pedidos_in}
+    clientes_existentes = set(db.execute(select(Cliente.id).where(Cliente.id.in_(ids_clientes))).scalars())
+    estoques = travar_estoque(db, {pid for q in quantidades_por_pedido for pid in q})
+
+    # Avalia os pedidos na ordem do lote contra o estoque em memória
+    resultados: List[ResultadoPedidoLote] = []
+    aceitos = []
+    baixa_total = defaultdict(int)
+    for indice, (pedido_in, quantidades) in enumerate(zip(pedidos_in, quantidades_por_pedido)):
+        if pedido_in.cliente_id not in clientes_existentes:
+            resultados.append(ResultadoPedidoLote(indice=indice, sucesso=False, erro="Cliente não encontrado"))
+            continue
+        erro = verificar_estoque(estoques, quantidades)
+        if erro:
+            resultados.append(ResultadoPedidoLote(indice=indice, sucesso=False, erro=erro.detail))
+            continue
+        for produto_id, quantidade in quantidades.items():
+            estoques[produto_id] -= quantidade
+            baixa_total[produto_id] += quantidade
+        resultados.append(ResultadoPedidoLote(indice=indice, sucesso=True))
+        aceitos.append((indice, pedido_in, quantidades))
+
+    if not aceitos:
+        db.rollback()
+        return resultados
+
+    baixar_estoque(db, dict(baixa_total))
+
+    novos = db.execute(
+        insert(Pedido).returning(Pedido.id, Pedido.data_criacao, sort_by_parameter_order=True),
+        [{"cliente_id": pedido_in.cliente_id, "status": "pendente"} for _, pedido_in, _ in aceitos],
+    ).all()
+
+    itens = []
+    for (indice, pedido_in, quantidades), (pedido_id, data_criacao) in zip(aceitos, novos):
+        itens += [
+            {"pedido_id": pedido_id, "produto_id": produto_id, "quantidade": quantidade}
+            for produto_id, quantidade in quantidades.items()
+        ]
+        resultados[indice].pedido = PedidoOut(
+            id=pedido_id,
+            cliente_id=pedido_in.cliente_id,
+            status="pendente",
+            data_criacao=data_criacao,
+            produtos=[ProdutoPedido(produto_id=pid, quantidade=q) for pid, q in quantidades.items()],
+        )
+    _inserir_itens(db, itens)
+    registrar_vendas(db, [pedido_id for pedido_id, _ in novos])
+
+    db.commit()
+    return resultados
+
+
+@router.patch(
+    "/status",
+    response_model=ResultadoStatusLote,
+    dependencies=[Depends(admin_required)],
+    summary="Atualizar status de pedidos em lote",
+    description=(
+        "Move para `status` os pedidos de `ids` ou todos os que atendem a `filtro` (os filtros da "
+        "listagem), num único UPDATE. Só mudam os pedidos cujo status atual permite a transição "
+        "(pendente → pago, enviado ou cancelado; pago → enviado ou cancelado; enviado → entregue; "
+        "cancelado → pendente); os demais voltam em `rejeitados`, com o motivo (com `filtro`, só os "
+        "primeiros `LOTE_PEDIDOS_MAXIMO`, em ordem de id, e `rejeitados_truncados` indica se há mais). "
+        "Cancelamentos e reativações atualizam o relatório de vendas na mesma transação."
+    ),
+    responses={
+        200: {"description": "Pedidos atualizados e rejeitados"},
+        400: {"description": "Status desconhecido, ou nem `ids` nem `filtro` (ou ambos)"},
+    },
+)
+async def atualizar_status_lote(dados: StatusLoteIn, db: SessaoBanco = Depends(get_db)):
+    if dados.status not in TRANSICOES_STATUS:
+        raise HTTPException(
+            status_code=400, detail=f"Status desconhecido. Permitidos: {', '.join(TRANSICOES_STATUS)}"
+        )
+    filtro = dados.filtro.model_dump(exclude_none=True) if dados.filtro else {}
+    if (dados.ids is None) == (not filtro):
+        raise HTTPException(status_code=400, detail="Informe `ids` ou ao menos um campo de `filtro`, não ambos")
+    resultado = await executar(db, _atualizar_status_lote, dados.status, dados.ids, filtro)
+    cache_pedidos.remover(*resultado.atualizados)
+    return resultado
+
+def _atualizar_status_lote(db: Session, novo: str, ids: Optional[List[int]], filtro: dict) -> ResultadoStatusLote:
+    origens = [atual for atual, destinos in TRANSICOES_STATUS.items() if novo in destinos]
+    if ids is not None:
+        selecionados = select(Pedido.id, Pedido.status).where(Pedido.id.in_(ids))
+    else:
+        selecionados = _filtrar_pedidos(
+            select(Pedido.id, Pedido.status), None, filtro.get("cliente_id"), filtro.get("status"),
+            filtro.get("secao"), filtro.get("data_inicio"), filtro.get("data_fim"),
+        )
+        # Um filtro pode alcançar a tabela inteira: os rejeitados são lidos com LIMIT, antes do
+        # UPDATE (depois dele, os atualizados também teriam status fora de `origens`)
+        fora_da_transicao = db.execute(
+            selecionados.where(Pedido.status.not_in(origens))
+            .order_by(Pedido.id)
+            .limit(config.LOTE_PEDIDOS_MAXIMO + 1)
+        ).all()
+
+    # A transição é validada no próprio UPDATE: só as linhas com status de origem permitido mudam.
+    # As linhas são travadas em ordem de id (evita deadlock com outros lotes) e o FOR UPDATE
+    # reavalia o status de quem foi alterado por uma transação concorrente
+    alvo = selecionados.where(Pedido.status.in_(origens)).order_by(Pedido.id).with_for_update().cte("alvo")
+    alterados = db.execute(
+        update(Pedido).where(Pedido.id == alvo.c.id).values(status=novo).returning(Pedido.id, alvo.c.status)
+    ).all()
+    atualizados = sorted(pedido_id for pedido_id, _ in alterados)
+
+    # Cancelados saem do relatório de vendas; reativados voltam
+    mudaram_cancelamento = [
+        pedido_id for pedido_id, anterior in alterados
+        if (anterior == STATUS_CANCELADO) != (novo == STATUS_CANCELADO)
+    ]
+    registrar_vendas(db, mudaram_cancelamento, -1 if novo == STATUS_CANCELADO else 1)
+
+    ignorados = set(atualizados)
+    truncados = False
+    if ids is not None:
+        candidatos = db.execute(selecionados.order_by(Pedido.id)).all()
+    else:
+        truncados = len(fora_da_transicao) > config.LOTE_PEDIDOS_MAXIMO
+        candidatos = fora_da_transicao[:config.LOTE_PEDIDOS_MAXIMO]
+    # Quem mudou de status numa transação concorrente e acabou atualizado não é rejeitado
+    atuais = {pedido_id: status_atual for pedido_id, status_atual in candidatos if pedido_id not in ignorados}
+    db.commit()
+
+    rejeitados = []
+    for pedido_id in (ids if ids is not None else atuais):
+        if pedido_id in ignorados:
+            continue
+        ignorados.add(pedido_id)  # ids repetidos aparecem uma vez só
+        status_atual = atuais.get(pedido_id)
+        if status_atual is None:
+            erro = "Pedido não encontrado"
+        elif status_atual == novo:
+            erro = f"Pedido já está com status '{novo}'"
+        else:
+            erro = f"Transição de '{status_atual}' para '{novo}' não permitida"
+        rejeitados.append(PedidoRejeitado(id=pedido_id, status=status_atual, erro=erro))
+    return ResultadoStatusLote(
+        status=novo, atualizados=atualizados, rejeitados=rejeitados, rejeitados_truncados=truncados
+    )
 
 
 @router.get(
@@ -131,8 +494,17 @@ def criar_pedido(pedido_in: PedidoCreate, db: Session = Depends(get_db)):
         200: {"description": "Pedido encontrado"},
     },
 )
-def obter_pedido(id: int, db: Session = Depends(get_db)):
-    pedido = db.query(Pedido).filter(Pedido.id == id).first()
+async def obter_pedido(id: int, db: SessaoBanco = Depends(get_db_leitura)):
+    pedido = cache_pedidos.obter(id)
+    if pedido is None:
+        marca = cache_pedidos.marca()
+        pedido = PedidoOut.model_validate(await executar(db, _obter_pedido, id))
+        if not em_replica(db):
+            cache_pedidos.definir(id, pedido, marca=marca)
+    return pedido
+
+def _obter_pedido(db: Session, id: int):
+    pedido = _carregar_pedido(db, id)
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido não encontrado")
     return pedido
@@ -149,15 +521,25 @@ def obter_pedido(id: int, db: Session = Depends(get_db)):
         200: {"description": "Pedido atualizado com sucesso"},
     },
 )
-def atualizar_pedido(id: int, pedido_in: PedidoUpdate, db: Session = Depends(get_db)):
-    pedido = db.query(Pedido).filter(Pedido.id == id).first()
+async def atualizar_pedido(id: int, pedido_in: PedidoUpdate, db: SessaoBanco = Depends(get_db)):
+    pedido = await executar(db, _atualizar_pedido, id, pedido_in)
+    cache_pedidos.remover(id)
+    return pedido
+
+def _atualizar_pedido(db: Session, id: int, pedido_in: PedidoUpdate):
+    # FOR UPDATE: dois cancelamentos simultâneos não descontam o pedido duas vezes do relatório
+    pedido = db.query(Pedido).filter(Pedido.id == id).with_for_update().first()
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido não encontrado")
     if pedido_in.status:
+        cancelado_antes = pedido.status == STATUS_CANCELADO
         pedido.status = pedido_in.status
+        cancelado_depois = pedido.status == STATUS_CANCELADO
+        if cancelado_antes != cancelado_depois:
+            # Cancelamento tira o pedido do relatório de vendas; reativação devolve
+            registrar_vendas(db, [id], -1 if cancelado_depois else 1)
     db.commit()
-    db.refresh(pedido)
-    return pedido
+    return _carregar_pedido(db, id)
 
 
 @router.delete(
@@ -171,10 +553,16 @@ def atualizar_pedido(id: int, pedido_in: PedidoUpdate, db: Session = Depends(get
         204: {"description": "Pedido deletado com sucesso"},
     },
 )
-def deletar_pedido(id: int, db: Session = Depends(get_db)):
-    pedido = db.query(Pedido).filter(Pedido.id == id).first()
+async def deletar_pedido(id: int, db: SessaoBanco = Depends(get_db)):
+    await executar(db, _deletar_pedido, id)
+    cache_pedidos.remover(id)
+
+def _deletar_pedido(db: Session, id: int):
+    pedido = db.query(Pedido).filter(Pedido.id == id).with_for_update().first()
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido não encontrado")
+    if pedido.status != STATUS_CANCELADO:
+        registrar_vendas(db, [id], -1)
     db.delete(pedido)
     db.commit()
     return
@@ -0,0 +1,345 @@
+"""Reserva de estoque dos pedidos.
+
+Modo padrão: as linhas de `produtos` são travadas (SELECT ... FOR UPDATE) e `estoque_inicial` é
+baixado num UPDATE. Com ESTOQUE_LEDGER, a linha do produto não é tocada pelos pedidos: o saldo é
+`produtos.estoque_inicial` (snapshot) mais as baixas em `movimentos_estoque`, e o snapshot é dividido
+em ESTOQUE_SLOTS partes iguais. Cada baixa trava só um slot (advisory lock da transação) e só é
+gravada se o saldo daquele slot cobre a quantidade; pedidos concorrentes do mesmo produto usam
+slots diferentes. Sem slot livre com saldo, a reserva trava todos os slots do produto e baixa de
+vários. A compactação (compactar_estoque) soma as baixas no snapshot, o que também redistribui o
+saldo entre os slots.
+
+Em ambos os modos, quando uma baixa zera (ou pode ter zerado) o saldo de um produto, a tarefa
+`produtos_esgotados` é enfileirada na mesma transação e marca o produto como indisponível depois.
+"""
+import asyncio
+import logging
+import random
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import case, delete, func, insert, select, text, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from produtos.models.produtos import MovimentoEstoque, Produto
+from shared import config
+from shared.cache import cache_produtos
+from shared.database import SessionLocal
+from shared.tarefas import enfileirar, tarefa
+
+logger = logging.getLogger("estoque")
+
+COMPACTACAO_LOTE = 100  # produtos compactados por transação
+TAREFA_ESGOTADOS = "produtos_esgotados"
+
+# Trava todos os slots dos produtos, sempre na ordem (produto, slot), para não haver deadlock
+TRAVAR_SLOTS = text("""
+    SELECT count(pg_advisory_xact_lock(t.produto_id, t.slot))
+    FROM (
+        SELECT p.produto_id, s.slot
+        FROM unnest(CAST(:ids AS integer[])) AS p(produto_id)
+        CROSS JOIN generate_series(0, CAST(:slots AS integer) - 1) AS s(slot)
+        ORDER BY p.produto_id, s.slot
+    ) t
+""")
+
+# Trava o primeiro slot candidato livre, sem esperar; NULL se todos estão ocupados
+TRAVAR_SLOT_LIVRE = text("""
+    SELECT slot FROM unnest(CAST(:candidatos AS integer[])) AS c(slot)
+    WHERE pg_try_advisory_xact_lock(CAST(:produto_id AS integer), slot)
+    LIMIT 1
+""")
+
+# Grava a baixa só se o saldo do slot (já travado) cobre a quantidade. A parte do snapshot que cabe
+# ao slot é floor((estoque - slot + slots - 1) / slots), a mesma divisão de saldos_slots; lida
+# depois da trava, enxerga compactações e baixas já confirmadas
+BAIXAR_NO_SLOT = text("""
+    WITH v AS (
+        SELECT CAST(:produto_id AS integer) AS produto_id, CAST(:slot AS integer) AS slot,
+               CAST(:quantidade AS integer) AS quantidade, CAST(:slots AS integer) AS slots
+    )
+    INSERT INTO movimentos_estoque (produto_id, slot, quantidade, data_criacao)
+    SELECT v.produto_id, v.slot, -v.quantidade, timezone('utc', now())
+    FROM v JOIN produtos p ON p.id = v.produto_id
+    WHERE floor((p.estoque_inicial - v.slot + v.slots - 1) / CAST(v.slots AS numeric))
+          + COALESCE((
+              SELECT sum(m.quantidade) FROM movimentos_estoque m
+              WHERE m.produto_id = v.produto_id AND m.slot % v.slots = v.slot
+          ), 0) >= v.quantidade
+""")
+
+# As baixas saem da tabela e entram no snapshot numa única instrução
+COMPACTAR = text("""
+    WITH removidos AS (
+        DELETE FROM movimentos_estoque WHERE produto_id = ANY(CAST(:ids AS integer[]))
+        RETURNING produto_id, quantidade
+    )
+    UPDATE produtos p
+    SET estoque_inicial = p.estoque_inicial + r.total
+    FROM (SELECT produto_id, sum(quantidade) AS total, count(*) AS movimentos FROM removidos GROUP BY produto_id) r
+    WHERE p.id = r.produto_id
+    RETURNING p.id, p.estoque_inicial, r.movimentos
+""")
+
+
+def travar_estoque(db: Session, ids: Iterable[int]) -> Dict[int, Optional[int]]:
+    """Trava os produtos com SELECT ... FOR UPDATE e retorna produto_id -> estoque.
+
+    As linhas são travadas em ordem de id, para que transações concorrentes com os
+    mesmos produtos esperem uma pela outra em vez de entrar em deadlock. Produtos
+    inexistentes ficam fora do dicionário. Com ESTOQUE_LEDGER, trava todos os slots
+    dos produtos e retorna o saldo somado.
+    """
+    ids = sorted(set(ids))
+    if not ids:
+        return {}
+    if config.ESTOQUE_LEDGER:
+        _travar_slots(db, ids)
+        return {produto_id: sum(saldos) for produto_id, saldos in saldos_slots(db, ids).items()}
+    return dict(
+        db.execute(
+            select(Produto.id, Produto.estoque_inicial)
+            .where(Produto.id.in_(ids))
+            .order_by(Produto.id)
+            .with_for_update()
+        ).all()
+    )
+
+
+def baixar_estoque(db: Session, quantidades: Dict[int, int]) -> None:
+    # Um único UPDATE para todos os produtos, condicionado a `estoque_inicial >= quantidade`
+    if not quantidades:
+        return
+    if config.ESTOQUE_LEDGER:
+        # Slots já travados por travar_estoque
+        saldos = saldos_slots(db, quantidades)
+        movimentos = []
+        for produto_id, quantidade in quantidades.items():
+            movimentos += _drenar(produto_id, saldos.get(produto_id, []), quantidade)
+        if movimentos:
+            db.execute(insert(MovimentoEstoque), movimentos)
+        avisar_esgotados(db, [
+            produto_id for produto_id, quantidade in quantidades.items()
+            if sum(saldos.get(produto_id, [])) <= quantidade
+        ])
+        return
+    quantidade = case(quantidades, value=Produto.id)
+    atualizados = db.execute(
+        update(Produto)
+        .where(Produto.id.in_(list(quantidades)), Produto.estoque_inicial >= quantidade)
+        .values(estoque_inicial=Produto.estoque_inicial - quantidade)
+        .returning(Produto.id, Produto.estoque_inicial)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    # Com as linhas travadas isso não deve acontecer; a condição no UPDATE é a garantia final
+    if len(atualizados) != len(quantidades):
+        raise HTTPException(status_code=409, detail="Estoque alterado durante a reserva, tente novamente")
+    avisar_esgotados(db, [produto_id for produto_id, estoque in atualizados if estoque <= 0])
+
+
+def verificar_estoque(estoques: Dict[int, Optional[int]], quantidades: Dict[int, int]) -> Optional[HTTPException]:
+    # Retorna o erro do primeiro produto inexistente ou sem saldo, ou None se o pedido cabe no estoque
+    for produto_id in sorted(quantidades):
+        if produto_id not in estoques:
+            return HTTPException(status_code=404, detail=f"Produto {produto_id} não encontrado")
+        estoque = estoques[produto_id]
+        if estoque is None or estoque < quantidades[produto_id]:
+            return HTTPException(status_code=400, detail=f"Estoque insuficiente para produto {produto_id}")
+    return None
+
+
+def reservar_estoque(db: Session, quantidades: Dict[int, int]) -> None:
+    """Baixa o estoque de vários produtos de uma vez, sem permitir saldo negativo.
+
+    `quantidades` mapeia produto_id -> quantidade.
+    """
+    if not quantidades:
+        return
+    if config.ESTOQUE_LEDGER:
+        _reservar_em_slots(db, quantidades)
+        return
+    erro = verificar_estoque(travar_estoque(db, quantidades), quantidades)
+    if erro:
+        raise erro
+    baixar_estoque(db, quantidades)
+
+
+def saldos_slots(db: Session, ids: Iterable[int]) -> Dict[int, List[int]]:
+    """produto_id -> saldo de cada slot (parte do snapshot mais as baixas do slot)."""
+    ids = list(ids)
+    slots = config.ESTOQUE_SLOTS
+    snapshots = dict(db.execute(select(Produto.id, Produto.estoque_inicial).where(Produto.id.in_(ids))).all())
+    saldos = {
+        produto_id: [(estoque - slot + slots - 1) // slots for slot in range(slots)]
+        for produto_id, estoque in snapshots.items()
+    }
+    baixas = db.execute(
+        select(MovimentoEstoque.produto_id, MovimentoEstoque.slot, func.sum(MovimentoEstoque.quantidade))
+        .where(MovimentoEstoque.produto_id.in_(ids))
+        .group_by(MovimentoEstoque.produto_id, MovimentoEstoque.slot)
+    )
+    for produto_id, slot, quantidade in baixas:
+        # slot % slots: baixas gravadas antes de uma redução de ESTOQUE_SLOTS continuam contando no total
+        saldos[produto_id][slot % slots] += quantidade
+    return saldos
+
+
+def saldo_atual():
+    """Expressão SQL do saldo de Produto: no modo ESTOQUE_LEDGER, o snapshot mais as baixas pendentes."""
+    if not config.ESTOQUE_LEDGER:
+        return Produto.estoque_inicial
+    pendente = (
+        select(func.sum(MovimentoEstoque.quantidade))
+        .where(MovimentoEstoque.produto_id == Produto.id)
+        .scalar_subquery()
+    )
+    return Produto.estoque_inicial + func.coalesce(pendente, 0)
+
+
+def estoque_pendente(db: Session, ids: Iterable[int]) -> Dict[int, int]:
+    """produto_id -> soma das baixas ainda não compactadas (negativa)."""
+    return dict(
+        db.execute(
+            select(MovimentoEstoque.produto_id, func.sum(MovimentoEstoque.quantidade))
+            .where(MovimentoEstoque.produto_id.in_(list(ids)))
+            .group_by(MovimentoEstoque.produto_id)
+        ).all()
+    )
+
+
+def descartar_movimentos(db, ids: Iterable[int]) -> None:
+    # Antes de gravar um novo estoque_inicial: o valor informado passa a ser o saldo.
+    # `db` pode ser uma Session ou uma Connection (importação)
+    ids = sorted(set(ids))
+    if not ids:
+        return
+    _travar_slots(db, ids)
+    db.execute(delete(MovimentoEstoque).where(MovimentoEstoque.produto_id.in_(ids)))
+
+
+def compactar_estoque(db: Session, ids: Optional[Iterable[int]] = None) -> int:
+    """Soma as baixas pendentes em produtos.estoque_inicial; retorna quantos movimentos compactou.
+
+    Cada lote de produtos é uma transação com todos os seus slots travados.
+    """
+    if ids is None:
+        ids = db.execute(select(MovimentoEstoque.produto_id).distinct()).scalars().all()
+    ids = sorted(set(ids))
+    compactados = 0
+    for inicio in range(0, len(ids), COMPACTACAO_LOTE):
+        lote = ids[inicio:inicio + COMPACTACAO_LOTE]
+        _travar_slots(db, lote)
+        linhas = db.execute(COMPACTAR, {"ids": lote}).all()
+        compactados += sum(linha.movimentos for linha in linhas)
+        # Cobre o produto zerado por baixas cuja estimativa de saldo estava desatualizada
+        avisar_esgotados(db, [linha.id for linha in linhas if linha.estoque_inicial <= 0])
+        db.commit()
+    return compactados
+
+
+def _compactar_tudo() -> int:
+    with SessionLocal() as db:
+        return compactar_estoque(db)
+
+
+async def compactar_periodicamente(intervalo: float) -> None:
+    """Tarefa de fundo do modo ESTOQUE_LEDGER; várias instâncias podem rodá-la ao mesmo tempo."""
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            compactados = await run_in_threadpool(_compactar_tudo)
+            if compactados:
+                logger.info("%d movimentos de estoque compactados", compactados)
+        except Exception:
+            logger.exception("Falha na compactação dos movimentos de estoque")
+
+
+def avisar_esgotados(db: Session, ids: Iterable[int]) -> None:
+    # Uma tarefa por transação, com todos os produtos que podem ter zerado
+    ids = sorted(set(ids))
+    if ids:
+        enfileirar(db, TAREFA_ESGOTADOS, ids=ids)
+
+
+@tarefa(TAREFA_ESGOTADOS)
+def marcar_esgotados(db: Session, ids: List[int]) -> None:
+    """Marca como indisponíveis os produtos de `ids` que estão sem saldo (tarefa em segundo plano)."""
+    esgotados = db.execute(
+        update(Produto)
+        .where(Produto.id.in_(ids), Produto.disponivel.is_(True), saldo_atual() <= 0)
+        .values(disponivel=False)
+        .returning(Produto.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    cache_produtos.remover(*esgotados)
+
+
+def _travar_slots(db, ids: List[int]) -> None:
+    db.execute(TRAVAR_SLOTS, {"ids": ids, "slots": config.ESTOQUE_SLOTS})
+
+
+def _reservar_em_slots(db: Session, quantidades: Dict[int, int]) -> None:
+    # Saldos lidos sem trava: só escolhem os slots candidatos e recusam cedo o que claramente não cabe
+    estimados = saldos_slots(db, quantidades)
+    erro = verificar_estoque({produto_id: sum(saldos) for produto_id, saldos in estimados.items()}, quantidades)
+    if erro:
+        raise erro
+
+    # Em ordem de produto: as travas que esperam são sempre pedidas em ordem (produto, slot)
+    esgotados = []
+    for produto_id in sorted(quantidades):
+        quantidade = quantidades[produto_id]
+        if _baixar_em_um_slot(db, produto_id, quantidade, estimados[produto_id]):
+            # Saldo estimado: a tarefa confere o saldo real e a compactação cobre o que escapar daqui
+            if sum(estimados[produto_id]) <= quantidade:
+                esgotados.append(produto_id)
+            continue
+        _travar_slots(db, [produto_id])
+        saldos = saldos_slots(db, [produto_id])[produto_id]
+        if sum(saldos) < quantidade:
+            raise HTTPException(status_code=400, detail=f"Estoque insuficiente para produto {produto_id}")
+        movimentos = _drenar(produto_id, saldos, quantidade)
+        if movimentos:
+            db.execute(insert(MovimentoEstoque), movimentos)
+        if sum(saldos) == quantidade:
+            esgotados.append(produto_id)
+    avisar_esgotados(db, esgotados)
+
+
+def _baixar_em_um_slot(db: Session, produto_id: int, quantidade: int, estimados: List[int]) -> bool:
+    candidatos = [slot for slot, saldo in enumerate(estimados) if saldo >= quantidade]
+    if not candidatos:
+        return False
+    random.shuffle(candidatos)
+    parametros = {"produto_id": produto_id, "quantidade": quantidade, "slots": config.ESTOQUE_SLOTS}
+
+    # O savepoint libera a trava do slot se ele não servir, para nunca esperar segurando um slot
+    ponto = db.begin_nested()
+    slot = db.execute(TRAVAR_SLOT_LIVRE, {"produto_id": produto_id, "candidatos": candidatos}).scalar()
+    if slot is None:
+        # Todos ocupados: espera por um deles em vez de travar o produto inteiro
+        slot = candidatos[0]
+        db.execute(select(func.pg_advisory_xact_lock(produto_id, slot)))
+    if db.execute(BAIXAR_NO_SLOT, dict(parametros, slot=slot)).rowcount:
+        ponto.commit()
+        return True
+    ponto.rollback()
+    return False
+
+
+def _drenar(produto_id: int, saldos: List[int], quantidade: int) -> List[dict]:
+    # Baixa dos slots com mais saldo primeiro; o chamador já garantiu que a soma cobre a quantidade
+    movimentos = []
+    for slot in sorted(range(len(saldos)), key=lambda s: saldos[s], reverse=True):
+        if quantidade <= 0:
+            break
+        parte = min(saldos[slot], quantidade)
+        if parte > 0:
+            movimentos.append({"produto_id": produto_id, "slot": slot, "quantidade": -parte})
+            quantidade -= parte
+    if quantidade > 0:
+        raise HTTPException(status_code=409, detail="Estoque alterado durante a reserva, tente novamente")
+    return movimentos
@@ -0,0 +1,204 @@
+import csv
+import io
+import json
+from typing import Iterable, Iterator, List, Type
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import text
+
+from produtos.estoque import descartar_movimentos
+from shared import config
+from shared.database import engine
+
+COLUNAS = [
+    "descricao", "valor_venda", "codigo_barras", "secao",
+    "estoque_inicial", "data_validade", "imagem", "disponivel",
+]
+
+CRIAR_STAGING = """
+    CREATE TEMP TABLE produtos_importacao (
+        linha integer NOT NULL,
+        descricao varchar NOT NULL,
+        valor_venda double precision NOT NULL,
+        codigo_barras varchar NOT NULL,
+        secao varchar NOT NULL,
+        estoque_inicial integer NOT NULL,
+        data_validade date,
+        imagem varchar,
+        disponivel boolean
+    ) ON COMMIT DROP
+"""
+
+# Produtos existentes que a importação vai sobrescrever
+EXISTENTES = """
+    SELECT p.id FROM produtos p
+    WHERE p.codigo_barras IN (SELECT codigo_barras FROM produtos_importacao)
+"""
+
+# Para códigos de barras repetidos no arquivo vale a última linha; xmax = 0 indica
+# que a linha foi inserida (e não atualizada pelo ON CONFLICT)
+MESCLAR = f"""
+    WITH mesclados AS (
+        INSERT INTO produtos ({", ".join(COLUNAS)})
+        SELECT DISTINCT ON (codigo_barras) {", ".join(COLUNAS)}
+        FROM produtos_importacao
+        ORDER BY codigo_barras, linha DESC
+        ON CONFLICT (codigo_barras) DO UPDATE SET
+            {", ".join(f"{c} = EXCLUDED.{c}" for c in COLUNAS if c != "codigo_barras")}
+        RETURNING (xmax = 0) AS inserido
+    )
+    SELECT count(*) FILTER (WHERE inserido), count(*) FILTER (WHERE NOT inserido) FROM mesclados
+"""
+
+
+class _ErroLinha(Exception):
+    # Linha que não chega a ser validada pelo esquema (bytes ou CSV malformados)
+    pass
+
+
+class _CorpoStream(io.RawIOBase):
+    # Expõe um iterador de pedaços de bytes como arquivo, sem juntar o corpo inteiro
+    def __init__(self, partes: Iterable[bytes]):
+        self._partes = iter(partes)
+        self._resto = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._resto:
+            try:
+                self._resto = next(self._partes)
+            except StopIteration:
+                return 0
+        n = min(len(buffer), len(self._resto))
+        buffer[:n] = self._resto[:n]
+        self._resto = self._resto[n:]
+        return n
+
+
+def _linhas_texto(bruto: io.BufferedIOBase) -> Iterator[tuple]:
+    # Decodifica linha a linha: bytes inválidos perdem só a linha em que estão
+    for numero, linha in enumerate(bruto, start=1):
+        try:
+            yield numero, linha.decode("utf-8-sig" if numero == 1 else "utf-8")
+        except UnicodeDecodeError as erro:
+            yield numero, _ErroLinha(f"texto não é UTF-8 válido (byte {erro.start + 1} da linha)")
+
+
+def _linhas_csv(linhas: Iterator[tuple]) -> Iterator[tuple]:
+    pendentes = []
+    ultima = 0  # última linha entregue ao leitor CSV (line_num não avança quando ele falha)
+
+    def texto():
+        nonlocal ultima
+        for numero, linha in linhas:
+            ultima = numero
+            if isinstance(linha, _ErroLinha):
+                # O leitor CSV recebe uma linha vazia, que ele ignora
+                pendentes.append((numero, linha))
+                linha = "\n"
+            yield linha
+
+    leitor = csv.DictReader(texto())
+    while True:
+        try:
+            registro = next(leitor)
+        except StopIteration:
+            break
+        except csv.Error as erro:
+            registro = _ErroLinha(f"CSV inválido: {erro}")
+        yield from pendentes
+        pendentes.clear()
+        if isinstance(registro, _ErroLinha):
+            yield ultima, registro
+        else:
+            # Campo vazio no CSV = campo ausente (vale o padrão do esquema)
+            yield ultima, {k: v for k, v in registro.items() if k is not None and v not in (None, "")}
+    yield from pendentes
+
+
+def _linhas_ndjson(linhas: Iterator[tuple]) -> Iterator[tuple]:
+    for numero, linha in linhas:
+        if isinstance(linha, _ErroLinha) or linha.strip():
+            yield numero, linha
+
+
+def _valor_copy(valor) -> str:
+    # Formato texto do COPY: \N é NULL; barra, tab e quebras de linha precisam de escape
+    if valor is None:
+        return "\\N"
+    if isinstance(valor, bool):
+        return "t" if valor else "f"
+    return (
+        str(valor)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copiar(cursor, linhas: List[tuple]) -> None:
+    buffer = io.StringIO()
+    for linha in linhas:
+        buffer.write("\t".join(_valor_copy(v) for v in linha))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY produtos_importacao (linha, {', '.join(COLUNAS)}) FROM STDIN", buffer)
+
+
+def _descrever_erro(erro: Exception) -> str:
+    if isinstance(erro, _ErroLinha):
+        return str(erro)
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'linha'}: {e['msg']}" for e in erro.errors())
+
+
+def importar_produtos(partes: Iterable[bytes], formato: str, esquema: Type[BaseModel]) -> dict:
+    """Importa produtos de um corpo CSV ou NDJSON recebido em pedaços.
+
+    Cada linha é validada com `esquema`; as válidas vão por COPY, em lotes, para uma tabela
+    temporária e no fim são mescladas em `produtos` com upsert por código de barras, numa
+    única transação. Roda de forma síncrona (psycopg2), fora do event loop.
+    """
+    texto = _linhas_texto(io.BufferedReader(_CorpoStream(partes)))
+    linhas = _linhas_csv(texto) if formato == "csv" else _linhas_ndjson(texto)
+
+    relatorio = {"linhas_lidas": 0, "validas": 0, "inseridos": 0, "atualizados": 0, "com_erro": 0, "erros": []}
+
+    with engine.begin() as conexao:
+        cursor = conexao.connection.driver_connection.cursor()
+        conexao.execute(text(CRIAR_STAGING))
+
+        lote = []
+        for numero, linha in linhas:
+            relatorio["linhas_lidas"] += 1
+            try:
+                if isinstance(linha, _ErroLinha):
+                    raise linha
+                produto = esquema.model_validate_json(linha) if formato == "ndjson" else esquema.model_validate(linha)
+                dados = produto.model_dump()
+                if any(isinstance(v, str) and "\x00" in v for v in dados.values()):
+                    raise _ErroLinha("texto com caractere NUL")
+            except (ValidationError, _ErroLinha) as erro:
+                relatorio["com_erro"] += 1
+                if len(relatorio["erros"]) < config.IMPORTACAO_MAX_ERROS:
+                    relatorio["erros"].append({"linha": numero, "erro": _descrever_erro(erro)})
+                continue
+
+            relatorio["validas"] += 1
+            lote.append((numero, *(dados.get(c) for c in COLUNAS)))
+            if len(lote) >= config.IMPORTACAO_LOTE_COPY:
+                _copiar(cursor, lote)
+                lote = []
+        if lote:
+            _copiar(cursor, lote)
+
+        if config.ESTOQUE_LEDGER:
+            # Como no PUT: o estoque importado passa a ser o saldo; trava os slots dos produtos
+            # atualizados (esperando as reservas em andamento) e descarta as baixas pendentes
+            descartar_movimentos(conexao, conexao.execute(text(EXISTENTES)).scalars())
+
+        relatorio["inseridos"], relatorio["atualizados"] = conexao.execute(text(MESCLAR)).one()
+
+    return relatorio
@@ -1,11 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, Date
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer, SmallInteger, String, Float, Boolean, Date
 from shared.database import Base
 from sqlalchemy.orm import relationship
 
 class Produto(Base):
     __tablename__ = "produtos"
 
-    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     descricao = Column(String, nullable=False)
     valor_venda = Column(Float, nullable=False)
     codigo_barras = Column(String, unique=True, nullable=False)
@@ -15,3 +17,27 @@ class Produto(Base):
     imagem = Column(String, nullable=True)       # pode ser uma URL ou nome do arquivo
     disponivel = Column(Boolean, default=True)
     pedido_produtos = relationship('PedidoProduto', back_populates='produto')
+
+    # Filtros e ordenações da listagem: faixa de preço / ordem por preço ou descrição (com id para o
+    # cursor) e ILIKE por seção (trigram)
+    __table_args__ = (
+        Index('ix_produtos_valor_venda_id', 'valor_venda', 'id'),
+        Index('ix_produtos_descricao_id', 'descricao', 'id'),
+        Index('ix_produtos_secao_trgm', 'secao', postgresql_using='gin', postgresql_ops={'secao': 'gin_trgm_ops'}),
+    )
+
+
+class MovimentoEstoque(Base):
+    """Baixas de estoque do modo ESTOQUE_LEDGER, só acrescentadas; a compactação as soma em
+    produtos.estoque_inicial e as remove."""
+    __tablename__ = "movimentos_estoque"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    produto_id = Column(Integer, ForeignKey('produtos.id', ondelete='CASCADE'), nullable=False)
+    slot = Column(SmallInteger, nullable=False)
+    quantidade = Column(Integer, nullable=False)  # negativa nas baixas
+    data_criacao = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_movimentos_estoque_produto_id_slot', 'produto_id', 'slot'),
+    )
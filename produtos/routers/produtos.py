@@ -1,8 +1,20 @@
-from fastapi import APIRouter, Depends, Query, HTTPException, status
+from anyio import from_thread
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from shared.dependencias import get_db
+from starlette.concurrency import run_in_threadpool
+from typing import Annotated, List, Literal, Optional
+from shared import config
+from shared.cache import cache_produtos
+from shared.dependencias import em_replica, get_db, get_db_leitura, executar, SessaoBanco
+from shared.exportacao import resposta_exportacao
+from shared.replicas import engine_leitura
+from shared.paginacao import contar_total, cursor_query, fechar_pagina, limite_query, paginar, total_query
+from shared.serializacao import campos_query, colunas, resolver_campos, resposta_item, resposta_lista
 from produtos.models.produtos import Produto
+from produtos.estoque import avisar_esgotados, compactar_estoque, descartar_movimentos, estoque_pendente, saldo_atual
+from produtos.importacao import importar_produtos
 from pydantic import BaseModel, Field
 from datetime import date
 from autenticacao.utils import verificar_token
@@ -10,6 +22,9 @@ from autenticacao.routers.autenticacao import get_current_user, admin_required
 
 router = APIRouter(prefix="/products", tags=["Produtos"])
 
+# Faixa da coluna integer do Postgres: fora dela o INSERT (ou o COPY da importação) falharia
+Int4 = Annotated[int, Field(ge=-2**31, le=2**31 - 1)]
+
 # Response model
 class ProdutoOut(BaseModel):
     id: int
@@ -18,7 +33,7 @@ class ProdutoOut(BaseModel):
     codigo_barras: str
     secao: str
     estoque_inicial: int
-    data_validade: Optional[str] = None
+    data_validade: Optional[date] = None
     imagem: Optional[str] = None
     disponivel: bool
 
@@ -30,8 +45,8 @@ class ProdutoCreate(BaseModel):
     valor_venda: float
     codigo_barras: str
     secao: str
-    estoque_inicial: int
-    data_validade: Optional[str] = None
+    estoque_inicial: Int4
+    data_validade: Optional[date] = None
     imagem: Optional[str] = None
     disponivel: bool = True
 
@@ -40,7 +55,7 @@ class ProdutoUpdate(BaseModel):
     valor_venda: Optional[float] = None
     codigo_barras: Optional[str] = None
     secao: Optional[str] = None
-    estoque_inicial: Optional[int] = None
+    estoque_inicial: Optional[Int4] = None
     data_validade: Optional[date] = None
     imagens: Optional[str] = None
 
@@ -49,20 +64,77 @@ class ProdutoUpdate(BaseModel):
     response_model=List[ProdutoOut],
     dependencies=[Depends(verificar_token)],
     summary="Listar produtos",
-    description="Retorna uma lista paginada de produtos com filtros opcionais como seção, faixa de preço e disponibilidade.",
+    description=(
+        "Retorna uma lista paginada de produtos com filtros opcionais como seção, faixa de preço e disponibilidade. "
+        "A paginação é por cursor: quando há mais resultados, o cabeçalho X-Next-Cursor "
+        "traz o valor a ser enviado em `cursor` para obter a próxima página. "
+        "Com `fields`, só os campos pedidos são lidos e retornados; com `total`, o total de itens "
+        "vem no cabeçalho X-Total-Count."
+    ),
     response_description="Lista de produtos filtrada",
 )
-def listar_produtos(
-    skip: int = 0,
-    limit: int = 10,
+async def listar_produtos(
+    response: Response,
+    skip: int = Query(0, ge=0, deprecated=True, description="Use `cursor`; o offset fica mais lento em páginas profundas"),
+    limit: int = limite_query(),
+    cursor: Optional[str] = cursor_query(),
+    ordenar_por: Literal["id", "descricao", "valor_venda"] = Query("id", description="Campo de ordenação"),
+    ordem: Literal["asc", "desc"] = Query("asc", description="Direção da ordenação"),
     secao: Optional[str] = Query(None, description="Filtrar produtos pela seção"),
     preco_min: Optional[float] = Query(None, description="Preço mínimo do produto"),
     preco_max: Optional[float] = Query(None, description="Preço máximo do produto"),
     disponivel: Optional[bool] = Query(None, description="Filtrar produtos disponíveis (true) ou indisponíveis (false)"),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = campos_query(ProdutoOut),
+    total: Optional[Literal["estimado", "exato"]] = total_query(),
+    db: SessaoBanco = Depends(get_db_leitura)
+):
+    campos = resolver_campos(fields, ProdutoOut)
+    produtos, proximo_cursor, cabecalhos_total = await executar(
+        db, _listar_produtos, skip, limit, cursor, ordenar_por, ordem, secao, preco_min, preco_max, disponivel,
+        campos, total,
+    )
+    return resposta_lista(produtos, response, proximo_cursor, campos, cabecalhos_total)
+
+def _listar_produtos(
+    db: Session,
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    ordenar_por: str,
+    ordem: str,
+    secao: Optional[str],
+    preco_min: Optional[float],
+    preco_max: Optional[float],
+    disponivel: Optional[bool],
+    campos: Optional[List[str]] = None,
+    total: Optional[str] = None,
 ):
-    query = db.query(Produto)
+    # Só as colunas do ProdutoOut (ou as pedidas em fields, mais as do cursor), como tuplas
+    selecionadas = _com_saldo(colunas(Produto, ProdutoOut, campos, obrigatorios=("id", ordenar_por)))
+    query = _filtrar_produtos(db.query(*selecionadas), secao, preco_min, preco_max, disponivel)
+    cabecalhos_total = contar_total(db, query, Produto.id, total)
+    query = paginar(query, getattr(Produto, ordenar_por), Produto.id, ordenar_por, ordem, cursor, limit)
+    if skip:
+        query = query.offset(skip)
+    return (*fechar_pagina(query.all(), ordenar_por, ordem, limit), cabecalhos_total)
 
+def _com_saldo(selecionadas: list) -> list:
+    # No modo ESTOQUE_LEDGER, estoque_inicial sai como o saldo atual, o mesmo de GET /products/{id}
+    if not config.ESTOQUE_LEDGER:
+        return selecionadas
+    return [
+        saldo_atual().label("estoque_inicial") if coluna is Produto.estoque_inicial else coluna
+        for coluna in selecionadas
+    ]
+
+def _filtrar_produtos(
+    query,
+    secao: Optional[str],
+    preco_min: Optional[float],
+    preco_max: Optional[float],
+    disponivel: Optional[bool],
+):
+    # Aceita tanto Query do ORM quanto select(); usado pela listagem e pela exportação
     if secao:
         query = query.filter(Produto.secao.ilike(f"%{secao}%"))
     if preco_min is not None:
@@ -71,9 +143,31 @@ def listar_produtos(
         query = query.filter(Produto.valor_venda <= preco_max)
     if disponivel is not None:
         query = query.filter(Produto.disponivel == disponivel)
+    return query
 
-    produtos = query.offset(skip).limit(limit).all()
-    return produtos
+@router.get(
+    "/export",
+    dependencies=[Depends(verificar_token)],
+    summary="Exportar produtos",
+    description=(
+        "Exporta todos os produtos que atendem aos filtros (os mesmos da listagem) em NDJSON ou CSV, "
+        "transmitidos em streaming a partir de um cursor do servidor, com uso de memória constante."
+    ),
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}},
+)
+async def exportar_produtos(
+    request: Request,
+    formato: Literal["ndjson", "csv"] = Query("ndjson", description="Formato da exportação"),
+    secao: Optional[str] = Query(None, description="Filtrar produtos pela seção"),
+    preco_min: Optional[float] = Query(None, description="Preço mínimo do produto"),
+    preco_max: Optional[float] = Query(None, description="Preço máximo do produto"),
+    disponivel: Optional[bool] = Query(None, description="Filtrar produtos disponíveis (true) ou indisponíveis (false)"),
+):
+    colunas = list(ProdutoOut.model_fields)
+    consulta = select(*_com_saldo([getattr(Produto, c) for c in colunas])).order_by(Produto.id)
+    consulta = _filtrar_produtos(consulta, secao, preco_min, preco_max, disponivel)
+    return resposta_exportacao(consulta, colunas, formato, "produtos", engine_leitura(request))
 
 @router.post(
     "/",
@@ -87,7 +181,10 @@ def listar_produtos(
         201: {"description": "Produto criado com sucesso"},
     }
 )
-def criar_produto(produto: ProdutoCreate, db: Session = Depends(get_db)):
+async def criar_produto(produto: ProdutoCreate, db: SessaoBanco = Depends(get_db)):
+    return await executar(db, _criar_produto, produto)
+
+def _criar_produto(db: Session, produto: ProdutoCreate):
     # Verifica se já existe um produto com o mesmo código de barras
     produto_existente = db.query(Produto).filter(Produto.codigo_barras == produto.codigo_barras).first()
     if produto_existente:
@@ -102,24 +199,147 @@ def criar_produto(produto: ProdutoCreate, db: Session = Depends(get_db)):
     db.refresh(novo_produto)
     return novo_produto
 
+class ErroImportacao(BaseModel):
+    linha: int
+    erro: str
+
+class RelatorioImportacao(BaseModel):
+    linhas_lidas: int
+    validas: int
+    inseridos: int
+    atualizados: int
+    com_erro: int
+    erros: List[ErroImportacao]
+
+FORMATOS_IMPORTACAO = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+@router.post(
+    "/import",
+    response_model=RelatorioImportacao,
+    dependencies=[Depends(admin_required)],
+    summary="Importar produtos em massa",
+    description=(
+        "Importa um catálogo em CSV (com cabeçalho) ou NDJSON, enviado como corpo da requisição. "
+        "O corpo é lido em streaming, cada linha é validada como em `POST /products/` e as válidas "
+        "são carregadas via COPY e mescladas em `produtos`: códigos de barras existentes são "
+        "atualizados e os novos, inseridos. Linhas inválidas não impedem a importação das demais "
+        "e são listadas no relatório."
+    ),
+    responses={
+        200: {"description": "Relatório da importação"},
+        415: {"description": "Formato não suportado"},
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {tipo: {"schema": {"type": "string"}} for tipo in FORMATOS_IMPORTACAO},
+        }
+    },
+)
+async def importar_produtos_endpoint(
+    request: Request,
+    formato: Optional[Literal["csv", "ndjson"]] = Query(
+        None, description="Formato do corpo; se omitido, é deduzido do Content-Type"
+    ),
+):
+    if formato is None:
+        tipo = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        formato = FORMATOS_IMPORTACAO.get(tipo)
+        if formato is None:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Envie text/csv ou application/x-ndjson, ou informe o parâmetro formato",
+            )
+
+    corpo = request.stream()
+
+    async def proxima_parte():
+        try:
+            return await corpo.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def partes():
+        # Roda na thread da importação: busca o próximo pedaço do corpo no event loop
+        while (parte := from_thread.run(proxima_parte)) is not None:
+            yield parte
+
+    relatorio = await run_in_threadpool(importar_produtos, partes(), formato, ProdutoCreate)
+    if relatorio["inseridos"] or relatorio["atualizados"]:
+        cache_produtos.limpar()
+    return relatorio
+
+class ResultadoCompactacao(BaseModel):
+    movimentos_compactados: int
+
+@router.post(
+    "/stock/compact",
+    response_model=ResultadoCompactacao,
+    dependencies=[Depends(admin_required)],
+    summary="Compactar movimentos de estoque",
+    description=(
+        "No modo ESTOQUE_LEDGER, soma as baixas pendentes de movimentos_estoque no estoque_inicial de "
+        "cada produto e as remove. Também roda periodicamente (ESTOQUE_COMPACTACAO_SEGUNDOS)."
+    ),
+    responses={
+        200: {"description": "Quantidade de movimentos compactados"},
+        409: {"description": "Modo ESTOQUE_LEDGER desativado"},
+    },
+)
+async def compactar_movimentos_estoque(db: SessaoBanco = Depends(get_db)):
+    if not config.ESTOQUE_LEDGER:
+        raise HTTPException(status_code=409, detail="O estoque não está no modo ESTOQUE_LEDGER")
+    compactados = await executar(db, compactar_estoque)
+    cache_produtos.limpar()
+    return ResultadoCompactacao(movimentos_compactados=compactados)
+
 @router.get(
     "/{id}",
     response_model=ProdutoOut,
     dependencies=[Depends(verificar_token)],
     summary="Obter produto por ID",
-    description="Retorna os detalhes de um produto pelo seu ID.",
+    description="Retorna os detalhes de um produto pelo seu ID. Com `fields`, só os campos pedidos.",
     responses={
         404: {"description": "Produto não encontrado"},
         200: {"description": "Produto encontrado"},
     }
 )
-def obter_produto(id: int, db: Session = Depends(get_db)):
-    produto = db.query(Produto).filter(Produto.id == id).first()
+async def obter_produto(
+    id: int,
+    fields: Optional[str] = campos_query(ProdutoOut),
+    db: SessaoBanco = Depends(get_db_leitura),
+):
+    campos = resolver_campos(fields, ProdutoOut)
+    produto = cache_produtos.obter(id)
+    if campos:
+        # No cache só há o produto completo; fora dele, busca apenas as colunas pedidas
+        if produto is None:
+            produto = await executar(db, _obter_produto, id, campos)
+        return resposta_item(produto, campos)
+    if produto is None:
+        marca = cache_produtos.marca()
+        produto = ProdutoOut.model_validate(await executar(db, _obter_produto, id))
+        if not em_replica(db):
+            cache_produtos.definir(id, produto, marca=marca)
+    return produto
+
+def _obter_produto(db: Session, id: int, campos: Optional[List[str]] = None):
+    query = db.query(*colunas(Produto, ProdutoOut, campos)) if campos else db.query(Produto)
+    produto = query.filter(Produto.id == id).first()
     if not produto:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Produto não encontrado."
         )
+    if config.ESTOQUE_LEDGER and (not campos or "estoque_inicial" in campos):
+        # Saldo atual: snapshot mais as baixas ainda não compactadas
+        dados = produto._asdict() if campos else ProdutoOut.model_validate(produto).model_dump()
+        dados["estoque_inicial"] += estoque_pendente(db, [id]).get(id, 0)
+        return dados if campos else ProdutoOut(**dados)
     return produto
 
 @router.put(
@@ -133,11 +353,16 @@ def obter_produto(id: int, db: Session = Depends(get_db)):
         200: {"description": "Produto atualizado com sucesso"},
     }
 )
-def atualizar_produto(
+async def atualizar_produto(
     id: int,
     produto_update: ProdutoUpdate,
-    db: Session = Depends(get_db)
+    db: SessaoBanco = Depends(get_db)
 ):
+    produto = await executar(db, _atualizar_produto, id, produto_update)
+    cache_produtos.remover(id)
+    return produto
+
+def _atualizar_produto(db: Session, id: int, produto_update: ProdutoUpdate):
     produto = db.query(Produto).filter(Produto.id == id).first()
 
     if not produto:
@@ -146,8 +371,13 @@ def atualizar_produto(
             detail="Produto não encontrado."
         )
 
-    for campo, valor in produto_update.dict(exclude_unset=True).items():
+    dados = produto_update.dict(exclude_unset=True)
+    if config.ESTOQUE_LEDGER and "estoque_inicial" in dados:
+        descartar_movimentos(db, [id])
+    for campo, valor in dados.items():
         setattr(produto, campo, valor)
+    if dados.get("estoque_inicial") is not None and dados["estoque_inicial"] <= 0 and "disponivel" not in dados:
+        avisar_esgotados(db, [id])
 
     db.commit()
     db.refresh(produto)
@@ -165,7 +395,11 @@ def atualizar_produto(
         204: {"description": "Produto deletado com sucesso (sem conteúdo)"},
     }
 )
-def deletar_produto(id: int, db: Session = Depends(get_db)):
+async def deletar_produto(id: int, db: SessaoBanco = Depends(get_db)):
+    await executar(db, _deletar_produto, id)
+    cache_produtos.remover(id)
+
+def _deletar_produto(db: Session, id: int):
     produto = db.query(Produto).filter(Produto.id == id).first()
 
     if not produto:
@@ -0,0 +1,26 @@
+from sqlalchemy import BigInteger, Column, Date, Float, Integer, String
+
+from shared.database import Base
+
+class VendaSecaoDia(Base):
+    # Agregado de pedido_produto por dia do pedido e seção, consolidado a partir de movimentos_vendas
+    __tablename__ = "vendas_secao_dia"
+
+    dia = Column(Date, primary_key=True)
+    secao = Column(String, primary_key=True)
+    pedidos = Column(Integer, nullable=False, default=0)
+    quantidade = Column(Integer, nullable=False, default=0)
+    receita = Column(Float, nullable=False, default=0)
+
+
+class MovimentoVenda(Base):
+    # Variações de vendas_secao_dia gravadas pelos pedidos, só acrescentadas; a tarefa
+    # consolidar_vendas as soma no agregado e as remove
+    __tablename__ = "movimentos_vendas"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    dia = Column(Date, nullable=False)
+    secao = Column(String, nullable=False)
+    pedidos = Column(Integer, nullable=False)
+    quantidade = Column(Integer, nullable=False)
+    receita = Column(Float, nullable=False)
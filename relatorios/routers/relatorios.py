@@ -0,0 +1,109 @@
+from datetime import date
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import Session
+
+from shared.dependencias import get_db, get_db_leitura, executar, SessaoBanco
+from relatorios.models.relatorios import MovimentoVenda, VendaSecaoDia
+from relatorios.vendas import reconstruir_vendas
+from autenticacao.routers.autenticacao import admin_required
+
+router = APIRouter(prefix="/reports", tags=["Relatórios"])
+
+
+class VendaSecaoOut(BaseModel):
+    dia: Optional[date] = None  # ausente quando agrupado só por seção
+    secao: str
+    pedidos: int
+    quantidade: int
+    receita: float
+
+
+@router.get(
+    "/sales-by-section",
+    response_model=List[VendaSecaoOut],
+    dependencies=[Depends(admin_required)],
+    summary="Vendas por seção",
+    description=(
+        "Retorna pedidos, unidades vendidas e receita por seção dos produtos e por dia, lidos da "
+        "tabela pré-agregada vendas_secao_dia somada aos movimentos ainda não consolidados que cada "
+        "pedido criado, cancelado ou removido grava em movimentos_vendas. "
+        "Pedidos com status `cancelado` não são contabilizados. Com `agrupar_por=secao`, soma o período "
+        "numa linha por seção."
+    ),
+    responses={
+        200: {"description": "Vendas agregadas por seção"},
+        400: {"description": "Intervalo de datas inválido"},
+    },
+)
+async def vendas_por_secao(
+    data_inicio: Optional[date] = Query(None, description="Dia inicial (inclusive)"),
+    data_fim: Optional[date] = Query(None, description="Dia final (inclusive)"),
+    secao: Optional[str] = Query(None, description="Seção dos produtos"),
+    agrupar_por: Literal["dia", "secao"] = Query("dia", description="`dia` (dia e seção) ou `secao`"),
+    db: SessaoBanco = Depends(get_db_leitura),
+):
+    if data_inicio and data_fim and data_inicio > data_fim:
+        raise HTTPException(status_code=400, detail="data_inicio posterior a data_fim")
+    return await executar(db, _vendas_por_secao, data_inicio, data_fim, secao, agrupar_por)
+
+def _vendas_por_secao(
+    db: Session,
+    data_inicio: Optional[date],
+    data_fim: Optional[date],
+    secao: Optional[str],
+    agrupar_por: str,
+):
+    partes = []
+    for tabela in (VendaSecaoDia, MovimentoVenda):
+        parte = select(tabela.dia, tabela.secao, tabela.pedidos, tabela.quantidade, tabela.receita)
+        if data_inicio:
+            parte = parte.where(tabela.dia >= data_inicio)
+        if data_fim:
+            parte = parte.where(tabela.dia <= data_fim)
+        if secao:
+            parte = parte.where(tabela.secao.ilike(f"%{secao}%"))
+        partes.append(parte)
+    vendas = union_all(*partes).subquery()
+
+    chaves = [vendas.c.secao] if agrupar_por == "secao" else [vendas.c.dia, vendas.c.secao]
+    consulta = (
+        select(
+            *chaves,
+            func.sum(vendas.c.pedidos).label("pedidos"),
+            func.sum(vendas.c.quantidade).label("quantidade"),
+            func.sum(vendas.c.receita).label("receita"),
+        )
+        .group_by(*chaves)
+        # Linhas zeradas sobram quando todos os pedidos do dia/seção foram cancelados
+        .having(func.sum(vendas.c.pedidos) > 0)
+        .order_by(*chaves)
+    )
+    return [VendaSecaoOut(**linha._mapping) for linha in db.execute(consulta)]
+
+
+@router.post(
+    "/sales-by-section/rebuild",
+    dependencies=[Depends(admin_required)],
+    summary="Reconstruir vendas por seção",
+    description=(
+        "Recalcula a tabela vendas_secao_dia a partir dos pedidos, no intervalo de dias informado "
+        "ou por completo. Útil para carga inicial ou após correções feitas direto no banco."
+    ),
+    responses={
+        200: {"description": "Quantidade de linhas (dia, seção) recalculadas"},
+        400: {"description": "Intervalo de datas inválido"},
+    },
+)
+async def reconstruir_vendas_por_secao(
+    data_inicio: Optional[date] = Query(None, description="Dia inicial (inclusive)"),
+    data_fim: Optional[date] = Query(None, description="Dia final (inclusive)"),
+    db: SessaoBanco = Depends(get_db),
+):
+    if data_inicio and data_fim and data_inicio > data_fim:
+        raise HTTPException(status_code=400, detail="data_inicio posterior a data_fim")
+    linhas = await executar(db, reconstruir_vendas, data_inicio, data_fim)
+    return {"linhas": linhas}
@@ -0,0 +1,95 @@
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlalchemy import Date, cast, delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from pedidos.models.pedidos import Pedido, PedidoProduto
+from relatorios.models.relatorios import MovimentoVenda, VendaSecaoDia
+from shared.tarefas import enfileirar, tarefa
+
+# Pedidos com este status não entram no relatório de vendas
+STATUS_CANCELADO = "cancelado"
+TAREFA_VENDAS = "consolidar_vendas"
+COLUNAS = ["dia", "secao", "pedidos", "quantidade", "receita"]
+
+# Os movimentos saem da tabela e entram no agregado numa única instrução. Dois consolidadores
+# simultâneos não somam o mesmo movimento: o segundo espera o DELETE do primeiro e não o encontra
+CONSOLIDAR = text("""
+    WITH removidos AS (
+        DELETE FROM movimentos_vendas
+        RETURNING dia, secao, pedidos, quantidade, receita
+    )
+    INSERT INTO vendas_secao_dia (dia, secao, pedidos, quantidade, receita)
+    SELECT dia, secao, sum(pedidos), sum(quantidade), sum(receita)
+    FROM removidos
+    GROUP BY dia, secao
+    ORDER BY dia, secao
+    ON CONFLICT (dia, secao) DO UPDATE SET
+        pedidos = vendas_secao_dia.pedidos + excluded.pedidos,
+        quantidade = vendas_secao_dia.quantidade + excluded.quantidade,
+        receita = vendas_secao_dia.receita + excluded.receita
+""")
+
+
+def _agregado(sinal: int = 1):
+    dia = cast(Pedido.data_criacao, Date)
+    return (
+        select(
+            dia.label("dia"),
+            PedidoProduto.secao,
+            (sinal * func.count(func.distinct(PedidoProduto.pedido_id))).label("pedidos"),
+            (sinal * func.sum(PedidoProduto.quantidade)).label("quantidade"),
+            (sinal * func.sum(PedidoProduto.quantidade * PedidoProduto.valor_unitario)).label("receita"),
+        )
+        .select_from(PedidoProduto)
+        .join(Pedido, Pedido.id == PedidoProduto.pedido_id)
+        .group_by(dia, PedidoProduto.secao)
+    )
+
+
+def registrar_vendas(db: Session, pedido_ids: Iterable[int], sinal: int = 1) -> None:
+    """Soma (sinal=1) ou subtrai (sinal=-1) os itens dos pedidos nas vendas por seção e dia.
+
+    Roda na transação de quem chama, antes do commit, para o relatório nunca divergir dos pedidos,
+    mas só acrescenta linhas a movimentos_vendas: pedidos simultâneos da mesma seção e dia não
+    disputam a linha de vendas_secao_dia, que é atualizada depois pela tarefa consolidar_vendas.
+    Seção e receita vêm do preço e da seção gravados em cada item, então cancelar um pedido subtrai
+    exatamente o que ele somou, mesmo que o produto tenha mudado depois.
+    """
+    pedido_ids = list(pedido_ids)
+    if not pedido_ids:
+        return
+    consulta = _agregado(sinal).where(PedidoProduto.pedido_id.in_(pedido_ids))
+    db.execute(insert(MovimentoVenda).from_select(COLUNAS, consulta))
+    enfileirar(db, TAREFA_VENDAS)
+
+
+@tarefa(TAREFA_VENDAS)
+def consolidar_vendas(db: Session) -> int:
+    """Soma os movimentos pendentes em vendas_secao_dia e os remove. Retorna as linhas (dia, seção) alteradas."""
+    alteradas = db.execute(CONSOLIDAR).rowcount
+    db.commit()
+    return alteradas
+
+
+def reconstruir_vendas(db: Session, data_inicio: Optional[date] = None, data_fim: Optional[date] = None) -> int:
+    """Recalcula o agregado a partir dos pedidos no intervalo de dias (inclusive). Retorna as linhas geradas."""
+    apagar = delete(VendaSecaoDia)
+    apagar_movimentos = delete(MovimentoVenda)
+    consulta = _agregado().where(Pedido.status != STATUS_CANCELADO)
+    if data_inicio:
+        apagar = apagar.where(VendaSecaoDia.dia >= data_inicio)
+        apagar_movimentos = apagar_movimentos.where(MovimentoVenda.dia >= data_inicio)
+        consulta = consulta.where(cast(Pedido.data_criacao, Date) >= data_inicio)
+    if data_fim:
+        apagar = apagar.where(VendaSecaoDia.dia <= data_fim)
+        apagar_movimentos = apagar_movimentos.where(MovimentoVenda.dia <= data_fim)
+        consulta = consulta.where(cast(Pedido.data_criacao, Date) <= data_fim)
+    # Os movimentos pendentes do período já estão nos pedidos recalculados
+    db.execute(apagar_movimentos)
+    db.execute(apagar)
+    resultado = db.execute(insert(VendaSecaoDia).from_select(COLUNAS, consulta))
+    db.commit()
+    return resultado.rowcount
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from shared import config
+
+# Caches criados pela aplicação, por nome, para exposição das métricas
+CACHES: Dict[str, "CacheLRU"] = {}
+
+
+class CacheLRU:
+    """Cache em memória limitado por quantidade de itens (LRU), com expiração por tempo.
+
+    Seguro para uso concorrente (threadpool e event loop). `ttl` é o tempo de vida padrão
+    em segundos (None = sem expiração) e pode ser sobrescrito por item em `definir`.
+
+    Para leituras que podem correr com uma escrita, pegue `marca()` antes de consultar o
+    banco e repasse-a a `definir`: se houve alguma invalidação nesse meio tempo o valor
+    (possivelmente antigo) é descartado em vez de armazenado.
+    """
+
+    def __init__(self, nome: str, tamanho_maximo: int, ttl: Optional[float] = None):
+        self.nome = nome
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._itens: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+        self.expirados = 0
+        self._invalidacoes = 0
+        CACHES[nome] = self
+
+    def marca(self) -> int:
+        return self._invalidacoes
+
+    def obter(self, chave: Hashable) -> Optional[Any]:
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return None
+            valor, expira_em = item
+            if expira_em is not None and expira_em <= agora:
+                del self._itens[chave]
+                self.expirados += 1
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def definir(self, chave: Hashable, valor: Any, ttl: Optional[float] = None, marca: Optional[int] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if self.tamanho_maximo <= 0 or (ttl is not None and ttl <= 0):
+            return
+        expira_em = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if marca is not None and marca != self._invalidacoes:
+                return
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+                self.descartes += 1
+
+    def remover(self, *chaves: Hashable) -> None:
+        with self._lock:
+            for chave in chaves:
+                self._itens.pop(chave, None)
+            self._invalidacoes += 1
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+            self._invalidacoes += 1
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "itens": len(self._itens),
+                "tamanho_maximo": self.tamanho_maximo,
+                "ttl_s": self.ttl,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": round(self.acertos / consultas, 4) if consultas else 0.0,
+                "descartes": self.descartes,
+                "expirados": self.expirados,
+            }
+
+
+# Leituras por id (GET /products/{id}, /clients/{id}, /orders/{id}); invalidadas pelas escritas
+cache_produtos = CacheLRU("produtos", config.CACHE_ENTIDADES_TAMANHO, config.CACHE_ENTIDADES_TTL)
+cache_clientes = CacheLRU("clientes", config.CACHE_ENTIDADES_TAMANHO, config.CACHE_ENTIDADES_TTL)
+cache_pedidos = CacheLRU("pedidos", config.CACHE_ENTIDADES_TAMANHO, config.CACHE_ENTIDADES_TTL)
@@ -0,0 +1,194 @@
+"""Registro de consultas lentas, com EXPLAIN (ANALYZE, BUFFERS) de uma amostra.
+
+Comandos acima de CONSULTAS_LENTAS_MS vão, em JSON por linha, para um arquivo com rotação, com a
+rota que os disparou, o SQL normalizado e o formato dos parâmetros; um resumo por SQL normalizado
+fica em memória para GET /monitoring/slow-queries. O EXPLAIN roda depois, numa thread própria e
+em outra conexão, só para SELECTs, para não atrasar a requisição nem repetir escritas.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+from shared import config
+from shared.metricas import requisicao_atual
+
+RESUMO_MAXIMO = 500  # SQLs distintos mantidos no resumo
+EXPLAIN_FILA_MAXIMA = 8  # EXPLAINs pendentes; acima disso a amostra é descartada
+
+_literais = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_parametros = re.compile(r"%\(\w+\)s|%s|\$\d+(?:::[\w ]+)?|\?")
+_listas = re.compile(r"\?(?:\s*,\s*\?)+")
+_valores = re.compile(r"\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+|\(\?\)(?:\s*,\s*\(\?\))+")
+_espacos = re.compile(r"\s+")
+
+
+def normalizar_sql(sql: str) -> str:
+    """Troca literais e parâmetros por `?` e colapsa listas IN / VALUES de tamanho variável."""
+    sql = _literais.sub("?", _parametros.sub("?", sql))
+    sql = _listas.sub("?...", sql)
+    sql = _valores.sub("(?...)...", sql)
+    return _espacos.sub(" ", sql).strip()
+
+
+def _tipo(valor: Any) -> str:
+    if isinstance(valor, (list, tuple, set)):
+        return f"{type(valor).__name__}[{len(valor)}]"
+    return type(valor).__name__
+
+
+def formato_parametros(parametros: Any, executemany: bool) -> Any:
+    """Tipos dos parâmetros, sem os valores (que podem ter dados pessoais)."""
+    if executemany and parametros:
+        return {"linhas": len(parametros), "primeira": formato_parametros(parametros[0], False)}
+    if isinstance(parametros, dict):
+        return {nome: _tipo(valor) for nome, valor in parametros.items()}
+    if isinstance(parametros, (list, tuple)):
+        return [_tipo(valor) for valor in parametros]
+    return None
+
+
+class RegistroConsultasLentas:
+    def __init__(self, limite_ms: float, amostra_explain: float, arquivo: str, tamanho_mb: int, copias: int):
+        self.limite = limite_ms / 1000
+        self.amostra_explain = amostra_explain
+        self._lock = threading.Lock()
+        self._resumo: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._explains_pendentes = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+
+        self.logger = logging.getLogger("consultas_lentas")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if arquivo:
+            os.makedirs(os.path.dirname(os.path.abspath(arquivo)), exist_ok=True)
+            handler = RotatingFileHandler(arquivo, maxBytes=tamanho_mb * 1024 * 1024, backupCount=copias, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+
+    def instrumentar(self, engine, engine_explain) -> None:
+        """Mede os comandos de `engine`; os EXPLAINs usam conexões do engine síncrono `engine_explain`."""
+
+        # Início no contexto do comando, como em instrumentar_engine: some junto se o comando falhar
+        @event.listens_for(engine, "before_cursor_execute")
+        def _antes(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._inicio_consultas_lentas = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _depois(conn, cursor, statement, parameters, context, executemany):
+            inicio = getattr(context, "_inicio_consultas_lentas", None)
+            if inicio is None:
+                return
+            duracao = time.perf_counter() - inicio
+            if duracao >= self.limite:
+                self.registrar(statement, parameters, executemany, duracao, conn.dialect.paramstyle, engine_explain)
+
+    def registrar(self, statement, parameters, executemany: bool, duracao: float, paramstyle: str, engine_explain) -> None:
+        sql = normalizar_sql(statement)
+        assinatura = hashlib.sha1(sql.encode()).hexdigest()[:12]
+        rota = requisicao_atual()
+        self._escrever({
+            "tipo": "consulta_lenta",
+            "assinatura": assinatura,
+            "rota": rota,
+            "duracao_ms": round(duracao * 1000, 2),
+            "sql": sql,
+            "parametros": formato_parametros(parameters, executemany),
+        })
+
+        with self._lock:
+            item = self._resumo.pop(assinatura, None) or {
+                "assinatura": assinatura, "sql": sql, "ocorrencias": 0, "total_ms": 0.0,
+                "maximo_ms": 0.0, "rotas": {}, "explain": None,
+            }
+            item["ocorrencias"] += 1
+            item["total_ms"] += duracao * 1000
+            item["maximo_ms"] = max(item["maximo_ms"], duracao * 1000)
+            item["ultima_em"] = datetime.now(timezone.utc).isoformat()
+            item["rotas"][rota] = item["rotas"].get(rota, 0) + 1
+            self._resumo[assinatura] = item
+            while len(self._resumo) > RESUMO_MAXIMO:
+                self._resumo.popitem(last=False)
+
+            explicar = (
+                not executemany
+                and self.amostra_explain > 0
+                and random.random() < self.amostra_explain
+                and statement.lstrip()[:6].upper() == "SELECT"
+                and "FOR UPDATE" not in statement.upper()
+                and self._explains_pendentes < EXPLAIN_FILA_MAXIMA
+            )
+            if explicar:
+                self._explains_pendentes += 1
+        if explicar:
+            self._executor.submit(self._explicar, assinatura, statement, parameters, paramstyle, engine_explain)
+
+    def _explicar(self, assinatura: str, statement: str, parameters, paramstyle: str, engine_explain) -> None:
+        try:
+            if paramstyle == "numeric_dollar":
+                # SQL do asyncpg ($1, $2, ...) reexecutado pelo psycopg2 (%s)
+                ordem = [int(n) - 1 for n in re.findall(r"\$(\d+)", statement)]
+                statement = re.sub(r"\$\d+", "%s", statement.replace("%", "%%"))
+                parameters = [parameters[i] for i in ordem]
+            raw = engine_explain.raw_connection()
+            try:
+                cursor = raw.cursor()
+                # Nunca deixa um EXPLAIN ANALYZE rodar mais que 10x o limite de lentidão
+                cursor.execute(f"SET LOCAL statement_timeout = {int(max(self.limite * 10, 1) * 1000)}")
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+                plano = "\n".join(linha[0] for linha in cursor.fetchall())
+            finally:
+                raw.rollback()
+                raw.close()
+        except Exception as erro:  # o registro nunca deve derrubar nada
+            plano = f"EXPLAIN falhou: {type(erro).__name__}: {erro}"
+        finally:
+            with self._lock:
+                self._explains_pendentes -= 1
+
+        self._escrever({"tipo": "explain", "assinatura": assinatura, "plano": plano})
+        with self._lock:
+            if assinatura in self._resumo:
+                self._resumo[assinatura]["explain"] = plano
+
+    def _escrever(self, registro: Dict[str, Any]) -> None:
+        registro["momento"] = datetime.now(timezone.utc).isoformat()
+        self.logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+
+    def resumo(self, limite: int, ordenar_por: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            itens = [dict(item, rotas=dict(item["rotas"])) for item in self._resumo.values()]
+        for item in itens:
+            item["media_ms"] = round(item["total_ms"] / item["ocorrencias"], 2)
+            item["total_ms"] = round(item["total_ms"], 2)
+            item["maximo_ms"] = round(item["maximo_ms"], 2)
+        itens.sort(key=lambda item: item[ordenar_por], reverse=True)
+        return itens[:limite]
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._resumo.clear()
+
+
+# Só criado quando CONSULTAS_LENTAS_MS > 0
+registro: Optional[RegistroConsultasLentas] = None
+if config.CONSULTAS_LENTAS_MS > 0:
+    registro = RegistroConsultasLentas(
+        config.CONSULTAS_LENTAS_MS,
+        config.CONSULTAS_LENTAS_EXPLAIN_AMOSTRA,
+        config.CONSULTAS_LENTAS_ARQUIVO,
+        config.CONSULTAS_LENTAS_ARQUIVO_MB,
+        config.CONSULTAS_LENTAS_ARQUIVOS,
+    )
@@ -1,8 +1,68 @@
-from shared.database import SessionLocal
+from typing import Callable, TypeVar, Union
 
-def get_db():
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from shared.database import SessionLocal, AsyncSessionLocal
+from shared.replicas import replica_para
+
+T = TypeVar("T")
+SessaoBanco = Union[Session, AsyncSession]
+
+
+def get_db_sync():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_db_async():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+get_db = get_db_async if AsyncSessionLocal is not None else get_db_sync
+
+
+# Sessões só de leitura, para os GETs: numa réplica saudável quando houver (marcada em
+# db.info["replica"]) ou no primário, como get_db
+def get_db_leitura_sync(request: Request):
+    replica = replica_para(request)
+    db = replica.sessoes() if replica is not None else SessionLocal()
+    if replica is not None:
+        db.info["replica"] = replica.nome
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_db_leitura_async(request: Request):
+    replica = replica_para(request)
+    async with (replica.sessoes_async() if replica is not None else AsyncSessionLocal()) as db:
+        if replica is not None:
+            db.info["replica"] = replica.nome
+        yield db
+
+
+get_db_leitura = get_db_leitura_async if AsyncSessionLocal is not None else get_db_leitura_sync
+
+
+def em_replica(db: SessaoBanco) -> bool:
+    # Leituras de réplica podem estar atrasadas: não devem alimentar os caches
+    return "replica" in db.info
+
+
+async def executar(db: SessaoBanco, funcao: Callable[..., T], *args, **kwargs) -> T:
+    """Executa `funcao(sessao, *args, **kwargs)` com uma Session síncrona.
+
+    No modo assíncrono a função roda via `AsyncSession.run_sync`, no próprio event loop,
+    com o I/O feito pelo asyncpg; no modo síncrono roda no threadpool, como antes.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(funcao, *args, **kwargs)
+    return await run_in_threadpool(funcao, db, *args, **kwargs)
@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, Iterator, List
+
+from fastapi.responses import StreamingResponse
+
+from shared import config
+from shared.database import engine as engine_primario
+
+TIPOS_MIDIA = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _json_padrao(valor: Any) -> Any:
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def _valor_csv(valor: Any) -> Any:
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, (list, dict)):
+        return json.dumps(valor, default=_json_padrao)
+    return valor
+
+
+def _transmitir(consulta, colunas: List[str], formato: str, engine) -> Iterator[str]:
+    # Cursor do lado do servidor: o banco entrega `EXPORTACAO_LOTE` linhas por vez e só
+    # um lote fica em memória, qualquer que seja o tamanho da tabela
+    with engine.connect() as conexao:
+        resultado = conexao.execution_options(
+            stream_results=True, max_row_buffer=config.EXPORTACAO_LOTE
+        ).execute(consulta)
+
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, lineterminator="\n")
+        if formato == "csv":
+            escritor.writerow(colunas)
+
+        for linhas in resultado.partitions(config.EXPORTACAO_LOTE):
+            for linha in linhas:
+                if formato == "csv":
+                    escritor.writerow([_valor_csv(v) for v in linha])
+                else:
+                    buffer.write(json.dumps(dict(zip(colunas, linha)), default=_json_padrao, ensure_ascii=False))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+def resposta_exportacao(
+    consulta, colunas: List[str], formato: str, nome_arquivo: str, engine=None
+) -> StreamingResponse:
+    """Resposta em streaming (NDJSON ou CSV) com as linhas de `consulta`, na ordem de `colunas`.
+
+    A leitura usa o engine síncrono num cursor do servidor; cada lote é lido no threadpool
+    enquanto a resposta é enviada. `engine` é o engine de leitura (padrão: o primário).
+    """
+    extensao = "ndjson" if formato == "ndjson" else "csv"
+    return StreamingResponse(
+        _transmitir(consulta, colunas, formato, engine if engine is not None else engine_primario),
+        media_type=TIPOS_MIDIA[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}.{extensao}"'},
+    )
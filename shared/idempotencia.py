@@ -0,0 +1,289 @@
+"""Cabeçalho Idempotency-Key nas escritas de pedidos, clientes e produtos.
+
+A primeira requisição com uma chave a reserva em `chaves_idempotencia` (INSERT ... ON CONFLICT), renova
+a reserva enquanto roda e, ao terminar, grava lá a resposta produzida. Repetições da mesma chave (inclusive simultâneas, que esperam
+a primeira terminar) recebem a resposta gravada sem executar o endpoint de novo. A chave vale por
+método + rota e só para o mesmo corpo e o mesmo Authorization; com outro conteúdo, a resposta é 422.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String, delete, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from starlette.concurrency import run_in_threadpool
+
+from shared import config
+from shared.database import Base, engine
+
+logger = logging.getLogger("idempotencia")
+
+CABECALHO = "idempotency-key"
+CABECALHO_REPETIDA = "Idempotent-Replayed"
+METODOS = {"POST", "PUT", "PATCH", "DELETE"}
+PREFIXOS = ("/orders", "/clients", "/products")
+TAMANHO_MAXIMO_CHAVE = 255
+
+# Respostas que não são guardadas: a chave é liberada e a próxima tentativa executa de novo
+STATUS_NAO_GUARDADOS = {401, 403, 409, 429}
+CABECALHOS_NAO_GUARDADOS = {b"content-length", b"date", b"server-timing"}
+
+
+class ChaveIdempotencia(Base):
+    __tablename__ = "chaves_idempotencia"
+
+    chave = Column(String(TAMANHO_MAXIMO_CHAVE), primary_key=True)
+    escopo = Column(String, primary_key=True)  # método e rota, ex.: "POST /orders/"
+    dono = Column(String(64), nullable=False)  # sha256 do Authorization
+    impressao = Column(String(64), nullable=True)  # sha256 da query e do corpo
+    status = Column(Integer, nullable=True)  # nulo enquanto a primeira requisição não termina
+    cabecalhos = Column(JSONB, nullable=True)
+    corpo = Column(LargeBinary, nullable=True)
+    expira_em = Column(DateTime, nullable=False, index=True)
+
+
+# Reserva a chave; uma linha expirada é retomada. Só retorna linha para quem ficou com a reserva
+RESERVAR = text("""
+    INSERT INTO chaves_idempotencia (chave, escopo, dono, expira_em)
+    VALUES (:chave, :escopo, :dono, timezone('utc', now()) + make_interval(secs => :reserva))
+    ON CONFLICT (chave, escopo) DO UPDATE
+    SET dono = excluded.dono, impressao = NULL, status = NULL, cabecalhos = NULL, corpo = NULL,
+        expira_em = excluded.expira_em
+    WHERE chaves_idempotencia.expira_em < timezone('utc', now())
+    RETURNING 1
+""")
+
+# Adia o fim da reserva enquanto a requisição que a detém ainda roda
+RENOVAR = text("""
+    UPDATE chaves_idempotencia
+    SET expira_em = timezone('utc', now()) + make_interval(secs => :reserva)
+    WHERE chave = :chave AND escopo = :escopo AND status IS NULL
+""")
+
+
+def _reservar(chave: str, escopo: str, dono: str) -> bool:
+    with engine.begin() as conn:
+        return conn.execute(
+            RESERVAR,
+            {"chave": chave, "escopo": escopo, "dono": dono, "reserva": config.IDEMPOTENCIA_RESERVA_SEGUNDOS},
+        ).first() is not None
+
+
+def _renovar(chave: str, escopo: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(RENOVAR, {"chave": chave, "escopo": escopo, "reserva": config.IDEMPOTENCIA_RESERVA_SEGUNDOS})
+
+
+async def _manter_reserva(chave: str, escopo: str) -> None:
+    # Renova a cada terço da reserva: uma requisição lenta não perde a chave para uma repetição
+    while True:
+        await asyncio.sleep(config.IDEMPOTENCIA_RESERVA_SEGUNDOS / 3)
+        try:
+            await run_in_threadpool(_renovar, chave, escopo)
+        except Exception:
+            logger.exception("Falha ao renovar a reserva da Idempotency-Key")
+
+
+def _concluir(chave: str, escopo: str, impressao: str, status: int, cabecalhos: list, corpo: bytes) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            ChaveIdempotencia.__table__.update()
+            .where(ChaveIdempotencia.chave == chave, ChaveIdempotencia.escopo == escopo)
+            .values(
+                impressao=impressao, status=status, cabecalhos=cabecalhos, corpo=corpo,
+                expira_em=datetime.utcnow() + timedelta(seconds=config.IDEMPOTENCIA_TTL_SEGUNDOS),
+            )
+        )
+
+
+def _liberar(chave: str, escopo: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            delete(ChaveIdempotencia).where(ChaveIdempotencia.chave == chave, ChaveIdempotencia.escopo == escopo)
+        )
+
+
+def _consultar(chave: str, escopo: str) -> Optional[tuple]:
+    with engine.connect() as conn:
+        return conn.execute(
+            ChaveIdempotencia.__table__.select()
+            .with_only_columns(
+                ChaveIdempotencia.dono, ChaveIdempotencia.impressao, ChaveIdempotencia.status,
+                ChaveIdempotencia.cabecalhos, ChaveIdempotencia.corpo,
+            )
+            .where(
+                ChaveIdempotencia.chave == chave,
+                ChaveIdempotencia.escopo == escopo,
+                ChaveIdempotencia.expira_em >= func.timezone("utc", func.now()),
+            )
+        ).first()
+
+
+def remover_expiradas() -> int:
+    with engine.begin() as conn:
+        return conn.execute(
+            delete(ChaveIdempotencia).where(ChaveIdempotencia.expira_em < func.timezone("utc", func.now()))
+        ).rowcount
+
+
+async def limpar_periodicamente(intervalo: float = 3600) -> None:
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await run_in_threadpool(remover_expiradas)
+        except Exception:
+            logger.exception("Falha ao remover chaves de idempotência expiradas")
+
+
+def _sha256(valor: bytes) -> str:
+    return hashlib.sha256(valor).hexdigest()
+
+
+def _nova_impressao(scope):
+    # Completada com o corpo conforme ele é lido
+    return hashlib.sha256(scope.get("query_string", b"") + b"\n")
+
+
+class MiddlewareIdempotencia:
+    """Middleware ASGI: executa no máximo uma vez cada Idempotency-Key das rotas de escrita."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in METODOS or not scope["path"].startswith(PREFIXOS):
+            await self.app(scope, receive, send)
+            return
+        cabecalhos = dict(scope["headers"])
+        chave = cabecalhos.get(CABECALHO.encode())
+        if chave is None:
+            await self.app(scope, receive, send)
+            return
+        chave = chave.decode("latin-1").strip()
+        if not chave or len(chave) > TAMANHO_MAXIMO_CHAVE:
+            await _responder_erro(send, 400, f"Idempotency-Key deve ter de 1 a {TAMANHO_MAXIMO_CHAVE} caracteres")
+            return
+
+        escopo = f'{scope["method"]} {scope["path"]}'
+        dono = _sha256(cabecalhos.get(b"authorization", b""))
+        if await run_in_threadpool(_reservar, chave, escopo, dono):
+            await self._executar(scope, receive, send, chave, escopo, _nova_impressao(scope))
+            return
+
+        # Chave já usada ou em uso: lê o corpo inteiro para comparar e espera a resposta gravada
+        impressao = _nova_impressao(scope)
+        mensagens = []
+        while True:
+            mensagem = await receive()
+            mensagens.append(mensagem)
+            impressao.update(mensagem.get("body", b""))
+            if mensagem["type"] != "http.request" or not mensagem.get("more_body", False):
+                break
+
+        espera = 0.05
+        prazo = asyncio.get_running_loop().time() + config.IDEMPOTENCIA_ESPERA_SEGUNDOS
+        while True:
+            gravada = await run_in_threadpool(_consultar, chave, escopo)
+            if gravada is None:
+                # A primeira tentativa falhou e liberou a chave (ou ela expirou): esta assume
+                if await run_in_threadpool(_reservar, chave, escopo, dono):
+                    await self._executar(
+                        scope, _repetir(mensagens, receive), send, chave, escopo, _nova_impressao(scope)
+                    )
+                    return
+            elif gravada.status is not None:
+                if gravada.dono != dono or gravada.impressao != impressao.hexdigest():
+                    await _responder_erro(send, 422, "Idempotency-Key já usada com outra requisição")
+                    return
+                await _reproduzir(send, gravada.status, gravada.cabecalhos, gravada.corpo)
+                return
+            if asyncio.get_running_loop().time() >= prazo:
+                await _responder_erro(send, 409, "Requisição com esta Idempotency-Key ainda em andamento")
+                return
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, 0.5)
+
+    async def _executar(self, scope, receive, send, chave: str, escopo: str, impressao) -> None:
+        renovacao = asyncio.create_task(_manter_reserva(chave, escopo))
+        try:
+            await self._executar_reservada(scope, receive, send, chave, escopo, impressao)
+        finally:
+            # Renovar depois de _concluir ou _liberar não tem efeito (status preenchido ou linha removida)
+            renovacao.cancel()
+
+    async def _executar_reservada(self, scope, receive, send, chave: str, escopo: str, impressao) -> None:
+        corpo_lido = False
+
+        async def receber():
+            nonlocal corpo_lido
+            mensagem = await receive()
+            if mensagem["type"] == "http.request":
+                impressao.update(mensagem.get("body", b""))
+                corpo_lido = not mensagem.get("more_body", False)
+            return mensagem
+
+        status = 500
+        guardados: List[Tuple[str, str]] = []
+        partes: List[bytes] = []
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                guardados.extend(
+                    (nome.decode("latin-1"), valor.decode("latin-1"))
+                    for nome, valor in mensagem.get("headers", [])
+                    if nome.lower() not in CABECALHOS_NAO_GUARDADOS
+                )
+            elif mensagem["type"] == "http.response.body":
+                partes.append(mensagem.get("body", b""))
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receber, enviar)
+        except BaseException:
+            await run_in_threadpool(_liberar, chave, escopo)
+            raise
+
+        if status >= 500 or status in STATUS_NAO_GUARDADOS:
+            await run_in_threadpool(_liberar, chave, escopo)
+            return
+        # O endpoint pode ter respondido sem ler o corpo todo; a impressão precisa dele inteiro
+        while not corpo_lido:
+            mensagem = await receive()
+            if mensagem["type"] != "http.request":
+                break
+            impressao.update(mensagem.get("body", b""))
+            corpo_lido = not mensagem.get("more_body", False)
+        await run_in_threadpool(_concluir, chave, escopo, impressao.hexdigest(), status, guardados, b"".join(partes))
+
+
+def _repetir(mensagens: list, receive):
+    pendentes = list(mensagens)
+
+    async def receber():
+        if pendentes:
+            return pendentes.pop(0)
+        return await receive()
+
+    return receber
+
+
+async def _reproduzir(send, status: int, cabecalhos: list, corpo: bytes) -> None:
+    brutos = [(nome.encode("latin-1"), valor.encode("latin-1")) for nome, valor in cabecalhos]
+    brutos += [(b"content-length", str(len(corpo)).encode()), (CABECALHO_REPETIDA.lower().encode(), b"true")]
+    await send({"type": "http.response.start", "status": status, "headers": brutos})
+    await send({"type": "http.response.body", "body": corpo})
+
+
+async def _responder_erro(send, status: int, detalhe: str) -> None:
+    corpo = json.dumps({"detail": detalhe}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(corpo)).encode())],
+    })
+    await send({"type": "http.response.body", "body": corpo})
@@ -0,0 +1,189 @@
+"""Métricas no formato texto do Prometheus e cabeçalho Server-Timing.
+
+O middleware abre uma MedicaoRequisicao por requisição (num ContextVar, que acompanha a requisição
+no threadpool e no greenlet do modo assíncrono); os eventos do engine e o pool somam nela o tempo
+e a quantidade de SQL e a espera por conexão.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+LIMITES_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(nomes: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if valor != float("inf") else "+Inf"
+
+
+class Histograma:
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (), limites: Sequence[float] = LIMITES_DURACAO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.limites = tuple(limites) + (float("inf"),)
+        self._lock = threading.Lock()
+        # valores dos rótulos -> [contagens por faixa, soma]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observar(self, valor: float, *rotulos: str) -> None:
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                serie = self._series[rotulos] = [[0] * len(self.limites), 0.0]
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+
+    def exportar(self) -> Iterable[str]:
+        yield f"# HELP {self.nome} {self.ajuda}"
+        yield f"# TYPE {self.nome} histogram"
+        with self._lock:
+            series = [(rotulos, list(contagens), soma) for rotulos, (contagens, soma) in self._series.items()]
+        for rotulos, contagens, soma in sorted(series):
+            acumulado = 0
+            for limite, contagem in zip(self.limites, contagens):
+                acumulado += contagem
+                le = 'le="%s"' % _numero(limite)
+                yield f"{self.nome}_bucket{_rotulos(self.rotulos, rotulos, le)} {acumulado}"
+            yield f"{self.nome}_sum{_rotulos(self.rotulos, rotulos)} {_numero(soma)}"
+            yield f"{self.nome}_count{_rotulos(self.rotulos, rotulos)} {acumulado}"
+
+
+def exportar_valores(nome: str, tipo: str, ajuda: str, valores: Dict[Tuple[str, ...], float], rotulos: Sequence[str] = ()) -> List[str]:
+    """Linhas de um gauge/counter cujos valores são lidos na hora da coleta."""
+    linhas = [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+    linhas += [f"{nome}{_rotulos(rotulos, chave)} {_numero(valor)}" for chave, valor in sorted(valores.items())]
+    return linhas
+
+
+requisicoes_duracao = Histograma(
+    "http_requisicao_duracao_segundos", "Duração das requisições HTTP por rota.", ("metodo", "rota", "status")
+)
+sql_consultas = Histograma(
+    "db_consultas_por_requisicao", "Quantidade de comandos SQL por requisição.", ("rota",), LIMITES_CONSULTAS
+)
+sql_duracao = Histograma(
+    "db_tempo_por_requisicao_segundos", "Tempo somado dos comandos SQL de cada requisição.", ("rota",)
+)
+pool_espera = Histograma(
+    "db_pool_espera_segundos", "Espera por uma conexão do pool a cada checkout.", (),
+    (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+tarefas_duracao = Histograma(
+    "tarefas_duracao_segundos", "Duração das tarefas em segundo plano por tipo e resultado.", ("tipo", "resultado"),
+    LIMITES_DURACAO + (30.0, 60.0),
+)
+HISTOGRAMAS = [requisicoes_duracao, sql_consultas, sql_duracao, pool_espera, tarefas_duracao]
+
+
+class MedicaoRequisicao:
+    __slots__ = ("scope", "consultas", "tempo_sql", "espera_pool")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.espera_pool = 0.0
+
+    def rota(self) -> str:
+        # Rota como declarada (ex.: /orders/{id}), para não criar uma série por id;
+        # o roteador só preenche scope["route"] depois de escolher o endpoint
+        return getattr(self.scope.get("route"), "path", "nao_encontrada")
+
+    def server_timing(self, total: float) -> str:
+        return (
+            f'db;dur={self.tempo_sql * 1000:.1f};desc="{self.consultas} consultas", '
+            f"pool;dur={self.espera_pool * 1000:.1f}, "
+            f"total;dur={total * 1000:.1f}"
+        )
+
+
+_medicao: ContextVar[Optional[MedicaoRequisicao]] = ContextVar("medicao_requisicao", default=None)
+
+
+def requisicao_atual() -> Optional[str]:
+    """Método e rota da requisição em andamento (ex.: "GET /orders/{id}"), se houver."""
+    medicao = _medicao.get()
+    return f'{medicao.scope["method"]} {medicao.rota()}' if medicao is not None else None
+
+
+def registrar_espera_pool(segundos: float) -> None:
+    pool_espera.observar(segundos)
+    medicao = _medicao.get()
+    if medicao is not None:
+        medicao.espera_pool += segundos
+
+
+def instrumentar_engine(engine) -> None:
+    """Soma tempo e quantidade dos comandos SQL do engine (síncrono) na requisição corrente."""
+
+    # O início fica no contexto do comando, descartado com ele mesmo quando o comando falha
+    # (after_cursor_execute não é chamado); comandos internos sem contexto não são medidos
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._inicio_metricas = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        inicio = getattr(context, "_inicio_metricas", None)
+        if inicio is None:
+            return
+        duracao = time.perf_counter() - inicio
+        medicao = _medicao.get()
+        if medicao is not None:
+            medicao.consultas += 1
+            medicao.tempo_sql += duracao
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI: histogramas por rota e cabeçalho Server-Timing em cada resposta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        medicao = MedicaoRequisicao(scope)
+        token = _medicao.set(medicao)
+        inicio = time.perf_counter()
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                MutableHeaders(scope=mensagem).append(
+                    "Server-Timing", medicao.server_timing(time.perf_counter() - inicio)
+                )
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _medicao.reset(token)
+            rota = medicao.rota()
+            requisicoes_duracao.observar(time.perf_counter() - inicio, scope["method"], rota, str(status))
+            sql_consultas.observar(medicao.consultas, rota)
+            sql_duracao.observar(medicao.tempo_sql, rota)
@@ -0,0 +1,133 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import func, select, text, tuple_
+
+from shared import config
+
+CABECALHO_PROXIMO_CURSOR = "X-Next-Cursor"
+CABECALHO_TOTAL = "X-Total-Count"
+CABECALHO_TOTAL_ESTIMADO = "X-Total-Count-Estimated"
+
+
+def limite_query(padrao: int = 10):
+    return Query(padrao, ge=1, le=config.PAGINA_LIMITE_MAXIMO, description="Quantidade máxima de itens por página")
+
+
+def cursor_query():
+    return Query(
+        None,
+        description=f"Cursor opaco da próxima página, retornado no cabeçalho {CABECALHO_PROXIMO_CURSOR}",
+    )
+
+
+def total_query():
+    return Query(
+        None,
+        description=(
+            f"Inclui o total no cabeçalho {CABECALHO_TOTAL}. `estimado`: sem filtros, vem das estatísticas "
+            f"do planejador (reltuples) e traz {CABECALHO_TOTAL_ESTIMADO}: true; com filtros, é uma contagem "
+            f"exata limitada a PAGINA_CONTAGEM_MAXIMA (acima dela, \"{config.PAGINA_CONTAGEM_MAXIMA}+\"). "
+            "`exato`: sempre a contagem limitada. Omitido, o total não é calculado"
+        ),
+    )
+
+
+def _serializar_valor(valor: Any) -> Any:
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def _converter_valor(coluna, valor: Any) -> Any:
+    # O cursor trafega em JSON; volta o valor ao tipo Python da coluna
+    tipo = coluna.type.python_type
+    if valor is None or isinstance(valor, tipo):
+        return valor
+    if tipo is datetime:
+        return datetime.fromisoformat(valor)
+    if tipo is date:
+        return date.fromisoformat(valor)
+    return tipo(valor)
+
+
+def codificar_cursor(ordenar_por: str, ordem: str, valor: Any, id: int) -> str:
+    dados = {"o": ordenar_por, "d": ordem, "v": [_serializar_valor(valor), id]}
+    return base64.urlsafe_b64encode(json.dumps(dados, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, ordenar_por: str, ordem: str) -> Tuple[Any, int]:
+    try:
+        preenchimento = "=" * (-len(cursor) % 4)
+        dados = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+        valor, id = dados["v"]
+        if dados["o"] != ordenar_por or dados["d"] != ordem:
+            raise ValueError
+        return valor, int(id)
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido para esta ordenação")
+
+
+def paginar(query, coluna_ordem, coluna_id, ordenar_por: str, ordem: str, cursor: Optional[str], limit: int):
+    """Aplica ordenação estável (coluna_ordem, id) e o filtro de keyset a partir do cursor.
+
+    Busca `limit + 1` linhas: a linha extra só indica se existe próxima página. `coluna_ordem` precisa
+    ser NOT NULL: a comparação de tuplas nunca é verdadeira para NULL e essas linhas sumiriam das páginas.
+    """
+    descendente = ordem == "desc"
+    if cursor:
+        valor, id = decodificar_cursor(cursor, ordenar_por, ordem)
+        chave = tuple_(coluna_ordem, coluna_id)
+        limite = tuple_(_converter_valor(coluna_ordem, valor), id)
+        query = query.filter(chave < limite if descendente else chave > limite)
+
+    if descendente:
+        query = query.order_by(coluna_ordem.desc(), coluna_id.desc())
+    else:
+        query = query.order_by(coluna_ordem.asc(), coluna_id.asc())
+    return query.limit(limit + 1)
+
+
+def fechar_pagina(itens: List[Any], ordenar_por: str, ordem: str, limit: int) -> Tuple[List[Any], Optional[str]]:
+    # Descarta a linha extra e monta o cursor a partir do último item entregue
+    if len(itens) <= limit:
+        return itens, None
+    itens = itens[:limit]
+    ultimo = itens[-1]
+    return itens, codificar_cursor(ordenar_por, ordem, getattr(ultimo, ordenar_por), ultimo.id)
+
+
+def contar_total(db, query, coluna_id, modo: Optional[str]) -> Optional[Dict[str, str]]:
+    """Cabeçalhos do total de itens de `query` (já filtrada, antes de paginar), conforme `modo`.
+
+    Nunca faz um COUNT(*) completo: a contagem exata para em PAGINA_CONTAGEM_MAXIMA + 1 linhas.
+    """
+    if modo is None:
+        return None
+    if modo == "estimado" and query.whereclause is None:
+        estimativa = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:tabela)"),
+            {"tabela": coluna_id.table.name},
+        ).scalar()
+        # -1: tabela ainda sem estatísticas (nunca analisada); cai para a contagem
+        if estimativa is not None and estimativa >= 0:
+            return {CABECALHO_TOTAL: str(estimativa), CABECALHO_TOTAL_ESTIMADO: "true"}
+
+    teto = config.PAGINA_CONTAGEM_MAXIMA
+    amostra = query.with_entities(coluna_id).order_by(None).limit(teto + 1).subquery()
+    total = db.execute(select(func.count()).select_from(amostra)).scalar()
+    return {CABECALHO_TOTAL: f"{teto}+" if total > teto else str(total)}
+
+
+def definir_proximo_cursor(response: Response, proximo_cursor: Optional[str]) -> None:
+    if proximo_cursor:
+        response.headers[CABECALHO_PROXIMO_CURSOR] = proximo_cursor
+
+
+def definir_total(response: Response, cabecalhos: Optional[Dict[str, str]]) -> None:
+    if cabecalhos:
+        response.headers.update(cabecalhos)
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from shared.metricas import registrar_espera_pool
+
+
+class _PoolMonitorado:
+    """Mixin que mede o tempo de checkout e quantos pedidos aguardam uma conexão."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_metricas = threading.Lock()
+        self._aguardando = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._espera_total = 0.0
+        self._espera_maxima = 0.0
+
+    def connect(self):
+        inicio = time.perf_counter()
+        with self._lock_metricas:
+            self._aguardando += 1
+        try:
+            conexao = super().connect()
+        except exc.TimeoutError:
+            with self._lock_metricas:
+                self._timeouts += 1
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            with self._lock_metricas:
+                self._aguardando -= 1
+                self._espera_total += espera
+                self._espera_maxima = max(self._espera_maxima, espera)
+            registrar_espera_pool(espera)
+        with self._lock_metricas:
+            self._checkouts += 1
+        return conexao
+
+    def estatisticas(self) -> dict:
+        with self._lock_metricas:
+            checkouts = self._checkouts
+            return {
+                "tamanho": self.size(),
+                "max_overflow": self._max_overflow,
+                "timeout_s": self._timeout,
+                "em_uso": self.checkedout(),
+                "ociosas": self.checkedin(),
+                # overflow() é negativo enquanto o pool ainda não abriu `tamanho` conexões
+                "overflow": max(self.overflow(), 0),
+                "aguardando": self._aguardando,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "espera_media_ms": round(self._espera_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "espera_maxima_ms": round(self._espera_maxima * 1000, 3),
+            }
+
+
+class QueuePoolMonitorado(_PoolMonitorado, QueuePool):
+    pass
+
+
+class AsyncAdaptedQueuePoolMonitorado(_PoolMonitorado, AsyncAdaptedQueuePool):
+    pass
@@ -0,0 +1,146 @@
+"""Réplicas de leitura (DB_REPLICA_URLS) para os GETs de listagem, detalhe, exportação e relatórios.
+
+Cada réplica tem seus engines, com o mesmo pool do primário. As leituras são distribuídas em
+rodízio entre as réplicas saudáveis; a verificação periódica (SELECT 1) tira e devolve réplicas do
+rodízio e, sem nenhuma saudável, a leitura vai para o primário. Com DB_LER_PRIMARIO_APOS_ESCRITA_SEGUNDOS,
+quem acabou de escrever recebe um cookie que mantém suas leituras no primário por essa janela.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from typing import List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from shared import config
+from shared.database import POOL_OPCOES, engine, url_assincrona
+from shared.metricas import instrumentar_engine
+from shared.pool import AsyncAdaptedQueuePoolMonitorado, QueuePoolMonitorado
+
+logger = logging.getLogger("replicas")
+
+COOKIE_PRIMARIO = "ler_primario_ate"
+METODOS_LEITURA = {"GET", "HEAD", "OPTIONS"}
+TIMEOUT_CONEXAO = 3  # segundos; uma réplica inacessível não pode prender a verificação nem a leitura
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.nome = make_url(url).render_as_string(hide_password=True)
+        self.engine = create_engine(
+            url, poolclass=QueuePoolMonitorado, connect_args={"connect_timeout": TIMEOUT_CONEXAO}, **POOL_OPCOES
+        )
+        self.sessoes = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        if config.METRICAS_ATIVAS:
+            instrumentar_engine(self.engine)
+        self.async_engine = None
+        self.sessoes_async = None
+        if config.DB_ASYNC:
+            self.async_engine = create_async_engine(
+                url_assincrona(url),
+                poolclass=AsyncAdaptedQueuePoolMonitorado,
+                connect_args={"timeout": TIMEOUT_CONEXAO},
+                **POOL_OPCOES,
+            )
+            self.sessoes_async = async_sessionmaker(self.async_engine, autoflush=False, expire_on_commit=False)
+            if config.METRICAS_ATIVAS:
+                instrumentar_engine(self.async_engine.sync_engine)
+        # Otimista até a primeira verificação
+        self.saudavel = True
+        self.falhas = 0
+        self.ultimo_erro: Optional[str] = None
+
+    def verificar(self) -> bool:
+        try:
+            with self.engine.connect() as conexao:
+                conexao.execute(text("SELECT 1"))
+        except Exception as erro:
+            self.falhas += 1
+            self.ultimo_erro = f"{type(erro).__name__}: {str(erro).strip().splitlines()[0]}"
+            if self.saudavel:
+                logger.warning("Réplica %s fora do rodízio: %s", self.nome, self.ultimo_erro)
+            self.saudavel = False
+            return False
+        if not self.saudavel:
+            logger.info("Réplica %s de volta ao rodízio", self.nome)
+        self.saudavel = True
+        return True
+
+    def estatisticas(self) -> dict:
+        engine_ativo = self.async_engine.sync_engine if self.async_engine is not None else self.engine
+        return {
+            "nome": self.nome,
+            "saudavel": self.saudavel,
+            "falhas": self.falhas,
+            "ultimo_erro": self.ultimo_erro,
+            "pool": engine_ativo.pool.estatisticas(),
+        }
+
+
+REPLICAS: List[Replica] = [Replica(url) for url in config.DB_REPLICA_URLS]
+_rodizio = itertools.count()
+
+
+def escolher_replica() -> Optional[Replica]:
+    """Próxima réplica saudável do rodízio; None quando não há nenhuma (leitura no primário)."""
+    saudaveis = [replica for replica in REPLICAS if replica.saudavel]
+    if not saudaveis:
+        return None
+    return saudaveis[next(_rodizio) % len(saudaveis)]
+
+
+def fixado_no_primario(cookies) -> bool:
+    if config.DB_LER_PRIMARIO_APOS_ESCRITA_SEGUNDOS <= 0:
+        return False
+    try:
+        return float(cookies.get(COOKIE_PRIMARIO, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def replica_para(request) -> Optional[Replica]:
+    if not REPLICAS or fixado_no_primario(request.cookies):
+        return None
+    return escolher_replica()
+
+
+def engine_leitura(request):
+    """Engine síncrono para leituras fora de uma sessão (exportações em streaming)."""
+    replica = replica_para(request)
+    return replica.engine if replica is not None else engine
+
+
+async def verificar_periodicamente(intervalo: float) -> None:
+    while True:
+        for replica in REPLICAS:
+            await run_in_threadpool(replica.verificar)
+        await asyncio.sleep(intervalo)
+
+
+class MiddlewareLeituraAposEscrita:
+    """Middleware ASGI: após uma escrita bem-sucedida, fixa as leituras do cliente no primário."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in METODOS_LEITURA:
+            await self.app(scope, receive, send)
+            return
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start" and mensagem["status"] < 400:
+                janela = config.DB_LER_PRIMARIO_APOS_ESCRITA_SEGUNDOS
+                cookie = (
+                    f"{COOKIE_PRIMARIO}={time.time() + janela:.3f}; Max-Age={int(janela + 0.999)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                mensagem["headers"] = list(mensagem.get("headers", [])) + [(b"set-cookie", cookie.encode())]
+            await send(mensagem)
+
+        await self.app(scope, receive, enviar)
@@ -0,0 +1,113 @@
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Type
+
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel
+
+from shared import config
+from shared.paginacao import definir_proximo_cursor, definir_total
+
+try:
+    import orjson
+except ImportError:  # sem orjson, cai para o json da biblioteca padrão com a mesma saída
+    orjson = None
+
+
+def colunas(
+    modelo, schema: Type[BaseModel], campos: Optional[Sequence[str]] = None, obrigatorios: Sequence[str] = ()
+) -> list:
+    """Colunas do modelo ORM correspondentes aos campos do schema de saída, na mesma ordem.
+
+    Com `campos`, só as pedidas mais as `obrigatorios` (ex.: id e a coluna do cursor).
+    """
+    return [
+        getattr(modelo, campo) for campo in schema.model_fields
+        if campos is None or campo in campos or campo in obrigatorios
+    ]
+
+
+def campos_query(schema: Type[BaseModel]):
+    return Query(
+        None,
+        description=f"Campos da resposta, separados por vírgula: {', '.join(schema.model_fields)}. Omitido, retorna todos",
+    )
+
+
+def resolver_campos(fields: Optional[str], schema: Type[BaseModel]) -> Optional[List[str]]:
+    """Valida o parâmetro `fields` contra os campos do schema; retorna-os na ordem do schema."""
+    if fields is None:
+        return None
+    pedidos = {campo.strip() for campo in fields.split(",") if campo.strip()}
+    if not pedidos:
+        raise HTTPException(status_code=400, detail="Informe ao menos um campo em fields")
+    invalidos = pedidos - set(schema.model_fields)
+    if invalidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos inválidos: {', '.join(sorted(invalidos))}. Permitidos: {', '.join(schema.model_fields)}",
+        )
+    return [campo for campo in schema.model_fields if campo in pedidos]
+
+
+def _padrao(valor: Any) -> Any:
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def json_bytes(conteudo: Any) -> bytes:
+    # Mesmo formato do JSONResponse do FastAPI: compacto, UTF-8 sem escapes, datas ISO 8601
+    if orjson is not None:
+        return orjson.dumps(conteudo)
+    return json.dumps(
+        conteudo, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_padrao
+    ).encode("utf-8")
+
+
+class RespostaJSONRapida(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return json_bytes(content)
+
+
+def _como_dict(item: Any) -> dict:
+    if isinstance(item, dict):
+        return item
+    if isinstance(item, BaseModel):
+        return item.model_dump()
+    return item._asdict()
+
+
+def resposta_lista(
+    linhas: Iterable[Any],
+    response: Response,
+    proximo_cursor: Optional[str] = None,
+    campos: Optional[Sequence[str]] = None,
+    total: Optional[Dict[str, str]] = None,
+) -> Any:
+    """Resposta das listagens a partir de linhas (Row ou dict) já no formato do schema de saída.
+
+    Com SERIALIZACAO_RAPIDA, as linhas vindas do banco vão direto para o encoder, sem nova validação
+    pelo response_model; sem ela, a lista segue o caminho normal do FastAPI. Com `campos`, cada
+    linha é recortada e codificada direto (o response_model descreve o objeto completo).
+    `total` são os cabeçalhos de contar_total.
+    """
+    linhas = [_como_dict(linha) for linha in linhas]
+    if campos is not None:
+        linhas = [{campo: linha[campo] for campo in campos} for linha in linhas]
+    elif not config.SERIALIZACAO_RAPIDA:
+        definir_proximo_cursor(response, proximo_cursor)
+        definir_total(response, total)
+        return linhas
+    resposta = RespostaJSONRapida(linhas)
+    definir_proximo_cursor(resposta, proximo_cursor)
+    definir_total(resposta, total)
+    return resposta
+
+
+def resposta_item(item: Any, campos: Sequence[str]) -> RespostaJSONRapida:
+    """Resposta de um único objeto (Row, dict ou schema) recortada aos `campos`."""
+    dados = _como_dict(item)
+    return RespostaJSONRapida({campo: dados[campo] for campo in campos})
@@ -0,0 +1,231 @@
+"""Fila local e durável de tarefas em segundo plano (tabela `tarefas`, no padrão outbox).
+
+`enfileirar` grava a tarefa na transação de quem chama: ela só existe se a escrita for confirmada e
+não se perde depois dela. Os trabalhadores (tarefas asyncio do ciclo de vida da aplicação, no máximo
+TAREFAS_TRABALHADORES ao mesmo tempo) pegam lotes com FOR UPDATE SKIP LOCKED, executam cada tarefa
+numa sessão própria no threadpool e a removem ao terminar. Uma falha é repetida com espera
+exponencial até TAREFAS_TENTATIVAS; depois disso a tarefa fica com estado "falhou" para inspeção.
+Ao ser pega, e de novo logo antes de executar, a tarefa ganha um prazo (executar_em adiantado): se o
+processo cair no meio, outro trabalhador a retoma depois dele. Por isso as tarefas devem poder rodar
+mais de uma vez.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text, event, func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from shared import config
+from shared.database import Base, SessionLocal, engine
+from shared.metricas import tarefas_duracao
+
+logger = logging.getLogger("tarefas")
+
+ESTADO_PENDENTE = "pendente"
+ESTADO_FALHOU = "falhou"
+ESPERA_MAXIMA_SEGUNDOS = 300  # teto da espera exponencial entre tentativas
+
+# Funções executoras por tipo de tarefa: recebem a sessão e os dados enfileirados como argumentos nomeados
+TIPOS: Dict[str, Callable[..., None]] = {}
+
+
+class Tarefa(Base):
+    __tablename__ = "tarefas"
+
+    id = Column(BigInteger, primary_key=True)
+    tipo = Column(String, nullable=False)
+    dados = Column(JSONB, nullable=False)
+    estado = Column(String, nullable=False, server_default=ESTADO_PENDENTE)
+    tentativas = Column(Integer, nullable=False, server_default="0")
+    executar_em = Column(DateTime, nullable=False, server_default=text("timezone('utc', now())"))
+    criada_em = Column(DateTime, nullable=False, server_default=text("timezone('utc', now())"))
+    erro = Column(Text, nullable=True)  # última falha
+
+    # Só as pendentes são procuradas pelos trabalhadores
+    __table_args__ = (
+        Index("ix_tarefas_pendentes_executar_em", "executar_em", postgresql_where=text("estado = 'pendente'")),
+    )
+
+
+# Pega até :limite tarefas vencidas e adia cada uma pelo prazo de execução
+PEGAR = text("""
+    UPDATE tarefas t
+    SET tentativas = t.tentativas + 1,
+        executar_em = timezone('utc', now()) + make_interval(secs => :prazo)
+    FROM (
+        SELECT id FROM tarefas
+        WHERE estado = 'pendente' AND executar_em <= timezone('utc', now())
+        ORDER BY executar_em, id
+        LIMIT :limite
+        FOR UPDATE SKIP LOCKED
+    ) vencidas
+    WHERE t.id = vencidas.id
+    RETURNING t.id, t.tipo, t.dados, t.tentativas
+""")
+
+# Renova o prazo de uma tarefa do lote logo antes de executá-la. Se o prazo da pega venceu e outro
+# trabalhador já a pegou (tentativas mudou), nada é atualizado e ela fica com ele
+RENOVAR = text("""
+    UPDATE tarefas
+    SET executar_em = timezone('utc', now()) + make_interval(secs => :prazo)
+    WHERE id = :id AND tentativas = :tentativas AND estado = 'pendente'
+    RETURNING id
+""")
+
+
+def tarefa(tipo: str):
+    """Registra a função executora de `tipo`."""
+
+    def registrar(funcao: Callable[..., None]) -> Callable[..., None]:
+        TIPOS[tipo] = funcao
+        return funcao
+
+    return registrar
+
+
+def enfileirar(db: Session, tipo: str, **dados) -> None:
+    """Grava a tarefa na transação de `db`; ela só vale se quem chama fizer o commit."""
+    if tipo not in TIPOS:
+        raise KeyError(f"Tipo de tarefa não registrado: {tipo}")
+    db.execute(insert(Tarefa).values(tipo=tipo, dados=dados))
+    db.info["tarefas_enfileiradas"] = True
+
+
+def processar_lote(limite: int) -> int:
+    """Pega e executa até `limite` tarefas vencidas; retorna quantas pegou."""
+    with engine.begin() as conexao:
+        pegas = conexao.execute(PEGAR, {"limite": limite, "prazo": config.TAREFAS_PRAZO_SEGUNDOS}).all()
+    for posicao, pega in enumerate(pegas):
+        # As tarefas rodam uma após a outra: o prazo dado na pega não cobre o lote inteiro
+        if posicao and not _renovar_prazo(pega.id, pega.tentativas):
+            continue
+        _executar(pega.id, pega.tipo, pega.dados, pega.tentativas)
+    return len(pegas)
+
+
+def _renovar_prazo(tarefa_id: int, tentativas: int) -> bool:
+    with engine.begin() as conexao:
+        parametros = {"id": tarefa_id, "tentativas": tentativas, "prazo": config.TAREFAS_PRAZO_SEGUNDOS}
+        return conexao.execute(RENOVAR, parametros).first() is not None
+
+
+def _executar(tarefa_id: int, tipo: str, dados: dict, tentativas: int) -> None:
+    inicio = time.perf_counter()
+    try:
+        funcao = TIPOS.get(tipo)
+        if funcao is None:
+            raise KeyError(f"Tipo de tarefa não registrado: {tipo}")
+        with SessionLocal() as db:
+            funcao(db, **dados)
+            db.commit()
+    except Exception as erro:
+        desistir = tentativas >= config.TAREFAS_TENTATIVAS
+        tarefas_duracao.observar(time.perf_counter() - inicio, tipo, "falhou" if desistir else "repetir")
+        logger.warning(
+            "Tarefa %s (%s) falhou na tentativa %d%s", tarefa_id, tipo, tentativas,
+            ", sem novas tentativas" if desistir else "", exc_info=True,
+        )
+        valores = {"erro": f"{type(erro).__name__}: {erro}"}
+        if desistir:
+            valores["estado"] = ESTADO_FALHOU
+        else:
+            espera = min(2 ** tentativas, ESPERA_MAXIMA_SEGUNDOS)
+            valores["executar_em"] = datetime.utcnow() + timedelta(seconds=espera)
+        with engine.begin() as conexao:
+            conexao.execute(update(Tarefa).where(Tarefa.id == tarefa_id).values(**valores))
+        return
+    tarefas_duracao.observar(time.perf_counter() - inicio, tipo, "sucesso")
+    with engine.begin() as conexao:
+        conexao.execute(Tarefa.__table__.delete().where(Tarefa.id == tarefa_id))
+
+
+def resumo_fila() -> List[dict]:
+    """Tarefas por tipo e estado, com a idade da mais antiga em segundos."""
+    with engine.connect() as conexao:
+        linhas = conexao.execute(
+            select(
+                Tarefa.tipo, Tarefa.estado, func.count(),
+                func.extract("epoch", func.timezone("utc", func.now()) - func.min(Tarefa.criada_em)),
+            ).group_by(Tarefa.tipo, Tarefa.estado).order_by(Tarefa.tipo, Tarefa.estado)
+        ).all()
+    return [
+        {"tipo": tipo, "estado": estado, "quantidade": quantidade, "mais_antiga_segundos": round(float(idade), 3)}
+        for tipo, estado, quantidade, idade in linhas
+    ]
+
+
+def tarefas_com_falha(limite: int) -> List[dict]:
+    with engine.connect() as conexao:
+        linhas = conexao.execute(
+            select(Tarefa.id, Tarefa.tipo, Tarefa.dados, Tarefa.tentativas, Tarefa.criada_em, Tarefa.erro)
+            .where(Tarefa.estado == ESTADO_FALHOU)
+            .order_by(Tarefa.id.desc())
+            .limit(limite)
+        ).all()
+    return [linha._asdict() for linha in linhas]
+
+
+def reenfileirar_falhas(ids: Optional[List[int]] = None) -> int:
+    """Devolve à fila as tarefas que falharam (todas, ou só as de `ids`), com as tentativas zeradas."""
+    comando = (
+        update(Tarefa)
+        .where(Tarefa.estado == ESTADO_FALHOU)
+        .values(estado=ESTADO_PENDENTE, tentativas=0, executar_em=func.timezone("utc", func.now()))
+    )
+    if ids is not None:
+        comando = comando.where(Tarefa.id.in_(ids))
+    with engine.begin() as conexao:
+        reenfileiradas = conexao.execute(comando).rowcount
+    if reenfileiradas:
+        _acordar_trabalhadores()
+    return reenfileiradas
+
+
+# Um commit com tarefas enfileiradas acorda os trabalhadores em vez de esperar a próxima verificação
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_sinal: Optional[asyncio.Event] = None
+
+
+def _acordar_trabalhadores() -> None:
+    if _loop is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_sinal.set)
+
+
+@event.listens_for(Session, "after_commit")
+def _apos_commit(sessao: Session) -> None:
+    if sessao.info.pop("tarefas_enfileiradas", False):
+        _acordar_trabalhadores()
+
+
+@event.listens_for(Session, "after_rollback")
+def _apos_rollback(sessao: Session) -> None:
+    sessao.info.pop("tarefas_enfileiradas", None)
+
+
+async def _trabalhar(intervalo: float) -> None:
+    while True:
+        _sinal.clear()
+        try:
+            pegas = await run_in_threadpool(processar_lote, config.TAREFAS_LOTE)
+        except Exception:
+            logger.exception("Falha ao pegar tarefas da fila")
+            pegas = 0
+        if pegas:
+            continue
+        try:
+            await asyncio.wait_for(_sinal.wait(), intervalo)
+        except asyncio.TimeoutError:
+            pass
+
+
+def iniciar_trabalhadores(quantidade: int, intervalo: float) -> List[asyncio.Task]:
+    """Cria `quantidade` trabalhadores no event loop atual; sem tarefas, cada um verifica a fila a cada `intervalo`."""
+    global _loop, _sinal
+    _loop = asyncio.get_running_loop()
+    _sinal = asyncio.Event()
+    return [asyncio.create_task(_trabalhar(intervalo)) for _ in range(quantidade)]
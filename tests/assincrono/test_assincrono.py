@@ -0,0 +1,137 @@
+"""Roda o CRUD e as listagens com as sessões assíncronas (asyncpg + `executar` via run_sync).
+
+O modo é escolhido na importação (DB_ASYNC), então aqui as dependências de sessão são trocadas
+pelas versões assíncronas sobre um AsyncEngine próprio. O asyncpg prende as conexões ao event
+loop que as abriu: um único `with TestClient(app)` atende o módulo inteiro, no mesmo loop.
+"""
+import random
+import string
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from main import app
+from shared import config, dependencias
+from shared.database import POOL_OPCOES, url_assincrona
+from shared.pool import AsyncAdaptedQueuePoolMonitorado
+
+
+@pytest.fixture(scope="module")
+def async_engine():
+    return create_async_engine(
+        url_assincrona(config.DATABASE_URL), poolclass=AsyncAdaptedQueuePoolMonitorado, **POOL_OPCOES
+    )
+
+
+@pytest.fixture(scope="module")
+def client(async_engine):
+    sessoes = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(dependencias, "AsyncSessionLocal", sessoes)
+        mp.setitem(app.dependency_overrides, dependencias.get_db, dependencias.get_db_async)
+        mp.setitem(app.dependency_overrides, dependencias.get_db_leitura, dependencias.get_db_leitura_async)
+        with TestClient(app) as cliente_http:
+            yield cliente_http
+            cliente_http.portal.call(async_engine.dispose)
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    nome_usuario = "admin_" + uuid.uuid4().hex[:8]
+    client.post("/auth/register", json={"nome_usuario": nome_usuario, "senha": "adminpassword", "papel": "admin"})
+    response = client.post("/auth/login", data={"username": nome_usuario, "password": "adminpassword"})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def dados_cliente(nome=None):
+    sufixo = ''.join(random.choices(string.digits, k=11))
+    return {"nome": nome or f"Cliente {sufixo}", "email": f"a{sufixo}@exemplo.com", "cpf": sufixo}
+
+
+def test_crud_de_clientes(client, headers, async_engine):
+    checkouts = async_engine.pool.estatisticas()["checkouts"]
+    cliente_data = dados_cliente()
+    response = client.post("/clients/", json=cliente_data, headers=headers)
+    assert response.status_code == 201
+    cliente_id = response.json()["id"]
+
+    assert client.get(f"/clients/{cliente_id}", headers=headers).json()["email"] == cliente_data["email"]
+
+    novos_dados = {**cliente_data, "nome": "Cliente Assincrono"}
+    response = client.put(f"/clients/{cliente_id}", json=novos_dados, headers=headers)
+    assert response.status_code == 200
+    assert client.get(f"/clients/{cliente_id}", headers=headers).json()["nome"] == "Cliente Assincrono"
+
+    assert client.delete(f"/clients/{cliente_id}", headers=headers).status_code == 204
+    assert client.get(f"/clients/{cliente_id}", headers=headers).status_code == 404
+
+    # As requisições passaram pelo AsyncEngine, não pelo pool síncrono
+    assert async_engine.pool.estatisticas()["checkouts"] > checkouts
+
+
+def test_listagem_de_clientes_por_cursor(client, headers):
+    prefixo = "Assincrono " + uuid.uuid4().hex[:8]
+    for i in range(5):
+        assert client.post("/clients/", json=dados_cliente(f"{prefixo} {i}"), headers=headers).status_code == 201
+
+    ids = []
+    cursor = None
+    while True:
+        params = {"nome": prefixo, "limit": 2, "total": "exato"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/clients/", params=params, headers=headers)
+        assert response.status_code == 200
+        assert response.headers["X-Total-Count"] == "5"
+        ids += [c["id"] for c in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len(ids) == 5
+    assert ids == sorted(ids)
+
+
+def test_crud_de_produtos_e_pedidos(client, headers):
+    secao = "assincrono_" + uuid.uuid4().hex[:8]
+    produto = {
+        "descricao": "Produto assincrono", "valor_venda": 4.0, "codigo_barras": uuid.uuid4().hex,
+        "secao": secao, "estoque_inicial": 10,
+    }
+    response = client.post("/products/", json=produto, headers=headers)
+    assert response.status_code == 201
+    produto_id = response.json()["id"]
+
+    response = client.put(f"/products/{produto_id}", json={"valor_venda": 5.0}, headers=headers)
+    assert response.status_code == 200
+    assert client.get(f"/products/{produto_id}", headers=headers).json()["valor_venda"] == 5.0
+    assert [p["id"] for p in client.get("/products/", params={"secao": secao}, headers=headers).json()] == [produto_id]
+
+    cliente_id = client.post("/clients/", json=dados_cliente(), headers=headers).json()["id"]
+    pedidos = []
+    for quantidade in (2, 3):
+        response = client.post("/orders/", json={
+            "cliente_id": cliente_id, "produtos": [{"produto_id": produto_id, "quantidade": quantidade}],
+        }, headers=headers)
+        assert response.status_code == 201
+        pedidos.append(response.json()["id"])
+    assert client.get(f"/products/{produto_id}", headers=headers).json()["estoque_inicial"] == 5
+
+    response = client.get("/orders/", params={"cliente_id": cliente_id}, headers=headers)
+    assert response.status_code == 200
+    assert [(p["id"], p["produtos"]) for p in response.json()] == [
+        (pedidos[0], [{"produto_id": produto_id, "quantidade": 2}]),
+        (pedidos[1], [{"produto_id": produto_id, "quantidade": 3}]),
+    ]
+
+    response = client.put(f"/orders/{pedidos[0]}", json={"status": "enviado"}, headers=headers)
+    assert response.status_code == 200
+    assert client.get(f"/orders/{pedidos[0]}", headers=headers).json()["status"] == "enviado"
+
+    for pedido_id in pedidos:
+        assert client.delete(f"/orders/{pedido_id}", headers=headers).status_code == 204
+    assert client.get(f"/orders/{pedidos[1]}", headers=headers).status_code == 404
+    assert client.delete(f"/products/{produto_id}", headers=headers).status_code == 204
+    assert client.get(f"/products/{produto_id}", headers=headers).status_code == 404
@@ -32,9 +32,16 @@ def test_registrar_novo_usuario(novo_usuario):
     assert response.status_code == 201
     assert response.json() == {"msg": "Usuário criado com sucesso"}
 
-def test_registrar_usuario_repetido(novo_usuario):
+def test_registrar_usuario_repetido(novo_usuario, monkeypatch):
+    from autenticacao.routers import autenticacao
+
     client.post("/auth/register", json=novo_usuario)  # 1º vez
-    response = client.post("/auth/register", json=novo_usuario)  # 2º vez, deve falhar
+
+    async def hash_nao_esperado(senha):
+        raise AssertionError("hash gerado para usuário repetido")
+
+    monkeypatch.setattr(autenticacao, "gerar_hash_async", hash_nao_esperado)
+    response = client.post("/auth/register", json=novo_usuario)  # 2º vez, deve falhar sem gerar hash
     assert response.status_code == 400
     assert response.json()["detail"] == "Usuário já existe"
 
@@ -66,3 +73,34 @@ def test_refresh_token(token):
     json_data = response.json()
     assert "access_token" in json_data
     assert json_data["token_type"] == "bearer"
+
+def test_token_invalido():
+    headers = {"Authorization": "Bearer token_invalido"}
+    response = client.post("/auth/refresh-token", headers=headers)
+    assert response.status_code == 401
+
+def test_login_atualiza_hash_de_custo_menor(novo_usuario):
+    from shared import config
+    from shared.database import SessionLocal
+    from autenticacao.models.autenticacao import Tabela_Usuarios
+    from autenticacao.senhas import contexto
+
+    client.post("/auth/register", json=novo_usuario)
+    outro_custo = 4 if config.SENHA_BCRYPT_ROUNDS > 4 else 5  # o mínimo do bcrypt, mais barato que o configurado
+    with SessionLocal() as db:
+        usuario = db.query(Tabela_Usuarios).filter(Tabela_Usuarios.nome_usuario == novo_usuario["nome_usuario"]).one()
+        usuario.senha = contexto.hash(novo_usuario["senha"], rounds=outro_custo)
+        db.commit()
+
+    response = client.post(
+        "/auth/login",
+        data={"username": novo_usuario["nome_usuario"], "password": novo_usuario["senha"]},
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    assert response.status_code == 200
+
+    with SessionLocal() as db:
+        senha_salva = db.query(Tabela_Usuarios.senha).filter(Tabela_Usuarios.nome_usuario == novo_usuario["nome_usuario"]).scalar()
+    assert senha_salva.startswith(f"$2b${config.SENHA_BCRYPT_ROUNDS:02d}$")
+    assert not contexto.needs_update(senha_salva)
+    assert contexto.verify(novo_usuario["senha"], senha_salva)
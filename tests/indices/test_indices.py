@@ -0,0 +1,120 @@
+"""Verifica, via EXPLAIN, que os filtros das listagens usam os índices criados pelas migrações.
+
+Os dados são gerados numa transação desfeita ao final, com volume suficiente para o planejador
+preferir os índices a uma varredura sequencial.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, text
+
+from shared.database import engine
+from shared.paginacao import paginar
+from pedidos.models.pedidos import Pedido, PedidoProduto
+from pedidos.routers.pedidos import _filtrar_pedidos
+from produtos.models.produtos import Produto
+from produtos.routers.produtos import _filtrar_produtos
+
+CLIENTES = 2_000
+PRODUTOS = 50_000
+PEDIDOS = 200_000
+ITENS_POR_PEDIDO = 2
+INICIO = datetime(2024, 1, 1)
+
+SEMEAR = [
+    f"""
+    INSERT INTO clientes (nome, email, cpf)
+    SELECT 'indice_' || g, 'indice_' || g || '@exemplo.com', 'indice_' || g
+    FROM generate_series(1, {CLIENTES}) g
+    """,
+    f"""
+    INSERT INTO produtos (descricao, valor_venda, codigo_barras, secao, estoque_inicial, disponivel)
+    SELECT md5(g::text), round((random() * 1000)::numeric, 2), 'indice_' || g,
+           'secao_' || (g % 40), 1000, random() < 0.8
+    FROM generate_series(1, {PRODUTOS}) g
+    """,
+    # Os ids gerados por um único INSERT são consecutivos: sorteia por deslocamento a partir do menor
+    f"""
+    INSERT INTO pedidos (cliente_id, status, data_criacao)
+    SELECT c.inicio + floor(random() * {CLIENTES})::int, 'pendente',
+           TIMESTAMP '{INICIO:%Y-%m-%d}' + random() * INTERVAL '730 days'
+    FROM generate_series(1, {PEDIDOS}) g,
+         (SELECT min(id) AS inicio FROM clientes WHERE cpf LIKE 'indice\\_%') c
+    """,
+    f"""
+    INSERT INTO pedido_produto (pedido_id, produto_id, quantidade, valor_unitario, secao)
+    SELECT p.id, pr.inicio + (p.id * {ITENS_POR_PEDIDO} + n) % {PRODUTOS}, 1, 0, 'indice'
+    FROM pedidos p
+    CROSS JOIN generate_series(0, {ITENS_POR_PEDIDO - 1}) n,
+         (SELECT min(id) AS inicio FROM produtos WHERE codigo_barras LIKE 'indice\\_%') pr
+    WHERE p.cliente_id >= (SELECT min(id) FROM clientes WHERE cpf LIKE 'indice\\_%')
+    """,
+    "ANALYZE clientes, produtos, pedidos, pedido_produto",
+]
+
+
+@pytest.fixture(scope="module")
+def conexao():
+    with engine.connect() as conn:
+        transacao = conn.begin()
+        for sql in SEMEAR:
+            conn.execute(text(sql))
+        yield conn
+        transacao.rollback()
+
+
+def indices_usados(conn, consulta) -> set:
+    compilada = consulta.compile(dialect=engine.dialect)
+    plano = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compilada), compilada.params).scalar()
+    indices = set()
+    nos = [plano[0]["Plan"]]
+    while nos:
+        no = nos.pop()
+        if "Index Name" in no:
+            indices.add(no["Index Name"])
+        nos.extend(no.get("Plans", []))
+    return indices
+
+
+def _um_id(conn, tabela, coluna_filtro, padrao):
+    return conn.execute(text(f"SELECT min(id) FROM {tabela} WHERE {coluna_filtro} LIKE :p"), {"p": padrao}).scalar()
+
+
+def test_pedidos_por_cliente(conexao):
+    cliente_id = _um_id(conexao, "clientes", "cpf", "indice\\_%")
+    consulta = _filtrar_pedidos(select(Pedido.id), None, cliente_id, None, None, None, None)
+    consulta = paginar(consulta, Pedido.id, Pedido.id, "id", "asc", None, 10)
+    assert "ix_pedidos_cliente_id_id" in indices_usados(conexao, consulta)
+
+
+def test_pedidos_por_periodo(conexao):
+    inicio = INICIO + timedelta(days=100)
+    consulta = _filtrar_pedidos(select(Pedido.id), None, None, None, None, inicio, inicio + timedelta(days=2))
+    consulta = paginar(consulta, Pedido.data_criacao, Pedido.id, "data_criacao", "desc", None, 10)
+    assert "ix_pedidos_data_criacao_id" in indices_usados(conexao, consulta)
+
+
+def test_itens_por_produto(conexao):
+    produto_id = _um_id(conexao, "produtos", "codigo_barras", "indice\\_%")
+    consulta = select(PedidoProduto.pedido_id).where(PedidoProduto.produto_id == produto_id)
+    assert "ix_pedido_produto_produto_id" in indices_usados(conexao, consulta)
+
+
+@pytest.mark.parametrize("disponivel", [None, True])
+def test_produtos_por_faixa_de_preco(conexao, disponivel):
+    consulta = _filtrar_produtos(select(Produto.id), None, 100.0, 102.0, disponivel)
+    consulta = paginar(consulta, Produto.valor_venda, Produto.id, "valor_venda", "asc", None, 10)
+    assert "ix_produtos_valor_venda_id" in indices_usados(conexao, consulta)
+
+
+def test_produtos_ordenados_por_descricao(conexao):
+    consulta = paginar(select(Produto.id), Produto.descricao, Produto.id, "descricao", "asc", None, 10)
+    assert "ix_produtos_descricao_id" in indices_usados(conexao, consulta)
+
+
+def test_produtos_por_secao(conexao):
+    disponivel = conexao.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first()
+    if not disponivel:
+        pytest.skip("extensão pg_trgm não disponível neste servidor")
+    consulta = _filtrar_produtos(select(Produto.id), "secao_17", None, None, None)
+    assert "ix_produtos_secao_trgm" in indices_usados(conexao, consulta)
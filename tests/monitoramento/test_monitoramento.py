@@ -0,0 +1,140 @@
+import random
+import string
+from fastapi.testclient import TestClient
+from main import app
+from shared.consultas_lentas import normalizar_sql
+
+client = TestClient(app)
+
+def obter_token(papel="admin"):
+    nome_usuario = f"{papel}_" + ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+    senha = "senhateste"
+    client.post("/auth/register", json={"nome_usuario": nome_usuario, "senha": senha, "papel": papel})
+    response = client.post("/auth/login", data={"username": nome_usuario, "password": senha})
+    return response.json()["access_token"]
+
+def test_estatisticas_pool():
+    headers = {"Authorization": f"Bearer {obter_token()}"}
+    response = client.get("/monitoring/pool", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["pool"]["tamanho"] >= 1
+    assert data["pool"]["checkouts"] >= 1
+    assert "espera_media_ms" in data["pool"]
+    assert data["postgres_max_connections"] > 0
+
+def test_estatisticas_pool_requer_admin():
+    headers = {"Authorization": f"Bearer {obter_token('user')}"}
+    response = client.get("/monitoring/pool", headers=headers)
+    assert response.status_code == 403
+
+def test_estatisticas_caches_contam_tokens_validados():
+    headers = {"Authorization": f"Bearer {obter_token()}"}
+    client.get("/monitoring/caches", headers=headers)
+    response = client.get("/monitoring/caches", headers=headers)
+    assert response.status_code == 200
+    tokens = response.json()["tokens"]
+    assert tokens["acertos"] >= 1
+    assert tokens["itens"] >= 1
+
+def test_server_timing_conta_consultas():
+    headers = {"Authorization": f"Bearer {obter_token()}"}
+    response = client.get("/clients/", params={"limit": 1}, headers=headers)
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    assert "total;dur=" in timing
+    assert '"0 consultas"' not in timing
+
+def test_metricas_prometheus():
+    headers = {"Authorization": f"Bearer {obter_token()}"}
+    client.get("/clients/", params={"limit": 1}, headers=headers)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    texto = response.text
+    assert '# TYPE http_requisicao_duracao_segundos histogram' in texto
+    assert 'http_requisicao_duracao_segundos_count{metodo="GET",rota="/clients/",status="200"}' in texto
+    assert 'db_consultas_por_requisicao_bucket{rota="/clients/",le="+Inf"}' in texto
+    assert "db_pool_checkouts_total" in texto
+
+def test_normalizar_sql_colapsa_parametros_e_listas():
+    sql = "SELECT * FROM produtos WHERE id IN (%(id_1_1)s, %(id_1_2)s) AND secao = 'a''b'  LIMIT %(param_1)s"
+    assert normalizar_sql(sql) == "SELECT * FROM produtos WHERE id IN (?...) AND secao = ? LIMIT ?"
+    assert normalizar_sql("INSERT INTO t (a) VALUES ($1::INTEGER), ($2::INTEGER)") == "INSERT INTO t (a) VALUES (?...)..."
+
+def test_consultas_lentas_desativado(monkeypatch):
+    from monitoramento.routers import monitoramento
+    monkeypatch.setattr(monitoramento, "registro_consultas_lentas", None)
+    headers = {"Authorization": f"Bearer {obter_token()}"}
+    response = client.get("/monitoring/slow-queries", headers=headers)
+    assert response.status_code == 404
+
+def test_resumo_consultas_lentas_com_sql_normalizado_e_plano(monkeypatch, tmp_path):
+    import json
+    import time
+    from sqlalchemy import create_engine, exc, text
+    from monitoramento.routers import monitoramento
+    from shared.consultas_lentas import RegistroConsultasLentas
+    from shared.database import engine
+
+    arquivo = tmp_path / "consultas_lentas.log"
+    lentas = RegistroConsultasLentas(50, 1.0, str(arquivo), 1, 1)
+    monkeypatch.setattr(monitoramento, "registro_consultas_lentas", lentas)
+    # Engine próprio: os listeners do registro não ficam no engine da aplicação depois do teste
+    medido = create_engine(engine.url)
+    lentas.instrumentar(medido, medido)
+    with medido.connect() as conexao:
+        conexao.execute(text("SELECT 1"))
+        try:
+            conexao.execute(text("SELECT 1 / 0"))
+        except exc.DBAPIError:
+            conexao.rollback()
+        conexao.execute(text("SELECT count(*) FROM produtos, pg_sleep(0.1) WHERE produtos.id > :id"), {"id": 0})
+        # O comando que falhou não deixa o início preso à conexão
+        assert conexao.info == {}
+
+    headers = {"Authorization": f"Bearer {obter_token()}"}
+    for _ in range(50):
+        # O EXPLAIN roda depois, numa thread do registro
+        resumo = client.get("/monitoring/slow-queries", headers=headers).json()
+        if resumo and resumo[0]["explain"]:
+            break
+        time.sleep(0.1)
+    medido.dispose()
+
+    assert len(resumo) == 1
+    consulta = resumo[0]
+    assert consulta["sql"] == "SELECT count(*) FROM produtos, pg_sleep(?) WHERE produtos.id > ?"
+    assert consulta["ocorrencias"] == 1 and consulta["maximo_ms"] >= 100
+    assert "produtos" in consulta["explain"] and "actual time" in consulta["explain"]
+
+    linhas = [json.loads(linha) for linha in arquivo.read_text().splitlines()]
+    assert [linha["tipo"] for linha in linhas] == ["consulta_lenta", "explain"]
+    assert linhas[0]["sql"] == consulta["sql"]
+    assert linhas[0]["parametros"] == {"id": "int"}
+    assert linhas[1]["plano"] == consulta["explain"]
+
+def test_comando_com_erro_nao_deixa_inicio_pendente_na_conexao():
+    import pytest
+    from sqlalchemy import create_engine, exc, text
+    from shared.database import engine
+    from shared.metricas import MedicaoRequisicao, _medicao, instrumentar_engine
+
+    medido = create_engine(engine.url)
+    instrumentar_engine(medido)
+    medicao = MedicaoRequisicao({"method": "GET"})
+    token = _medicao.set(medicao)
+    try:
+        with medido.connect() as conexao:
+            for _ in range(3):
+                with pytest.raises(exc.DBAPIError):
+                    conexao.execute(text("SELECT 1 / 0"))
+                conexao.rollback()
+            conexao.execute(text("SELECT 1"))
+            # Os comandos que falharam não deixam nada preso à conexão (que volta ao pool)
+            assert conexao.info == {}
+    finally:
+        _medicao.reset(token)
+        medido.dispose()
+    assert medicao.consultas == 1
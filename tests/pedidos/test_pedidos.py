@@ -1,7 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
 from main import app
-from tests.utils import criar_token_admin, criar_cliente_com_dados, criar_produto_simples
+from tests.utils import criar_token_admin, obter_token_admin, criar_cliente_com_dados, criar_produto_simples
 
 client = TestClient(app)
 
@@ -87,3 +87,277 @@ def test_deletar_pedido(token_admin, cliente_id, produto_id):
     res = client.delete(f"/orders/{pedido_id}", headers={"Authorization": f"Bearer {token_admin}"})
     print("test_deletar_pedido status:", res.status_code)
     assert res.status_code == 204
+
+def criar_produto(headers, estoque, secao="lote"):
+    from uuid import uuid4
+    produto = {
+        "descricao": "Produto lote", "valor_venda": 2.0, "codigo_barras": uuid4().hex,
+        "secao": secao, "estoque_inicial": estoque,
+    }
+    response = client.post("/products/", json=produto, headers=headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+def criar_cliente(headers):
+    from random import choices
+    from string import digits
+    sufixo = ''.join(choices(digits, k=11))
+    response = client.post("/clients/", json={
+        "nome": f"Cliente {sufixo}", "email": f"c{sufixo}@exemplo.com", "cpf": sufixo,
+    }, headers=headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+def test_criar_pedido_estoque_insuficiente():
+    headers = {"Authorization": f"Bearer {obter_token_admin()}"}
+    p1, p2 = criar_produto(headers, 5), criar_produto(headers, 2)
+    cliente = criar_cliente(headers)
+
+    response = client.post("/orders/", json={
+        "cliente_id": cliente,
+        "produtos": [{"produto_id": p1, "quantidade": 1}, {"produto_id": p2, "quantidade": 3}],
+    }, headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Estoque insuficiente para produto {p2}"
+
+    # Nada é baixado quando um dos itens não cabe no estoque
+    assert client.get(f"/products/{p1}", headers=headers).json()["estoque_inicial"] == 5
+    assert client.get(f"/products/{p2}", headers=headers).json()["estoque_inicial"] == 2
+    assert client.get("/orders/", params={"cliente_id": cliente}, headers=headers).json() == []
+
+def test_criar_pedido_com_quantidade_nao_positiva():
+    headers = {"Authorization": f"Bearer {obter_token_admin()}"}
+    produto = criar_produto(headers, 5)
+    cliente = criar_cliente(headers)
+
+    for quantidade in (0, -3):
+        response = client.post("/orders/", json={
+            "cliente_id": cliente, "produtos": [{"produto_id": produto, "quantidade": quantidade}],
+        }, headers=headers)
+        assert response.status_code == 422
+    assert client.get(f"/products/{produto}", headers=headers).json()["estoque_inicial"] == 5
+    assert client.get("/orders/", params={"cliente_id": cliente}, headers=headers).json() == []
+
+def test_pedidos_em_lote_sucesso_parcial():
+    headers = {"Authorization": f"Bearer {obter_token_admin()}"}
+    p1, p2 = criar_produto(headers, 5), criar_produto(headers, 3)
+    cliente = criar_cliente(headers)
+
+    lote = [
+        {"cliente_id": cliente, "produtos": [{"produto_id": p1, "quantidade": 3}]},
+        {"cliente_id": 0, "produtos": [{"produto_id": p1, "quantidade": 1}]},
+        # Só restam 2 de p1 depois do primeiro pedido do lote
+        {"cliente_id": cliente, "produtos": [{"produto_id": p1, "quantidade": 3}]},
+        {"cliente_id": cliente, "produtos": [{"produto_id": p2, "quantidade": 1}, {"produto_id": 0, "quantidade": 1}]},
+        {"cliente_id": cliente, "produtos": [
+            {"produto_id": p1, "quantidade": 1}, {"produto_id": p2, "quantidade": 3}, {"produto_id": p1, "quantidade": 1},
+        ]},
+    ]
+    response = client.post("/orders/batch", json=lote, headers=headers)
+    assert response.status_code == 200
+    resultados = response.json()
+    assert [(r["indice"], r["sucesso"], r["erro"]) for r in resultados] == [
+        (0, True, None),
+        (1, False, "Cliente não encontrado"),
+        (2, False, f"Estoque insuficiente para produto {p1}"),
+        (3, False, "Produto 0 não encontrado"),
+        (4, True, None),
+    ]
+    assert all(r["pedido"] is None for r in resultados if not r["sucesso"])
+
+    for indice, produtos in [(0, [{"produto_id": p1, "quantidade": 3}]),
+                             (4, [{"produto_id": p1, "quantidade": 2}, {"produto_id": p2, "quantidade": 3}])]:
+        pedido = resultados[indice]["pedido"]
+        assert (pedido["cliente_id"], pedido["status"]) == (cliente, "pendente")
+        assert sorted(pedido["produtos"], key=lambda i: i["produto_id"]) == produtos
+        salvo = client.get(f"/orders/{pedido['id']}", headers=headers).json()
+        assert sorted(salvo["produtos"], key=lambda i: i["produto_id"]) == produtos
+
+    assert client.get(f"/products/{p1}", headers=headers).json()["estoque_inicial"] == 0
+    assert client.get(f"/products/{p2}", headers=headers).json()["estoque_inicial"] == 0
+
+def test_exportar_pedidos_ndjson_e_csv():
+    import csv
+    import io
+    import json
+    from uuid import uuid4
+    headers = {"Authorization": f"Bearer {obter_token_admin()}"}
+    secao = "exportacao_" + uuid4().hex[:8]
+    p1, p2 = criar_produto(headers, 10, secao), criar_produto(headers, 10, secao)
+    cliente = criar_cliente(headers)
+
+    def pedido(*itens):
+        response = client.post("/orders/", json={
+            "cliente_id": cliente, "produtos": [{"produto_id": p, "quantidade": q} for p, q in itens],
+        }, headers=headers)
+        assert response.status_code == 201
+        return response.json()["id"]
+
+    primeiro, segundo = pedido((p1, 1), (p2, 2)), pedido((p2, 3))
+    client.put(f"/orders/{segundo}", json={"status": "cancelado"}, headers=headers)
+
+    response = client.get("/orders/export", params={"secao": secao}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    linhas = [json.loads(linha) for linha in response.text.splitlines()]
+    assert [list(linha) for linha in linhas] == [["id", "cliente_id", "status", "data_criacao", "produtos"]] * 2
+    assert [(l["id"], l["cliente_id"], l["status"]) for l in linhas] == [
+        (primeiro, cliente, "pendente"), (segundo, cliente, "cancelado"),
+    ]
+    assert sorted(linhas[0]["produtos"], key=lambda i: i["produto_id"]) == [
+        {"produto_id": p1, "quantidade": 1}, {"produto_id": p2, "quantidade": 2},
+    ]
+    assert linhas[1]["produtos"] == [{"produto_id": p2, "quantidade": 3}]
+
+    response = client.get(
+        "/orders/export", params={"formato": "csv", "cliente_id": cliente, "status": "cancelado"}, headers=headers
+    )
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="pedidos.csv"' in response.headers["content-disposition"]
+    cabecalho, *registros = list(csv.reader(io.StringIO(response.text)))
+    assert cabecalho == ["id", "cliente_id", "status", "data_criacao", "produtos"]
+    assert [(int(r[0]), int(r[1]), r[2]) for r in registros] == [(segundo, cliente, "cancelado")]
+    assert json.loads(registros[0][4]) == [{"produto_id": p2, "quantidade": 3}]
+
+def pedido_na_secao(headers, secao, quantidade):
+    produto = criar_produto(headers, 100, secao)
+    response = client.post("/orders/", json={
+        "cliente_id": criar_cliente(headers), "produtos": [{"produto_id": produto, "quantidade": quantidade}],
+    }, headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+def vendas_da_secao(headers, secao):
+    response = client.get("/reports/sales-by-section", params={"secao": secao, "agrupar_por": "secao"}, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+def test_status_em_lote_valida_transicoes_e_mantem_vendas():
+    from uuid import uuid4
+    headers = {"Authorization": f"Bearer {obter_token_admin()}"}
+    secao = "status_" + uuid4().hex[:8]
+    primeiro = pedido_na_secao(headers, secao, 4)
+    segundo = pedido_na_secao(headers, secao, 1)
+    ids = [primeiro["id"], segundo["id"]]
+
+    response = client.patch("/orders/status", json={"status": "enviado", "ids": ids}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"status": "enviado", "atualizados": ids, "rejeitados": [], "rejeitados_truncados": False}
+
+    # enviado -> cancelado não é permitido; o pedido inexistente também é rejeitado
+    response = client.patch("/orders/status", json={"status": "cancelado", "ids": ids + [0]}, headers=headers)
+    resultado = response.json()
+    assert resultado["atualizados"] == []
+    assert [(r["id"], r["status"]) for r in resultado["rejeitados"]] == [
+        (primeiro["id"], "enviado"), (segundo["id"], "enviado"), (0, None)
+    ]
+    assert vendas_da_secao(headers, secao)[0]["pedidos"] == 2
+
+    response = client.patch(
+        "/orders/status", json={"status": "entregue", "filtro": {"secao": secao}}, headers=headers
+    )
+    assert response.json()["atualizados"] == ids
+    assert client.get(f"/orders/{segundo['id']}", headers=headers).json()["status"] == "entregue"
+
+    # Cancelamento em lote tira os pedidos do relatório; reativação devolve
+    terceiro = pedido_na_secao(headers, secao, 3)
+    client.patch("/orders/status", json={"status": "cancelado", "ids": [terceiro["id"]]}, headers=headers)
+    assert vendas_da_secao(headers, secao)[0]["quantidade"] == 5
+    client.patch("/orders/status", json={"status": "pendente", "ids": [terceiro["id"]]}, headers=headers)
+    assert vendas_da_secao(headers, secao)[0]["quantidade"] == 8
+
+    assert client.patch("/orders/status", json={"status": "enviado"}, headers=headers).status_code == 400
+
+def test_status_em_lote_por_filtro_limita_rejeitados(monkeypatch):
+    from uuid import uuid4
+    from shared import config
+    headers = {"Authorization": f"Bearer {obter_token_admin()}"}
+    secao = "status_" + uuid4().hex[:8]
+    pendente, *enviados = (pedido_na_secao(headers, secao, 1)["id"] for _ in range(3))
+    client.patch("/orders/status", json={"status": "enviado", "ids": enviados}, headers=headers)
+
+    monkeypatch.setattr(config, "LOTE_PEDIDOS_MAXIMO", 1)
+    response = client.patch("/orders/status", json={"status": "pago", "filtro": {"secao": secao}}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "status": "pago",
+        "atualizados": [pendente],
+        "rejeitados": [{"id": enviados[0], "status": "enviado", "erro": "Transição de 'enviado' para 'pago' não permitida"}],
+        "rejeitados_truncados": True,
+    }
+
+def test_paginacao_por_data_criacao_inclui_pedido_sem_data_informada():
+    from sqlalchemy import text
+    from shared.database import engine
+    headers = {"Authorization": f"Bearer {obter_token_admin()}"}
+    cliente = criar_cliente(headers)
+    produto = criar_produto(headers, 10)
+    ids = [
+        client.post("/orders/", json={"cliente_id": cliente, "produtos": [{"produto_id": produto, "quantidade": 1}]},
+                    headers=headers).json()["id"]
+        for _ in range(2)
+    ]
+    # Inserção direta, sem data_criacao: o banco preenche (a coluna é NOT NULL)
+    with engine.begin() as conexao:
+        ids.append(conexao.execute(
+            text("INSERT INTO pedidos (cliente_id, status) VALUES (:cliente, 'pendente') RETURNING id"),
+            {"cliente": cliente},
+        ).scalar())
+
+    for ordem, esperado in [("asc", ids), ("desc", ids[::-1])]:
+        vistos, cursor = [], None
+        while True:
+            params = {"cliente_id": cliente, "ordenar_por": "data_criacao", "ordem": ordem, "limit": 1}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get("/orders/", params=params, headers=headers)
+            assert response.status_code == 200
+            vistos += [pedido["id"] for pedido in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert vistos == esperado
+
+def test_cache_de_pedido_invalidado_apos_atualizar_e_excluir():
+    from uuid import uuid4
+    from shared.cache import cache_pedidos
+    headers = {"Authorization": f"Bearer {obter_token_admin()}"}
+    pedido_id = pedido_na_secao(headers, "cache_" + uuid4().hex[:8], 1)["id"]
+
+    assert client.get(f"/orders/{pedido_id}", headers=headers).json()["status"] == "pendente"
+    assert cache_pedidos.obter(pedido_id) is not None
+
+    assert client.put(f"/orders/{pedido_id}", json={"status": "enviado"}, headers=headers).status_code == 200
+    assert client.get(f"/orders/{pedido_id}", headers=headers).json()["status"] == "enviado"
+
+    # A atualização em lote também invalida os pedidos alterados
+    response = client.patch("/orders/status", json={"status": "entregue", "ids": [pedido_id]}, headers=headers)
+    assert response.json()["atualizados"] == [pedido_id]
+    assert client.get(f"/orders/{pedido_id}", headers=headers).json()["status"] == "entregue"
+
+    assert client.delete(f"/orders/{pedido_id}", headers=headers).status_code == 204
+    assert client.get(f"/orders/{pedido_id}", headers=headers).status_code == 404
+
+def test_listagem_de_pedidos_sem_consultas_por_pedido():
+    import re
+    headers = {"Authorization": f"Bearer {obter_token_admin()}"}
+    produtos = [criar_produto(headers, 50) for _ in range(3)]
+    cliente = criar_cliente(headers)
+    for _ in range(6):
+        response = client.post("/orders/", json={
+            "cliente_id": cliente, "produtos": [{"produto_id": p, "quantidade": 1} for p in produtos],
+        }, headers=headers)
+        assert response.status_code == 201
+
+    def consultas(limit):
+        response = client.get("/orders/", params={"cliente_id": cliente, "limit": limit}, headers=headers)
+        assert response.status_code == 200
+        assert len(response.json()) == limit
+        assert all(len(pedido["produtos"]) == 3 for pedido in response.json())
+        return int(re.search(r'desc="(\d+) consultas"', response.headers["Server-Timing"]).group(1))
+
+    consultas(1)  # aquece caches de autenticação e do pool
+    # A quantidade de comandos SQL não cresce com o tamanho da página
+    por_pagina = consultas(1)
+    assert por_pagina > 0
+    assert consultas(3) == consultas(6) == por_pagina
@@ -1,7 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
 from main import app
-from tests.utils import criar_token_admin, criar_produto_simples
+from tests.utils import criar_token_admin, obter_token_admin, criar_produto_simples
 
 client = TestClient(app)
 
@@ -61,3 +61,389 @@ def test_deletar_produto(token_admin):
 
     response = client.delete(f"/products/{produto_id}", headers={"Authorization": f"Bearer {token_admin}"})
     assert response.status_code == 204
+
+def test_serializacao_rapida_igual_ao_response_model():
+    from datetime import date, datetime
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from shared.serializacao import json_bytes
+
+    linhas = [
+        {"id": 1, "descricao": "Pão de açúcar \"especial\"", "valor_venda": 10.0, "data_validade": date(2026, 1, 2),
+         "imagem": None, "disponivel": True, "data_criacao": datetime(2026, 1, 2, 3, 4, 5, 678)},
+        {"id": 2, "descricao": "Café", "valor_venda": 0.1 + 0.2, "data_validade": None,
+         "imagem": "x.png", "disponivel": False, "data_criacao": datetime(2026, 1, 2, 3, 4, 5)},
+    ]
+    assert json_bytes(linhas) == JSONResponse(jsonable_encoder(linhas)).body
+
+def test_estoque_sem_venda_acima_do_saldo_com_pedidos_simultaneos(monkeypatch):
+    import uuid
+    from concurrent.futures import ThreadPoolExecutor
+    from fastapi import HTTPException
+    from shared import config
+    from shared.database import SessionLocal
+    from produtos.models.produtos import Produto
+    from produtos.estoque import reservar_estoque
+
+    monkeypatch.setattr(config, "ESTOQUE_LEDGER", False)
+    with SessionLocal() as db:
+        produtos = [
+            Produto(descricao="Reserva", valor_venda=1.0, codigo_barras=uuid.uuid4().hex, secao="geral", estoque_inicial=20)
+            for _ in range(2)
+        ]
+        db.add_all(produtos)
+        db.commit()
+        ids = [produto.id for produto in produtos]
+
+    def reservar(indice):
+        # Metade dos pedidos lista os produtos na ordem inversa: a trava em ordem de id evita deadlock
+        quantidades = {produto_id: 3 for produto_id in (ids if indice % 2 else reversed(ids))}
+        with SessionLocal() as db:
+            try:
+                reservar_estoque(db, quantidades)
+                db.commit()
+                return True
+            except HTTPException as erro:
+                assert erro.status_code == 400
+                return False
+
+    with ThreadPoolExecutor(8) as executor:
+        resultados = list(executor.map(reservar, range(10)))
+    assert sum(resultados) == 6
+
+    with SessionLocal() as db:
+        for produto_id in ids:
+            assert db.get(Produto, produto_id).estoque_inicial == 2
+            db.delete(db.get(Produto, produto_id))
+        db.commit()
+
+def test_estoque_ledger_sem_venda_acima_do_saldo(monkeypatch):
+    import uuid
+    from concurrent.futures import ThreadPoolExecutor
+    from fastapi import HTTPException
+    from shared import config
+    from shared.database import SessionLocal
+    from produtos.models.produtos import MovimentoEstoque, Produto
+    from produtos.estoque import compactar_estoque, reservar_estoque
+
+    monkeypatch.setattr(config, "ESTOQUE_LEDGER", True)
+    with SessionLocal() as db:
+        produto = Produto(descricao="Ledger", valor_venda=1.0, codigo_barras=uuid.uuid4().hex, secao="geral", estoque_inicial=20)
+        db.add(produto)
+        db.commit()
+        produto_id = produto.id
+
+    def reservar(_):
+        with SessionLocal() as db:
+            try:
+                reservar_estoque(db, {produto_id: 3})
+                db.commit()
+                return True
+            except HTTPException as erro:
+                assert erro.status_code == 400
+                return False
+
+    with ThreadPoolExecutor(8) as executor:
+        resultados = list(executor.map(reservar, range(10)))
+    assert sum(resultados) == 6
+
+    with SessionLocal() as db:
+        # A linha do produto não foi tocada pelas reservas; a compactação aplica as baixas
+        assert db.get(Produto, produto_id).estoque_inicial == 20
+        compactar_estoque(db, [produto_id])
+        assert db.get(Produto, produto_id).estoque_inicial == 2
+        assert db.query(MovimentoEstoque).filter(MovimentoEstoque.produto_id == produto_id).count() == 0
+        db.delete(db.get(Produto, produto_id))
+        db.commit()
+
+def test_tarefa_marca_produto_esgotado_e_repete_falhas(monkeypatch):
+    import uuid
+    from sqlalchemy import select
+    from shared import config
+    from shared.database import SessionLocal
+    from shared.tarefas import ESTADO_FALHOU, TIPOS, Tarefa, enfileirar, processar_lote, tarefa
+    from produtos.models.produtos import Produto
+    from produtos.estoque import TAREFA_ESGOTADOS, reservar_estoque
+
+    with SessionLocal() as db:
+        produto = Produto(descricao="Esgota", valor_venda=1.0, codigo_barras=uuid.uuid4().hex, secao="geral", estoque_inicial=2)
+        db.add(produto)
+        db.commit()
+        produto_id = produto.id
+
+        # Enfileirada na transação da baixa: um rollback descarta a tarefa junto
+        reservar_estoque(db, {produto_id: 2})
+        db.rollback()
+        pendentes = select(Tarefa.id).where(Tarefa.tipo == TAREFA_ESGOTADOS, Tarefa.dados["ids"].contains([produto_id]))
+        assert db.execute(pendentes).first() is None
+
+        reservar_estoque(db, {produto_id: 2})
+        db.commit()
+        assert db.execute(pendentes).first() is not None
+        assert db.get(Produto, produto_id).disponivel is True
+
+    while processar_lote(50):
+        pass
+
+    with SessionLocal() as db:
+        assert db.get(Produto, produto_id).disponivel is False
+        assert db.execute(pendentes).first() is None
+
+        @tarefa("teste_falha")
+        def falhar(db, motivo):
+            raise RuntimeError(motivo)
+
+        monkeypatch.setattr(config, "TAREFAS_TENTATIVAS", 1)
+        enfileirar(db, "teste_falha", motivo=uuid.uuid4().hex)
+        db.commit()
+        while processar_lote(50):
+            pass
+        falha = db.query(Tarefa).filter(Tarefa.tipo == "teste_falha").one()
+        assert (falha.estado, falha.tentativas) == (ESTADO_FALHOU, 1)
+        assert falha.erro.startswith("RuntimeError")
+        db.delete(falha)
+        db.delete(db.get(Produto, produto_id))
+        db.commit()
+        del TIPOS["teste_falha"]
+
+def test_tarefas_do_lote_renovam_o_prazo_antes_de_executar(monkeypatch):
+    import time
+    import uuid
+    from sqlalchemy import text
+    from shared import config
+    from shared.database import SessionLocal
+    from shared.tarefas import TIPOS, Tarefa, enfileirar, processar_lote, tarefa
+
+    # Cada tarefa leva mais da metade do prazo: sem renovação a terceira rodaria com o prazo vencido
+    monkeypatch.setattr(config, "TAREFAS_PRAZO_SEGUNDOS", 1)
+    marca = uuid.uuid4().hex
+    restantes = {}
+
+    @tarefa("teste_prazo")
+    def demorar(db, marca, ordem):
+        restantes[ordem] = db.execute(text(
+            "SELECT extract(epoch FROM executar_em - timezone('utc', now())) FROM tarefas "
+            "WHERE tipo = 'teste_prazo' AND dados->>'marca' = :marca AND (dados->>'ordem')::int = :ordem"
+        ), {"marca": marca, "ordem": ordem}).scalar()
+        if ordem == 0:
+            # Simula outro trabalhador pegando a última depois de um prazo vencido
+            db.execute(text(
+                "UPDATE tarefas SET tentativas = tentativas + 1, executar_em = executar_em + INTERVAL '1 hour' "
+                "WHERE tipo = 'teste_prazo' AND dados->>'marca' = :marca AND dados->>'ordem' = '3'"
+            ), {"marca": marca})
+        time.sleep(0.6)
+
+    with SessionLocal() as db:
+        for ordem in range(4):
+            enfileirar(db, "teste_prazo", marca=marca, ordem=ordem)
+        db.commit()
+        while processar_lote(50):
+            pass
+
+        assert sorted(restantes) == [0, 1, 2]
+        assert all(restante > 0 for restante in restantes.values())
+        # A tarefa pega pelo "outro trabalhador" continua na fila, com o prazo dele
+        sobra = db.query(Tarefa).filter(Tarefa.tipo == "teste_prazo", Tarefa.dados["marca"].astext == marca).one()
+        assert sobra.dados["ordem"] == 3
+        db.delete(sobra)
+        db.commit()
+    del TIPOS["teste_prazo"]
+
+def test_importacao_no_estoque_ledger_descarta_baixas_pendentes(monkeypatch):
+    import uuid
+    from shared import config
+    from shared.database import SessionLocal
+    from produtos.models.produtos import MovimentoEstoque, Produto
+    from produtos.estoque import reservar_estoque
+    from produtos.importacao import importar_produtos
+    from produtos.routers.produtos import ProdutoCreate
+
+    monkeypatch.setattr(config, "ESTOQUE_LEDGER", True)
+    codigo = uuid.uuid4().hex
+    with SessionLocal() as db:
+        produto = Produto(descricao="Ledger", valor_venda=1.0, codigo_barras=codigo, secao="geral", estoque_inicial=20)
+        db.add(produto)
+        db.commit()
+        produto_id = produto.id
+        reservar_estoque(db, {produto_id: 5})
+        db.commit()
+
+    corpo = f"descricao,valor_venda,codigo_barras,secao,estoque_inicial\nLedger,1.0,{codigo},geral,7\n".encode()
+    relatorio = importar_produtos([corpo], "csv", ProdutoCreate)
+    assert relatorio["atualizados"] == 1
+
+    with SessionLocal() as db:
+        # O estoque importado é o saldo: as baixas de antes da importação não contam mais
+        assert db.get(Produto, produto_id).estoque_inicial == 7
+        assert db.query(MovimentoEstoque).filter(MovimentoEstoque.produto_id == produto_id).count() == 0
+        db.delete(db.get(Produto, produto_id))
+        db.commit()
+
+def test_estoque_ledger_igual_no_detalhe_listagem_e_exportacao(monkeypatch):
+    import json
+    import uuid
+    from shared import config
+    from shared.database import SessionLocal
+    from produtos.models.produtos import Produto
+    from produtos.estoque import reservar_estoque
+
+    monkeypatch.setattr(config, "ESTOQUE_LEDGER", True)
+    secao = "ledger_" + uuid.uuid4().hex[:8]
+    with SessionLocal() as db:
+        produto = Produto(descricao="Ledger", valor_venda=1.0, codigo_barras=uuid.uuid4().hex, secao=secao, estoque_inicial=20)
+        db.add(produto)
+        db.commit()
+        produto_id = produto.id
+        reservar_estoque(db, {produto_id: 3})
+        db.commit()
+
+    headers = {"Authorization": f"Bearer {obter_token_admin()}"}
+    detalhe = client.get(f"/products/{produto_id}", headers=headers).json()
+    listagem = client.get("/products/", params={"secao": secao}, headers=headers).json()
+    exportacao = client.get("/products/export", params={"secao": secao}, headers=headers).text.splitlines()
+    assert detalhe["estoque_inicial"] == listagem[0]["estoque_inicial"] == json.loads(exportacao[0])["estoque_inicial"] == 17
+
+    with SessionLocal() as db:
+        db.delete(db.get(Produto, produto_id))
+        db.commit()
+
+def test_importacao_csv_insere_atualiza_e_relata_erros():
+    import uuid
+    from shared.database import SessionLocal
+    from produtos.models.produtos import Produto
+
+    a, b, c, d = (uuid.uuid4().hex for _ in range(4))
+    with SessionLocal() as db:
+        db.add(Produto(descricao="Antigo", valor_venda=1.0, codigo_barras=a, secao="geral", estoque_inicial=1))
+        db.commit()
+
+    corpo = b"\xef\xbb\xbf" + "\n".join([
+        "descricao,valor_venda,codigo_barras,secao,estoque_inicial",
+        f"Atualizado,2.5,{a},geral,9",
+        f"Novo,3.0,{b},geral,4",
+        f"Acentua\xe7\xe3o,1.0,{c},geral,1",
+        f"Sem preco,,{c},geral,1",
+        f"Estoque grande,1.0,{c},geral,99999999999",
+        f"{'x' * 200000},1.0,{c},geral,1",
+        f"Outro,1.0,{d},geral,2",
+    ]).encode("latin-1") + b"\n"
+    response = client.post(
+        "/products/import", content=corpo,
+        headers={"Authorization": f"Bearer {obter_token_admin()}", "Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200
+    relatorio = response.json()
+    assert {k: v for k, v in relatorio.items() if k != "erros"} == {
+        "linhas_lidas": 7, "validas": 3, "inseridos": 2, "atualizados": 1, "com_erro": 4,
+    }
+    assert [e["linha"] for e in relatorio["erros"]] == [4, 5, 6, 7]
+    assert "UTF-8" in relatorio["erros"][0]["erro"]
+    assert relatorio["erros"][1]["erro"].startswith("valor_venda")
+    assert relatorio["erros"][2]["erro"].startswith("estoque_inicial")
+    assert relatorio["erros"][3]["erro"].startswith("CSV inválido")
+
+    with SessionLocal() as db:
+        produtos = {p.codigo_barras: p for p in db.query(Produto).filter(Produto.codigo_barras.in_([a, b, c, d]))}
+        assert set(produtos) == {a, b, d}
+        assert (produtos[a].descricao, produtos[a].valor_venda, produtos[a].estoque_inicial) == ("Atualizado", 2.5, 9)
+        for produto in produtos.values():
+            db.delete(produto)
+        db.commit()
+
+def test_importacao_ndjson_ultima_linha_vale_e_erros_nao_interrompem():
+    import json
+    import uuid
+    from shared.database import SessionLocal
+    from produtos.models.produtos import Produto
+
+    a, b = uuid.uuid4().hex, uuid.uuid4().hex
+    produto = {"descricao": "Primeira", "valor_venda": 1.0, "codigo_barras": a, "secao": "geral", "estoque_inicial": 1}
+    corpo = "\n".join([
+        json.dumps(produto),
+        "",
+        "{nao e json",
+        json.dumps({**produto, "codigo_barras": b, "descricao": "com \u0000 no meio"}),
+        json.dumps({**produto, "descricao": "Ultima", "estoque_inicial": 5}),
+    ]).encode()
+    response = client.post(
+        "/products/import", params={"formato": "ndjson"}, content=corpo,
+        headers={"Authorization": f"Bearer {obter_token_admin()}"},
+    )
+    assert response.status_code == 200
+    relatorio = response.json()
+    assert (relatorio["linhas_lidas"], relatorio["inseridos"], relatorio["atualizados"], relatorio["com_erro"]) == (4, 1, 0, 2)
+    assert [e["linha"] for e in relatorio["erros"]] == [3, 4]
+
+    with SessionLocal() as db:
+        assert db.query(Produto).filter(Produto.codigo_barras == b).count() == 0
+        importado = db.query(Produto).filter(Produto.codigo_barras == a).one()
+        assert (importado.descricao, importado.estoque_inicial) == ("Ultima", 5)
+        db.delete(importado)
+        db.commit()
+
+def test_exportar_produtos_ndjson_e_csv():
+    import csv
+    import io
+    import json
+    import uuid
+
+    headers = {"Authorization": f"Bearer {obter_token_admin()}"}
+    secao = "exportacao_" + uuid.uuid4().hex[:8]
+    ids = []
+    for valor_venda, disponivel in [(1.0, True), (5.0, True), (10.0, False)]:
+        response = client.post("/products/", json={
+            "descricao": f"Exportado {valor_venda}", "valor_venda": valor_venda, "codigo_barras": uuid.uuid4().hex,
+            "secao": secao, "estoque_inicial": 3, "disponivel": disponivel,
+        }, headers=headers)
+        ids.append(response.json()["id"])
+    colunas = ["id", "descricao", "valor_venda", "codigo_barras", "secao", "estoque_inicial", "data_validade", "imagem", "disponivel"]
+
+    response = client.get("/products/export", params={"secao": secao}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    linhas = [json.loads(linha) for linha in response.text.splitlines()]
+    assert [list(linha) for linha in linhas] == [colunas] * 3
+    assert [linha["id"] for linha in linhas] == ids
+
+    response = client.get("/products/export", params={"secao": secao, "preco_min": 2, "preco_max": 10}, headers=headers)
+    assert [json.loads(linha)["id"] for linha in response.text.splitlines()] == ids[1:]
+
+    response = client.get(
+        "/products/export", params={"formato": "csv", "secao": secao, "disponivel": "true"}, headers=headers
+    )
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="produtos.csv"' in response.headers["content-disposition"]
+    cabecalho, *registros = list(csv.reader(io.StringIO(response.text)))
+    assert cabecalho == colunas
+    assert [(int(r[0]), float(r[2]), r[4], r[6], r[8]) for r in registros] == [
+        (ids[0], 1.0, secao, "", "true"), (ids[1], 5.0, secao, "", "true"),
+    ]
+
+def test_cache_de_produto_invalidado_apos_atualizar_vender_e_excluir():
+    import uuid
+    from shared.cache import cache_produtos
+    from tests.utils import criar_cliente_com_dados
+
+    token = obter_token_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+    produto = {"descricao": "Cache", "valor_venda": 10.0, "codigo_barras": uuid.uuid4().hex, "secao": "cache", "estoque_inicial": 100}
+    produto_id = client.post("/products/", json=produto, headers=headers).json()["id"]
+
+    assert client.get(f"/products/{produto_id}", headers=headers).json()["valor_venda"] == 10.0
+    assert cache_produtos.obter(produto_id) is not None
+
+    response = client.put(f"/products/{produto_id}", json={"valor_venda": 12.5}, headers=headers)
+    assert response.status_code == 200
+    assert client.get(f"/products/{produto_id}", headers=headers).json()["valor_venda"] == 12.5
+
+    # A baixa de estoque do pedido também invalida o produto em cache
+    cliente_id = criar_cliente_com_dados(token=token)["id"]
+    response = client.post("/orders/", json={
+        "cliente_id": cliente_id, "produtos": [{"produto_id": produto_id, "quantidade": 4}],
+    }, headers=headers)
+    assert response.status_code == 201
+    assert client.get(f"/products/{produto_id}", headers=headers).json()["estoque_inicial"] == 96
+
+    client.delete(f"/orders/{response.json()['id']}", headers=headers)
+    assert client.delete(f"/products/{produto_id}", headers=headers).status_code == 204
+    assert client.get(f"/products/{produto_id}", headers=headers).status_code == 404
@@ -0,0 +1,114 @@
+import random
+import string
+from fastapi.testclient import TestClient
+from main import app
+from relatorios.models.relatorios import VendaSecaoDia
+from shared.database import SessionLocal
+
+client = TestClient(app)
+
+def obter_token(papel="admin"):
+    nome_usuario = f"{papel}_" + ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+    senha = "senhateste"
+    client.post("/auth/register", json={"nome_usuario": nome_usuario, "senha": senha, "papel": papel})
+    response = client.post("/auth/login", data={"username": nome_usuario, "password": senha})
+    return response.json()["access_token"]
+
+def criar_pedido(headers, secao, valor_venda, quantidade):
+    sufixo = ''.join(random.choices(string.digits, k=12))
+    produto = client.post("/products/", json={
+        "descricao": f"Produto {sufixo}",
+        "valor_venda": valor_venda,
+        "codigo_barras": sufixo,
+        "secao": secao,
+        "estoque_inicial": 100,
+    }, headers=headers).json()
+    cliente = client.post("/clients/", json={
+        "nome": f"Cliente {sufixo}", "email": f"c{sufixo}@exemplo.com", "cpf": sufixo[:11],
+    }, headers=headers).json()
+    response = client.post("/orders/", json={
+        "cliente_id": cliente["id"],
+        "produtos": [{"produto_id": produto["id"], "quantidade": quantidade}],
+    }, headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+def vendas(headers, secao):
+    response = client.get("/reports/sales-by-section", params={"secao": secao, "agrupar_por": "secao"}, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+def test_vendas_por_secao_incrementais():
+    headers = {"Authorization": f"Bearer {obter_token()}"}
+    secao = "secao_" + ''.join(random.choices(string.ascii_lowercase, k=8))
+
+    criar_pedido(headers, secao, 2.5, 4)
+    pedido = criar_pedido(headers, secao, 10.0, 1)
+    assert vendas(headers, secao) == [
+        {"dia": None, "secao": secao, "pedidos": 2, "quantidade": 5, "receita": 20.0}
+    ]
+
+    client.put(f"/orders/{pedido['id']}", json={"status": "cancelado"}, headers=headers)
+    assert vendas(headers, secao)[0]["quantidade"] == 4
+
+    client.put(f"/orders/{pedido['id']}", json={"status": "pendente"}, headers=headers)
+    assert vendas(headers, secao)[0]["quantidade"] == 5
+
+    client.delete(f"/orders/{pedido['id']}", headers=headers)
+    assert vendas(headers, secao)[0]["pedidos"] == 1
+
+def test_vendas_nao_mudam_com_preco_ou_secao_do_produto():
+    headers = {"Authorization": f"Bearer {obter_token()}"}
+    secao = "secao_" + ''.join(random.choices(string.ascii_lowercase, k=8))
+    nova_secao = secao + "_nova"
+
+    pedido = criar_pedido(headers, secao, 10.0, 2)
+    criar_pedido(headers, secao, 5.0, 1)
+    produto_id = pedido["produtos"][0]["produto_id"]
+    response = client.put(
+        f"/products/{produto_id}", json={"valor_venda": 99.0, "secao": nova_secao}, headers=headers
+    )
+    assert response.status_code == 200
+    assert vendas(headers, secao)[0]["receita"] == 25.0
+
+    client.put(f"/orders/{pedido['id']}", json={"status": "cancelado"}, headers=headers)
+    assert vendas(headers, secao) == [
+        {"dia": None, "secao": secao, "pedidos": 1, "quantidade": 1, "receita": 5.0}
+    ]
+    with SessionLocal() as db:
+        assert db.query(VendaSecaoDia).filter(VendaSecaoDia.secao == nova_secao).count() == 0
+
+def test_pedidos_simultaneos_da_mesma_secao_nao_esperam_um_pelo_outro():
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from relatorios.models.relatorios import MovimentoVenda
+    from relatorios.vendas import consolidar_vendas, registrar_vendas
+
+    headers = {"Authorization": f"Bearer {obter_token()}"}
+    secao = "secao_" + ''.join(random.choices(string.ascii_lowercase, k=8))
+    primeiro = criar_pedido(headers, secao, 2.0, 1)
+
+    # Transação de pedido ainda aberta, com as vendas da mesma seção e dia já registradas
+    with SessionLocal() as aberta, ThreadPoolExecutor(1) as executor:
+        registrar_vendas(aberta, [primeiro["id"]])
+        inicio = time.perf_counter()
+        segundo = executor.submit(criar_pedido, headers, secao, 3.0, 1)
+        try:
+            segundo.result(timeout=5)
+        finally:
+            aberta.rollback()
+        assert time.perf_counter() - inicio < 2
+
+    assert vendas(headers, secao)[0]["pedidos"] == 2
+    with SessionLocal() as db:
+        consolidar_vendas(db)
+        assert db.query(MovimentoVenda).filter(MovimentoVenda.secao == secao).count() == 0
+        assert db.query(VendaSecaoDia).filter(VendaSecaoDia.secao == secao).one().receita == 5.0
+    assert vendas(headers, secao) == [
+        {"dia": None, "secao": secao, "pedidos": 2, "quantidade": 2, "receita": 5.0}
+    ]
+
+def test_vendas_por_secao_requer_admin():
+    headers = {"Authorization": f"Bearer {obter_token('user')}"}
+    response = client.get("/reports/sales-by-section", headers=headers)
+    assert response.status_code == 403
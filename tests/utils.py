@@ -14,6 +14,14 @@ def criar_token_admin():
     assert response.status_code == 200
     return response.json()["access_token"]
 
+def obter_token_admin():
+    nome_usuario = "admin_" + ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+    senha = "adminpassword"
+    usuario_data = {"nome_usuario": nome_usuario, "senha": senha, "papel": "admin"}
+    client.post("/auth/register", json=usuario_data)
+    response = client.post("/auth/login", data={"username": nome_usuario, "password": senha})
+    return response.json()["access_token"]
+
 def criar_cliente_com_dados(token=None):
     nome = random_string("Cliente_")
     email = f"{nome}@exemplo.com"